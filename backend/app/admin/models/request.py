@@ -24,6 +24,9 @@ class RequestAdmin(SqlAlchemyModelAdmin):
                 "content",
                 "headers",
                 "proxies",
+                "timeout",
+                "cache_ttl",
+                "cache_key",
                 "attachments"
             )
         }),
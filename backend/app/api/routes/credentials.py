@@ -67,6 +67,7 @@ async def create_credential(
     try:
         cred = await crud_cred.create_credential(session, cred_in)
         await session.commit()
+        await crud_cred.invalidate_credential_cache(bot_id)
         await session.refresh(cred)
         return cred
     except IntegrityError as e:
@@ -91,6 +92,7 @@ async def update_credential(
     try:
         cred = await crud_cred.update_credential(session, cred_id, bot_id, cred_in)
         await session.commit()
+        await crud_cred.invalidate_credential_cache(bot_id, cred_id)
         await session.refresh(cred)
         return cred
     except IntegrityError as e:
@@ -117,6 +119,7 @@ async def make_default_credential(
         session, bot_id=cred.bot_id, provider=cred.provider, strategy=cred.strategy, except_id=cred.id
     )
     await session.commit()
+    await crud_cred.invalidate_credential_cache(bot_id, cred_id)
     await session.refresh(cred)
     return cred
 
@@ -135,4 +138,5 @@ async def delete_credential(
     """
     await crud_cred.delete_credential(session, cred_id, bot_id)
     await session.commit()
+    await crud_cred.invalidate_credential_cache(bot_id, cred_id)
     return {"message": "Credential deleted successfully."}
@@ -0,0 +1,68 @@
+from typing import Annotated, Any
+
+from fastapi import APIRouter, HTTPException, Query
+from redis.asyncio import Redis
+
+import app.schemas.dead_letter as schemas_dead_letter
+from app.api.dependencies.auth import CurrentAdmin
+from app.broker import broker
+from app.config import settings
+from app.engine.stream_reclaim import list_dead_letters, purge_dead_letters, replay_dead_letters
+
+router = APIRouter()
+
+redis = Redis.from_url(settings.REDIS_URL)
+
+
+def _check_stream(stream: str) -> str:
+    if stream not in (settings.USER_STREAM_NAME, settings.BOT_STREAM_NAME):
+        raise HTTPException(status_code=404, detail="Stream not found.")
+    return stream
+
+
+@router.get(
+    "/{stream}",
+    dependencies=[CurrentAdmin],
+    response_model=list[schemas_dead_letter.DeadLetterPublic],
+)
+async def read_dead_letters(
+    stream: str,
+    start: str = "-",
+    limit: Annotated[int, Query(gt=0, le=1000)] = 50,
+) -> Any:
+    """
+    Retrieve dead-lettered entries of a stream.
+    """
+    return await list_dead_letters(redis, _check_stream(stream), start=start, count=limit,
+                                   message_format=broker.message_format)
+
+
+@router.post(
+    "/{stream}/replay",
+    dependencies=[CurrentAdmin],
+    response_model=schemas_dead_letter.DeadLetterReplayOut,
+)
+async def replay(
+    stream: str,
+    ids_in: schemas_dead_letter.DeadLetterIds,
+    limit: Annotated[int, Query(gt=0, le=1000)] = 50,
+) -> Any:
+    """
+    Put dead-lettered entries back to the stream. Without ids replays the oldest `limit` entries.
+    """
+    replayed = await replay_dead_letters(redis, _check_stream(stream), ids=ids_in.ids, count=limit)
+    return schemas_dead_letter.DeadLetterReplayOut(replayed=replayed)
+
+
+@router.delete(
+    "/{stream}",
+    dependencies=[CurrentAdmin],
+    response_model=schemas_dead_letter.DeadLetterPurgeOut,
+)
+async def purge(stream: str, ids_in: schemas_dead_letter.DeadLetterIds | None = None) -> Any:
+    """
+    Delete dead-lettered entries. Without ids purges the whole dead-letter stream.
+    """
+    ids = ids_in.ids if ids_in else None
+    purged = await purge_dead_letters(redis, _check_stream(stream), ids=ids)
+    return schemas_dead_letter.DeadLetterPurgeOut(purged=purged)
@@ -1,52 +1,79 @@
-from uuid import UUID
+import logging
 from pathlib import Path
-from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from fastapi.responses import FileResponse, StreamingResponse
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from app.api.dependencies.db import SessionDep
 from app.config import settings
+from app.services.media_index import media_index
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 source_path = "/attachment/{file_name}"
 
 
+def _disposition(file_name: str) -> str:
+    disposition = f"attachment; filename=\"{file_name}\""
+    try:
+        disposition += f"; filename*=UTF-8''{file_name}"
+    except Exception:
+        pass
+    return disposition
+
+
+async def _object_response(request: Request, key: str, file_name: str, known: bool = False) -> Response | None:
+    """
+    Ответ с объектом S3: редирект на presigned-ссылку (MEDIA_PRESIGNED_REDIRECT)
+    или поток с поддержкой Range и условных запросов. None — объекта нет.
+    known — ключ взят из индекса или уже проверен; иначе перед редиректом проверяю, что объект есть,
+    чтобы не уводить на ошибку S3 мимо локального fallback и 404.
+    """
+    from app.services.s3_service import generate_presigned_get_url, object_exists, open_object
+
+    if settings.MEDIA_PRESIGNED_REDIRECT:
+        if not known and not await object_exists(key):
+            return None
+        url = await generate_presigned_get_url(key, expires_in=settings.MEDIA_PRESIGNED_TTL,
+                                               content_disposition=_disposition(file_name))
+        return RedirectResponse(url, status_code=307)
+
+    obj = await open_object(
+        key,
+        range_header=request.headers.get("range"),
+        if_none_match=request.headers.get("if-none-match"),
+        if_modified_since=request.headers.get("if-modified-since"),
+    )
+    if obj.status == 404:
+        return None
+    if obj.body is None:
+        return Response(status_code=obj.status, headers=obj.headers)
+    headers = obj.headers
+    headers["Content-Disposition"] = _disposition(file_name)
+    return StreamingResponse(obj.body, status_code=obj.status,
+                             media_type=headers.get("Content-Type", "application/octet-stream"), headers=headers)
+
+
 @router.get(
     f"{source_path}"
 )
-async def get_media_file(file_name: str):
-    # Try S3 by key first
+async def get_media_file(file_name: str, request: Request, session: SessionDep):
+    # Ключ S3 по имени файла из индекса вложений; плоский legacy-ключ проверяется только при промахе
     try:
-        from app.services.s3_service import object_exists, stream_object
-        # Try flat key first (legacy)
-        key = f"attachment/{file_name}"
-        if await object_exists(key):
-            iterator, headers = await stream_object(key)
-            disposition = f"attachment; filename=\"{file_name}\""
-            try:
-                disposition += f"; filename*=UTF-8''{file_name}"
-            except Exception:
-                pass
-            headers["Content-Disposition"] = disposition
-            return StreamingResponse(iterator, media_type=headers.get("Content-Type", "application/octet-stream"), headers=headers)
-
-        # Also try dated folders for recent 31 days
-        today = datetime.utcnow().date()
-        for days_ago in range(0, 31):
-            d = today - timedelta(days=days_ago)
-            dated_key = f"attachment/{d.strftime('%Y/%m/%d')}/{file_name}"
-            if await object_exists(dated_key):
-                iterator, headers = await stream_object(dated_key)
-                disposition = f"attachment; filename=\"{file_name}\""
-                try:
-                    disposition += f"; filename*=UTF-8''{file_name}"
-                except Exception:
-                    pass
-                headers["Content-Disposition"] = disposition
-                return StreamingResponse(iterator, media_type=headers.get("Content-Type", "application/octet-stream"), headers=headers)
-    except Exception:
-        pass
+        from app.services.s3_service import object_exists
+        key = await media_index.resolve(session, file_name)
+        if key is None:
+            legacy_key = f"attachment/{file_name}"
+            if await object_exists(legacy_key):
+                key = legacy_key
+                await media_index.remember(file_name, key)
+        if key is not None:
+            response = await _object_response(request, key, file_name, known=True)
+            if response is not None:
+                return response
+    except Exception as e:
+        logger.warning(f"S3 lookup failed for media file {file_name}: {e}")
 
     # Fallback to local filesystem for legacy
     file_path = Path("".join([str(settings.MEDIA_ROOT), source_path.format(file_name=file_name)]))
@@ -61,22 +88,14 @@ async def get_media_file(file_name: str):
 # New: stream by full S3 key path, e.g.
 # GET /media/attachment/2025/09/17/<random>.xlsx
 @router.get("/{path:path}")
-async def get_media_by_path(path: str):
-    from app.services.s3_service import object_exists, stream_object
+async def get_media_by_path(path: str, request: Request):
     # Normalize: allow missing 'attachment/' prefix
     normalized = path if path.startswith("attachment/") else f"attachment/{path}"
 
     # First try S3 by exact key
-    if await object_exists(normalized):
-        file_name = normalized.split('/')[-1]
-        iterator, headers = await stream_object(normalized)
-        disposition = f"attachment; filename=\"{file_name}\""
-        try:
-            disposition += f"; filename*=UTF-8''{file_name}"
-        except Exception:
-            pass
-        headers["Content-Disposition"] = disposition
-        return StreamingResponse(iterator, media_type=headers.get("Content-Type", "application/octet-stream"), headers=headers)
+    response = await _object_response(request, normalized, normalized.split('/')[-1])
+    if response is not None:
+        return response
 
     # Fallback to local filesystem for legacy
     file_path = Path(str(settings.MEDIA_ROOT / normalized))
@@ -87,19 +106,11 @@ async def get_media_by_path(path: str):
 
 # Alternate access via query param for Swagger (slashes may be %-encoded)
 @router.get("/")
-async def get_media_by_key(key: str):
+async def get_media_by_key(key: str, request: Request):
     from urllib.parse import unquote
-    from app.services.s3_service import object_exists, stream_object
     raw_key = unquote(key)
     normalized = raw_key if raw_key.startswith("attachment/") else f"attachment/{raw_key}"
-    if await object_exists(normalized):
-        file_name = normalized.split('/')[-1]
-        iterator, headers = await stream_object(normalized)
-        disposition = f"attachment; filename=\"{file_name}\""
-        try:
-            disposition += f"; filename*=UTF-8''{file_name}"
-        except Exception:
-            pass
-        headers["Content-Disposition"] = disposition
-        return StreamingResponse(iterator, media_type=headers.get("Content-Type", "application/octet-stream"), headers=headers)
-    raise HTTPException(status_code=404, detail="File not found.")
\ No newline at end of file
+    response = await _object_response(request, normalized, normalized.split('/')[-1])
+    if response is not None:
+        return response
+    raise HTTPException(status_code=404, detail="File not found.")
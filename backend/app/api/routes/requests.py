@@ -12,8 +12,7 @@ import app.crud.request as crud_request
 import app.crud.bot as crud_bot
 import app.schemas.request as schemas_request
 from app.api.dependencies.db import SessionDep
-from app.auth.credentials_resolver import CredentialsResolver
-from app.auth.service import AuthService
+from app.auth.service import auth_service
 from app.config import settings
 from app.engine.bot_processor import ConnectionResponseHandler
 from app.engine.variables import variable_substitution_pydantic
@@ -193,8 +192,6 @@ async def execute_request(
 
     dm = DataManager(Redis.from_url(settings.REDIS_URL), session.bind)
     bot = BotProcessor(**(await dm.get_bot(request_in.bot_id)))
-    resolver = CredentialsResolver(dm)
-    auth_service = AuthService(resolver)
 
     handler = ConnectionResponseHandler(bot, auth_service, dm)
     fictional_connection = ConnectionGroupExport(
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import time
 from uuid import UUID
 
 from fastapi import (APIRouter, Depends, WebSocket, WebSocketDisconnect)
@@ -7,11 +8,15 @@ from fastapi import (APIRouter, Depends, WebSocket, WebSocketDisconnect)
 from app.managers.websocket import ChannelWebSocketManager, BotWebSocketManager
 from app.api.dependencies.websocket import AuthWebsocketDataChannelDep, AuthWebsocketDataBotDep
 from app.managers.websocket import WebSocketManagerBase
+from app.config import settings
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+# Период продления отметки слушателя — с запасом меньше BOT_LOG_PRESENCE_TTL
+TOUCH_INTERVAL = max(1, settings.BOT_LOG_PRESENCE_TTL // 3)
+
 channel_websocket_manager = ChannelWebSocketManager()
 bot_websocket_manager = BotWebSocketManager()
 
@@ -35,8 +40,12 @@ async def websocket_handler(websocket: WebSocket, auth_data: dict, websocket_man
     await websocket_manager.add_connection(entity['id'], connection_uuid, websocket)
 
     try:
+        last_touch = time.monotonic()
         while True:
             await asyncio.sleep(0.5)
+            if time.monotonic() - last_touch >= TOUCH_INTERVAL:
+                last_touch = time.monotonic()
+                await websocket_manager.touch(entity['id'], connection_uuid)
     except WebSocketDisconnect:
         logger.info(f"Соединение с сущностью {entity['id']} закрыто пользователем {user['id']}.")
     except Exception as e:
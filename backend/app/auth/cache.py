@@ -1,17 +1,55 @@
 from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
 import time
-from typing import Optional, Tuple, Dict
+from typing import Awaitable, Callable, Optional, Dict
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
 from app.auth.types import AccessToken
+from app.config import settings
+from app.metrics.pipeline import pipeline_metrics
+from app.utils.secret_box import decrypt_blob_to_dict, encrypt_dict_to_blob
+
+logger = logging.getLogger(__name__)
+
+CACHE_FAMILY = "auth_token"
+KEY_PREFIX = "auth:token:"
+
+FetchFn = Callable[[], Awaitable[AccessToken]]
 
 
 class TokenCache:
     """
-    Простой in-memory кеш access-токенов.
-    Ключ строю из (bot_id, provider, profile, strategy, scopes_fingerprint).
+    Общий кеш access-токенов процесса и воркеров.
+    Ключ строю из (bot_id, provider, profile, strategy, scopes_fingerprint, credentials_id).
+    L1 — токены в памяти процесса, L2 — Redis, значение зашифровано secret_box.
+    Обновление single-flight: внутри процесса ждём один future, между воркерами — Redis-лок.
+    Неудачное обновление помечается в Redis на failure_ttl секунд: остальные воркеры сразу получают ошибку,
+    а не ждут токен до lock_timeout.
     """
 
-    def __init__(self):
-        self._store: Dict[Tuple[str, str, str, str, str], AccessToken] = {}
+    SKEW = 30  # 30 сек запас до истечения
+
+    def __init__(self, redis: Redis | None = None, lock_timeout: float = 30, no_expiry_ttl: int = 3600,
+                 failure_ttl: int = 5, clock: Callable[[], float] = time.time):
+        self._redis = redis
+        self.lock_timeout = lock_timeout
+        self.failure_ttl = failure_ttl
+        # токены без expires_at (долгоживущие) хранятся в Redis столько секунд
+        self.no_expiry_ttl = no_expiry_ttl
+        self._now = clock
+        self._store: Dict[str, AccessToken] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(settings.CACHE_REDIS_URL)
+        return self._redis
 
     @staticmethod
     def _fingerprint_scopes(scopes: Optional[list[str]]) -> str:
@@ -19,38 +57,160 @@ class TokenCache:
             return ""
         return ",".join(sorted(s.strip() for s in scopes if s and s.strip()))
 
-    @staticmethod
-    def _now() -> float:
-        return time.time()
+    def key(self, *, bot_id: str, provider: str, profile: str, strategy: str,
+            scopes: Optional[list[str]] = None, credentials_id: Optional[str] = None) -> str:
+        raw = json.dumps([str(bot_id), provider, profile, strategy, self._fingerprint_scopes(scopes),
+                          str(credentials_id or "")])
+        return KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-    def get(
-        self,
-        *,
-        bot_id: str,
-        provider: str,
-        profile: str,
-        strategy: str,
-        scopes: Optional[list[str]] = None,
-    ) -> Optional[AccessToken]:
-        key = (bot_id, provider, profile, strategy, self._fingerprint_scopes(scopes))
+    def _is_valid(self, token: AccessToken) -> bool:
+        return not token.expires_at or token.expires_at > self._now() + self.SKEW
+
+    def _get_local(self, key: str) -> Optional[AccessToken]:
         token = self._store.get(key)
-        if not token:
-            return None
-        if token.expires_at and token.expires_at <= (self._now() + 30):  # 30 сек запас
+        if token is not None and not self._is_valid(token):
             # протух — удаляю
             self._store.pop(key, None)
+            token = None
+        pipeline_metrics.observe_cache(CACHE_FAMILY, "l1", token is not None)
+        return token
+
+    async def _get_remote(self, key: str) -> Optional[AccessToken]:
+        try:
+            raw = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Token cache read failed: {e}")
             return None
+        token = None
+        if raw is not None:
+            try:
+                token = AccessToken.model_validate(decrypt_blob_to_dict(raw.decode() if isinstance(raw, bytes) else raw))
+            except Exception as e:
+                logger.warning(f"Token cache entry could not be decrypted: {e}")
+        if token is not None and not self._is_valid(token):
+            token = None
+        pipeline_metrics.observe_cache(CACHE_FAMILY, "l2", token is not None)
+        if token is not None:
+            self._store[key] = token
         return token
 
-    def put(
+    async def _put(self, key: str, token: AccessToken) -> None:
+        self._store[key] = token
+        ttl = int(token.expires_at - self._now() - self.SKEW) if token.expires_at else self.no_expiry_ttl
+        if ttl <= 0:
+            return
+        try:
+            await self.redis.set(key, encrypt_dict_to_blob(token.model_dump()), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Token cache write failed: {e}")
+
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        owner = uuid4().hex
+        try:
+            acquired = await self.redis.set(f"{key}:lock", owner, nx=True, ex=max(1, int(self.lock_timeout)))
+        except Exception as e:
+            logger.warning(f"Token refresh lock failed: {e}")
+            return owner
+        return owner if acquired else None
+
+    async def _release_lock(self, key: str, owner: str) -> None:
+        try:
+            current = await self.redis.get(f"{key}:lock")
+            if current is not None and (current.decode() if isinstance(current, bytes) else current) == owner:
+                await self.redis.delete(f"{key}:lock")
+        except Exception as e:
+            logger.warning(f"Token refresh unlock failed: {e}")
+
+    async def _lock_held(self, key: str) -> bool:
+        try:
+            return bool(await self.redis.exists(f"{key}:lock"))
+        except Exception as e:
+            logger.warning(f"Token refresh lock check failed: {e}")
+            return True
+
+    async def _raise_if_failed(self, key: str) -> None:
+        try:
+            failed = await self.redis.get(f"{key}:failed")
+        except Exception as e:
+            logger.warning(f"Token failure check failed: {e}")
+            return
+        if failed is not None:
+            reason = failed.decode() if isinstance(failed, bytes) else failed
+            raise RuntimeError(f"access token refresh failed recently ({reason}), retry later")
+
+    async def _mark_failed(self, key: str, error: Exception) -> None:
+        if self.failure_ttl <= 0:
+            return
+        try:
+            # Только тип ошибки: текст может содержать ответ провайдера
+            await self.redis.set(f"{key}:failed", type(error).__name__, ex=self.failure_ttl)
+        except Exception as e:
+            logger.warning(f"Token failure mark failed: {e}")
+
+    async def _wait_for_other_worker(self, key: str) -> Optional[AccessToken]:
+        deadline = self._now() + self.lock_timeout
+        while self._now() < deadline:
+            await asyncio.sleep(0.1)
+            token = await self._get_remote(key)
+            if token is not None:
+                return token
+            if not await self._lock_held(key):
+                # Лок снят без токена — обновление у другого воркера не удалось
+                token = await self._get_remote(key)
+                if token is not None:
+                    return token
+                await self._raise_if_failed(key)
+                return None
+        return None
+
+    async def _load(self, key: str, fetch: FetchFn) -> AccessToken:
+        token = await self._get_remote(key)
+        if token is not None:
+            return token
+        await self._raise_if_failed(key)
+        owner = await self._acquire_lock(key)
+        if owner is None:
+            # токен обновляет другой воркер; если не дождались — обновляем сами
+            token = await self._wait_for_other_worker(key)
+            if token is not None:
+                return token
+        try:
+            try:
+                token = await fetch()
+            except Exception as e:
+                await self._mark_failed(key, e)
+                raise
+            await self._put(key, token)
+            return token
+        finally:
+            if owner is not None:
+                await self._release_lock(key, owner)
+
+    async def get_or_fetch(
         self,
         *,
         bot_id: str,
         provider: str,
         profile: str,
         strategy: str,
-        scopes: Optional[list[str]],
-        token: AccessToken,
-    ) -> None:
-        key = (bot_id, provider, profile, strategy, self._fingerprint_scopes(scopes))
-        self._store[key] = token
+        scopes: Optional[list[str]] = None,
+        credentials_id: Optional[str] = None,
+        fetch: FetchFn,
+    ) -> AccessToken:
+        """Действующий токен из кеша или новый от провайдера; fetch выполняет обмен токена."""
+        key = self.key(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes,
+                       credentials_id=credentials_id)
+        token = self._get_local(key)
+        if token is not None:
+            return token
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+token_cache = TokenCache(lock_timeout=settings.AUTH_TOKEN_LOCK_TIMEOUT, no_expiry_ttl=settings.AUTH_TOKEN_NO_EXPIRY_TTL,
+                         failure_ttl=settings.AUTH_TOKEN_FAILURE_TTL)
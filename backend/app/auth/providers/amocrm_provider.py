@@ -31,23 +31,21 @@ class AmoCrmProvider:
         strategy = str(creds_cfg.get("strategy", "oauth"))
         scopes = None  # у AmoCRM скоупы не участвуют в Bearer
 
-        cached = cache.get(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes)
-        if cached:
-            return cached
+        async def fetch() -> AccessToken:
+            payload = creds_cfg["payload"]
+            base_domain = payload.get("base_domain")
+            client_id = payload.get("client_id")
+            client_secret = payload.get("client_secret")
+            redirect_uri = payload.get("redirect_uri")
+            refresh_token = payload.get("refresh_token")
 
-        payload = creds_cfg["payload"]
-        base_domain = payload.get("base_domain")
-        client_id = payload.get("client_id")
-        client_secret = payload.get("client_secret")
-        redirect_uri = payload.get("redirect_uri")
-        refresh_token = payload.get("refresh_token")
+            if not (base_domain and client_id and client_secret and redirect_uri and refresh_token):
+                raise RuntimeError("amocrm: missing base_domain/client_id/client_secret/redirect_uri/refresh_token")
 
-        if not (base_domain and client_id and client_secret and redirect_uri and refresh_token):
-            raise RuntimeError("amocrm: missing base_domain/client_id/client_secret/redirect_uri/refresh_token")
+            return await self._refresh(base_domain, client_id, client_secret, redirect_uri, refresh_token)
 
-        token = await self._refresh(base_domain, client_id, client_secret, redirect_uri, refresh_token)
-        cache.put(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes, token=token)
-        return token
+        return await cache.get_or_fetch(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy,
+                                        scopes=scopes, credentials_id=creds_cfg.get("id"), fetch=fetch)
 
     def apply_headers(self, headers: dict, token: AccessToken, hints: Mapping[str, Any]) -> None:
         headers["Authorization"] = f"{token.token_type} {token.access_token}"
@@ -41,18 +41,14 @@ class YandexCloudProvider:
         strategy = str(creds_cfg.get("strategy", "service_account"))
         scopes = None  # Yandex Cloud IAM не требует scopes
 
-        cached = cache.get(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes)
-        if cached:
-            return cached
+        async def fetch() -> AccessToken:
+            payload = creds_cfg["payload"]
+            if "oauth_token" in payload:
+                return await self._from_oauth(payload["oauth_token"])
+            return await self._from_service_account(payload)
 
-        payload = creds_cfg["payload"]
-        if "oauth_token" in payload:
-            token = await self._from_oauth(payload["oauth_token"])
-        else:
-            token = await self._from_service_account(payload)
-
-        cache.put(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes, token=token)
-        return token
+        return await cache.get_or_fetch(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy,
+                                        scopes=scopes, credentials_id=creds_cfg.get("id"), fetch=fetch)
 
     def apply_headers(self, headers: dict, token: AccessToken, hints: Mapping[str, Any]) -> None:
         headers["Authorization"] = f"Bearer {token.access_token}"
@@ -123,20 +119,18 @@ class YandexIdOAuthProvider:
         strategy = str(creds_cfg.get("strategy", "oauth"))
         scopes = None
 
-        cached = cache.get(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes)
-        if cached:
-            return cached
-
         payload = creds_cfg["payload"]
         if "access_token" in payload and not payload.get("expires_at"):
-            token = AccessToken(token_type="OAuth", access_token=payload["access_token"], expires_at=None)
-        elif "refresh_token" in payload:
-            token = await self._refresh(payload)
-        else:
+            # долгоживущий токен из учётки — обмена нет, кешировать нечего
+            return AccessToken(token_type="OAuth", access_token=payload["access_token"], expires_at=None)
+
+        async def fetch() -> AccessToken:
+            if "refresh_token" in payload:
+                return await self._refresh(payload)
             raise RuntimeError("yandex_id: provide access_token or refresh_token with client credentials")
 
-        cache.put(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy, scopes=scopes, token=token)
-        return token
+        return await cache.get_or_fetch(bot_id=bot_id, provider=provider, profile=profile, strategy=strategy,
+                                        scopes=scopes, credentials_id=creds_cfg.get("id"), fetch=fetch)
 
     def apply_headers(self, headers: dict, token: AccessToken, hints: Mapping[str, Any]) -> None:
         headers["Authorization"] = f"OAuth {token.access_token}"
@@ -2,16 +2,21 @@ import uuid
 from urllib.parse import urlparse
 from typing import Mapping, Any, Optional
 
-from app.auth.cache import TokenCache
+from app.auth.cache import TokenCache, token_cache
+from app.auth.credentials_resolver import CredentialsResolver
 from app.auth.providers.google_provider import GoogleProvider
 from app.auth.providers.amocrm_provider import AmoCrmProvider
 from app.auth.providers.yandex_provider import YandexCloudProvider, YandexIdOAuthProvider
 
 
 class AuthService:
-    def __init__(self, resolver):
-        self._resolver = resolver
-        self._cache = TokenCache()
+    """
+    Один экземпляр на процесс (auth_service): провайдеры и кеш токенов общие,
+    а учётки ищутся через resolver, переданный в apply (он привязан к DataManager сообщения).
+    """
+
+    def __init__(self, cache: TokenCache | None = None):
+        self._cache = cache or token_cache
         self._providers = {
             "google": GoogleProvider(),
             "amocrm": AmoCrmProvider(),
@@ -22,6 +27,7 @@ class AuthService:
     async def apply(
         self,
         *,
+        resolver: CredentialsResolver,
         bot_id: str,
         headers: dict,
         request_url: str,
@@ -37,12 +43,12 @@ class AuthService:
 
         # 1) если передан явный ID — берём его
         if credentials_id:
-            secret = await self._resolver.get_by_id(uuid.UUID(credentials_id))
+            secret = await resolver.get_by_id(uuid.UUID(credentials_id))
         else:
             # 2) иначе дефолт / единственная учётка
-            secret = await self._resolver.get_default_for(
+            secret = await resolver.get_default_for(
                 bot_id=uuid.UUID(bot_id), provider=provider_key, strategy=strategy_hint
-            ) or await self._resolver.get_single_for(
+            ) or await resolver.get_single_for(
                 bot_id=uuid.UUID(bot_id), provider=provider_key, strategy=strategy_hint
             )
 
@@ -79,3 +85,6 @@ class AuthService:
         if host.startswith("api-metrika.yandex."):
             return "yandex_id", hints
         return None, hints
+
+
+auth_service = AuthService()
@@ -0,0 +1,119 @@
+"""
+Разовое заполнение индекса имён вложений (attachment.object_name) для старых файлов.
+
+1. Строки attachment без object_name получают его из ключа.
+2. Объекты S3 под attachment/ (плоские legacy-ключи и датированные папки) без строки в индексе
+   получают строку attachment.
+3. Локальные файлы MEDIA_ROOT/attachment загружаются в S3 как attachment/<name> и индексируются.
+
+Запуск: python backfill_media_index.py [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import mimetypes
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import sessionmanager
+from app.models.attachment import AttachmentModel, key_basename
+from app.schemas import rebuild_models
+from app.services import s3_service
+from app.services.s3_client import s3_pool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+PREFIX = "attachment/"
+
+
+async def fill_object_names(session: AsyncSession, dry_run: bool) -> int:
+    # Пустой ключ имени не даёт — без условия file != '' такие строки выбирались бы бесконечно
+    unnamed = (AttachmentModel.object_name.is_(None), AttachmentModel.file.is_not(None), AttachmentModel.file != "")
+    if dry_run:
+        return (await session.execute(select(func.count()).select_from(AttachmentModel).where(*unnamed))).scalar_one()
+    updated = 0
+    while True:
+        rows = (await session.execute(
+            select(AttachmentModel).where(*unnamed).limit(BATCH_SIZE)
+        )).scalars().all()
+        if not rows:
+            return updated
+        for attachment in rows:
+            attachment.object_name = key_basename(attachment.file)
+        updated += len(rows)
+        await session.commit()
+
+
+async def _unindexed(session: AsyncSession, names: list[str]) -> set[str]:
+    known = (await session.execute(
+        select(AttachmentModel.object_name).where(AttachmentModel.object_name.in_(names))
+    )).scalars().all()
+    return set(names) - set(known)
+
+
+def _index(session: AsyncSession, key: str) -> None:
+    content_type, _ = mimetypes.guess_type(key)
+    session.add(AttachmentModel(file=key, object_name=key_basename(key), content_type=content_type))
+
+
+async def index_s3_objects(session: AsyncSession, dry_run: bool) -> int:
+    s3_client = await s3_pool.client()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    indexed = 0
+    async for page in paginator.paginate(Bucket=settings.S3_BUCKET, Prefix=PREFIX,
+                                          PaginationConfig={"PageSize": BATCH_SIZE}):
+        keys = {key_basename(item["Key"]): item["Key"] for item in page.get("Contents", [])
+                if not item["Key"].endswith("/")}
+        if not keys:
+            continue
+        missing = await _unindexed(session, list(keys))
+        indexed += len(missing)
+        if not dry_run:
+            for name in missing:
+                _index(session, keys[name])
+            await session.commit()
+    return indexed
+
+
+async def upload_local_files(session: AsyncSession, dry_run: bool) -> int:
+    root = settings.MEDIA_ROOT / "attachment"
+    if not root.is_dir():
+        return 0
+    files = {path.name: path for path in root.iterdir() if path.is_file()}
+    uploaded = 0
+    names = list(files)
+    for start in range(0, len(names), BATCH_SIZE):
+        for name in await _unindexed(session, names[start:start + BATCH_SIZE]):
+            key = f"{PREFIX}{name}"
+            if not dry_run:
+                content_type, _ = mimetypes.guess_type(name)
+                if not await s3_service.object_exists(key):
+                    await s3_service.upload_bytes(key, files[name].read_bytes(), content_type=content_type)
+                _index(session, key)
+            uploaded += 1
+        if not dry_run:
+            await session.commit()
+    return uploaded
+
+
+async def main(dry_run: bool) -> None:
+    rebuild_models()
+    try:
+        async with sessionmanager.session() as session:
+            logger.info(f"Filled object_name for {await fill_object_names(session, dry_run)} attachments")
+            logger.info(f"Indexed {await index_s3_objects(session, dry_run)} S3 objects without attachment rows")
+            logger.info(f"Uploaded and indexed {await upload_local_files(session, dry_run)} local legacy files")
+    finally:
+        await s3_pool.close()
+    if dry_run:
+        logger.info("Dry run: nothing was written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the attachment file name index")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be changed")
+    asyncio.run(main(parser.parse_args().dry_run))
@@ -70,6 +70,27 @@ class Settings(BaseSettings):
     S3_ACCESS_KEY: str | None = os.getenv("S3_ACCESS_KEY")
     S3_SECRET_KEY: str | None = os.getenv("S3_SECRET_KEY")
     S3_BUCKET: str = os.getenv("S3_BUCKET", "dbcv-media")
+    # one long-lived client per process, connections shared by all S3 calls
+    S3_MAX_POOL_CONNECTIONS: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 50))
+    # uploads larger than the threshold go as multipart, parts of S3_MULTIPART_CHUNK_SIZE (min 5 MiB)
+    S3_MULTIPART_THRESHOLD: int = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+    S3_MULTIPART_CHUNK_SIZE: int = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))
+    # chunk size for streamed reads
+    S3_STREAM_CHUNK_SIZE: int = int(os.getenv("S3_STREAM_CHUNK_SIZE", 1024 * 1024))
+    # request attachments are kept in memory up to this size, larger ones spill to a temp file
+    S3_SPOOL_MAX_MEMORY: int = int(os.getenv("S3_SPOOL_MAX_MEMORY", 1024 * 1024))
+
+    # generated attachments with identical content share one S3 object (attachment_blob index)
+    ATTACHMENT_DEDUP: bool = os.getenv("ATTACHMENT_DEDUP", "false").lower() in ("1", "true", "yes")
+    # unreferenced shared objects are deleted after the grace period, checked every interval seconds
+    ATTACHMENT_GC_GRACE: int = int(os.getenv("ATTACHMENT_GC_GRACE", 24 * 3600))
+    ATTACHMENT_GC_INTERVAL: int = int(os.getenv("ATTACHMENT_GC_INTERVAL", 3600))
+    # /media/attachment/<name> lookups: file name -> S3 key cached in Redis (misses for a shorter time)
+    MEDIA_INDEX_TTL: int = int(os.getenv("MEDIA_INDEX_TTL", 3600))
+    MEDIA_INDEX_MISSING_TTL: int = int(os.getenv("MEDIA_INDEX_MISSING_TTL", 60))
+    # redirect media requests to presigned S3 URLs instead of proxying the bytes through the API
+    MEDIA_PRESIGNED_REDIRECT: bool = os.getenv("MEDIA_PRESIGNED_REDIRECT", "false").lower() in ("1", "true", "yes")
+    MEDIA_PRESIGNED_TTL: int = int(os.getenv("MEDIA_PRESIGNED_TTL", 300))
 
     # broker streams
     USER_STREAM_NAME: str = "user_messages"
@@ -79,11 +100,86 @@ class Settings(BaseSettings):
     EMITTER_STREAM_NAME: str = "emitters"
     EMITTER_STREAM_GROUP: str = "emitters_group"
 
+    # bot engine
+    COMPILED_BOT_CACHE_SIZE: int = int(os.getenv("COMPILED_BOT_CACHE_SIZE", 256))
+    # channel bots processing one message concurrently
+    BOT_FANOUT_CONCURRENCY: int = int(os.getenv("BOT_FANOUT_CONCURRENCY", 10))
+    # code connection groups: "inline" (worker event loop) or "process" (pre-forked pool with limits)
+    CODE_EXECUTION_MODE: str = os.getenv("CODE_EXECUTION_MODE", "inline").lower()
+    CODE_POOL_SIZE: int = int(os.getenv("CODE_POOL_SIZE", 2))
+    CODE_TIMEOUT: float = float(os.getenv("CODE_TIMEOUT", 5))
+    CODE_MEMORY_LIMIT_MB: int = int(os.getenv("CODE_MEMORY_LIMIT_MB", 256))
+
+    # bot debug logs: batched per bot, published only while someone watches the bot websocket
+    BOT_LOG_BATCH_SIZE: int = int(os.getenv("BOT_LOG_BATCH_SIZE", 50))
+    BOT_LOG_FLUSH_INTERVAL: float = float(os.getenv("BOT_LOG_FLUSH_INTERVAL", 0.5))
+    BOT_LOG_MAX_BUFFER: int = int(os.getenv("BOT_LOG_MAX_BUFFER", 1000))
+    BOT_LOG_PRESENCE_TTL: int = int(os.getenv("BOT_LOG_PRESENCE_TTL", 30))
+    BOT_LOG_PRESENCE_CACHE_TTL: float = float(os.getenv("BOT_LOG_PRESENCE_CACHE_TTL", 2))
+
+    # process-local L1 cache for DataManager (L2 is CACHE_REDIS_URL)
+    DATA_CACHE_L1_ENABLED: bool = os.getenv("DATA_CACHE_L1_ENABLED", "false").lower() in ("1", "true", "yes")
+    DATA_CACHE_L1_MAX_SIZE: int = int(os.getenv("DATA_CACHE_L1_MAX_SIZE", 10_000))
+    DATA_CACHE_L1_TTL: int = int(os.getenv("DATA_CACHE_L1_TTL", 30))
+    CACHE_INVALIDATION_CHANNEL: str = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    # sessions processed in parallel by a stream worker (messages of one session stay ordered)
+    WORKER_PARTITIONS: int = int(os.getenv("WORKER_PARTITIONS", os.getenv("DB_POOL_SIZE", 10)))
+    # "batch" (FastStream batch subscriber) or "pipeline" (XREADGROUP loop with per-message XACK)
+    WORKER_MODE: str = os.getenv("WORKER_MODE", "batch").lower()
+    WORKER_HIGH_WATER: int = int(os.getenv("WORKER_HIGH_WATER", 200))
+    WORKER_PREFETCH_MIN: int = int(os.getenv("WORKER_PREFETCH_MIN", 10))
+    WORKER_PREFETCH_MAX: int = int(os.getenv("WORKER_PREFETCH_MAX", 100))
+    WORKER_TARGET_LATENCY: float = float(os.getenv("WORKER_TARGET_LATENCY", 0.5))
+    # Prometheus /metrics of stream workers (0 disables); stream lag/pending refresh period in seconds
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", 9100))
+    WORKER_METRICS_INTERVAL: int = int(os.getenv("WORKER_METRICS_INTERVAL", 5))
+    # pending entries of dead consumers are taken over with XAUTOCLAIM;
+    # entries delivered more than STREAM_MAX_DELIVERIES times go to "<stream>:dead"
+    RECLAIM_INTERVAL: int = int(os.getenv("RECLAIM_INTERVAL", 30))
+    RECLAIM_BATCH_SIZE: int = int(os.getenv("RECLAIM_BATCH_SIZE", 100))
+    RECLAIM_MIN_IDLE_MS: int = int(os.getenv("RECLAIM_MIN_IDLE_MS", 60_000))
+    STREAM_MAX_DELIVERIES: int = int(os.getenv("STREAM_MAX_DELIVERIES", 5))
     DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
     CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://cache-redis:6389/0")
     PROXIES: str = os.getenv("PROXIES", "")
+    # outbound HTTP of request groups: clients are reused per proxy set (LRU of HTTP_CLIENT_CACHE_SIZE),
+    # HTTP/2 needs the h2 package
+    HTTP_CLIENT_CACHE_SIZE: int = int(os.getenv("HTTP_CLIENT_CACHE_SIZE", 32))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE: int = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+    HTTP_HTTP2: bool = os.getenv("HTTP_HTTP2", "false").lower() in ("1", "true", "yes")
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", 30))
+    # bulkheads: concurrent requests per destination host / per bot (0 disables),
+    # a call waiting longer than HTTP_BULKHEAD_MAX_WAIT seconds for a slot is rejected
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 20))
+    HTTP_MAX_CONNECTIONS_PER_BOT: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_BOT", 0))
+    HTTP_BULKHEAD_MAX_WAIT: float = float(os.getenv("HTTP_BULKHEAD_MAX_WAIT", 5))
+    # per-host circuit breaker: opens after N consecutive errors/timeouts/5xx (0 disables),
+    # half-opens after the cooldown and lets HTTP_CIRCUIT_HALF_OPEN_CALLS probe calls through
+    HTTP_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("HTTP_CIRCUIT_FAILURE_THRESHOLD", 5))
+    HTTP_CIRCUIT_COOLDOWN: float = float(os.getenv("HTTP_CIRCUIT_COOLDOWN", 30))
+    HTTP_CIRCUIT_HALF_OPEN_CALLS: int = int(os.getenv("HTTP_CIRCUIT_HALF_OPEN_CALLS", 1))
+    # shared cache of GET responses for requests with cache_ttl: process L1 (0 disables) + Redis L2;
+    # entries with ETag/Last-Modified stay in Redis HTTP_CACHE_STALE_TTL more seconds for revalidation
+    HTTP_CACHE_L1_MAX_SIZE: int = int(os.getenv("HTTP_CACHE_L1_MAX_SIZE", 1000))
+    HTTP_CACHE_L1_TTL: int = int(os.getenv("HTTP_CACHE_L1_TTL", 60))
+    HTTP_CACHE_STALE_TTL: int = int(os.getenv("HTTP_CACHE_STALE_TTL", 3600))
+
+    # OAuth/IAM access tokens are shared by all workers through CACHE_REDIS_URL (encrypted with SECRET_BOX_KEY);
+    # a worker waits up to AUTH_TOKEN_LOCK_TIMEOUT seconds for another one refreshing the same token
+    AUTH_TOKEN_LOCK_TIMEOUT: float = float(os.getenv("AUTH_TOKEN_LOCK_TIMEOUT", 30))
+    # tokens without expiry are kept in Redis this many seconds
+    AUTH_TOKEN_NO_EXPIRY_TTL: int = int(os.getenv("AUTH_TOKEN_NO_EXPIRY_TTL", 3600))
+    # a failed refresh makes other workers fail fast for this many seconds instead of retrying (0 disables)
+    AUTH_TOKEN_FAILURE_TTL: int = int(os.getenv("AUTH_TOKEN_FAILURE_TTL", 5))
+    # credential rows are cached in CACHE_REDIS_URL with data still encrypted (CREDENTIAL_CACHE_TTL seconds);
+    # decrypted payloads live only in process memory for CREDENTIAL_CACHE_L1_TTL seconds (0 disables)
+    CREDENTIAL_CACHE_TTL: int = int(os.getenv("CREDENTIAL_CACHE_TTL", 300))
+    CREDENTIAL_CACHE_L1_TTL: int = int(os.getenv("CREDENTIAL_CACHE_L1_TTL", 30))
+    CREDENTIAL_CACHE_L1_MAX_SIZE: int = int(os.getenv("CREDENTIAL_CACHE_L1_MAX_SIZE", 1000))
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 
     MCP_SERVICE_URL: str = os.getenv("MCP_SERVICE_URL", "http://mcp-dbcv:8005")
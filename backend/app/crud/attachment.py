@@ -1,12 +1,15 @@
+from datetime import datetime
 from typing import Type, Optional, Dict, Any
 from uuid import UUID
 
 from fastapi import HTTPException, UploadFile
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.attachment import AttachmentModel
+from app.models.attachment import AttachmentModel, AttachmentBlobModel, key_basename
 from app.services.attachment_service import AttachmentService
-from app.services.s3_service import upload_bytes
+from app.config import settings
+from app.services.s3_service import upload_stream
 
 
 async def get_attachment(session: AsyncSession, attachment_id: UUID | str,
@@ -17,18 +20,39 @@ async def get_attachment(session: AsyncSession, attachment_id: UUID | str,
     return attachment
 
 
+async def _release_blob(session: AsyncSession, attachment: AttachmentModel) -> None:
+    """Снимает ссылку вложения на общий объект; сам объект удаляет сборка мусора."""
+    if not attachment.content_hash:
+        return
+    await session.execute(
+        update(AttachmentBlobModel)
+        .where(AttachmentBlobModel.sha256 == attachment.content_hash)
+        .values(ref_count=AttachmentBlobModel.ref_count - 1, updated_at=datetime.now())
+    )
+    attachment.content_hash = None
+
+
+async def _upload_file(key: str, file: UploadFile) -> None:
+    """Загружает файл в S3 частями, не читая его целиком в память."""
+    async def chunks():
+        while chunk := await file.read(settings.S3_MULTIPART_CHUNK_SIZE):
+            yield chunk
+
+    await upload_stream(key, chunks(), content_type=file.content_type)
+
+
 async def create_attachment(
         session: AsyncSession,
         file: UploadFile,
 ) -> AttachmentModel:
 
     filename = file.filename or "file"
-    data = await file.read()
     key, _ = AttachmentService.build_storage_key(filename, file.content_type)
-    await upload_bytes(key, data, content_type=file.content_type)
+    await _upload_file(key, file)
 
     db_obj = AttachmentModel(
         file=key,
+        object_name=key_basename(key),
         content_type=file.content_type
     )
     session.add(db_obj)
@@ -43,14 +67,17 @@ async def update_attachment(
     attachment = await get_attachment(session, attachment_id)
 
     filename = file.filename or "file"
-    data = await file.read()
     key, _ = AttachmentService.build_storage_key(filename, file.content_type)
-    await upload_bytes(key, data, content_type=file.content_type)
+    await _upload_file(key, file)
+    await _release_blob(session, attachment)
 
     attachment.file = key
+    attachment.object_name = key_basename(key)
     attachment.content_type = file.content_type
     return attachment
 
 
 async def delete_attachment(session: AsyncSession, attachment_id: UUID | str) -> None:
-    await session.delete(await get_attachment(session, attachment_id))
+    attachment = await get_attachment(session, attachment_id)
+    await _release_blob(session, attachment)
+    await session.delete(attachment)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 from typing import Type
 from uuid import UUID
 
@@ -7,29 +8,24 @@ from fastapi import HTTPException
 from sqlalchemy import select, update, delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.managers.credential_cache import credential_cache
 from app.models.credentials import CredentialEntity
 from app.schemas import credentials as schemas_cred
 from app.utils.secret_box import encrypt_dict_to_blob
 
+logger = logging.getLogger(__name__)
+
 
 async def _raise_not_found() -> None:
     raise HTTPException(status_code=404, detail="Credential not found.")
 
 
-async def _invalidate_credential_cache(bot_id: str, provider: str, strategy: str) -> None:
-    """Инвалидирует кэш credentials для указанного bot_id, provider и strategy."""
-    from redis.asyncio import Redis
-    from app.config import settings
+async def invalidate_credential_cache(bot_id: UUID | str, cred_id: UUID | str | None = None) -> None:
+    """Сбрасывает кеш учёток бота; вызывать после commit."""
     try:
-        redis = Redis.from_url(settings.CACHE_REDIS_URL)
-        # Удаляем конкретные ключи кэша
-        await redis.delete(
-            f"credential:bot:{bot_id}:provider:{provider}:strategy:{strategy}:default",
-            f"credential:bot:{bot_id}:provider:{provider}:strategy:{strategy}:singleton"
-        )
-        await redis.aclose()
-    except Exception:
-        pass  # Игнорируем ошибки кэша
+        await credential_cache.invalidate(str(bot_id), str(cred_id) if cred_id else None)
+    except Exception as e:
+        logger.warning(f"Credential cache invalidation failed for bot={bot_id}: {e}")
 
 
 async def get_credential(session: AsyncSession, cred_id: UUID | str,
@@ -97,10 +93,7 @@ async def create_credential(
             strategy=cred_in.strategy.value,
             except_id=db_obj.id,
         )
-    
-    # Инвалидируем кэш credentials после создания
-    await _invalidate_credential_cache(str(cred_in.bot_id), cred_in.provider.value, cred_in.strategy.value)
-    
+
     return db_obj
 
 
@@ -129,18 +122,10 @@ async def update_credential(
                 strategy=cred.strategy,
                 except_id=cred.id,
             )
-    
-    # Инвалидируем кэш credentials после обновления
-    await _invalidate_credential_cache(str(cred.bot_id), cred.provider, cred.strategy)
 
     return cred
 
 
 async def delete_credential(session: AsyncSession, cred_id: UUID | str, bot_id: UUID | str) -> None:
     cred = await get_credential(session, cred_id, bot_id=bot_id)
-    provider = cred.provider
-    strategy = cred.strategy
     await session.delete(cred)
-    
-    # Инвалидируем кэш credentials после удаления
-    await _invalidate_credential_cache(str(bot_id), provider, strategy)
\ No newline at end of file
@@ -1,9 +1,10 @@
+import asyncio
+import copy
 import json
 import logging
 import traceback
 from abc import abstractmethod, ABC
 import random
-from copy import deepcopy
 from datetime import datetime
 from typing import Any, Optional, Dict
 from uuid import uuid4
@@ -12,15 +13,21 @@ from jqqb_evaluator.evaluator import Evaluator
 from redis.asyncio import Redis
 
 from app.auth.credentials_resolver import CredentialsResolver
-from app.auth.service import AuthService
+from app.auth.service import AuthService, auth_service
 from app.config import settings
 
 from app.database import sessionmanager
+from app.engine.code_pool import CodeProcessLostError, CodeTimeoutError, code_pool
+from app.engine.compiled_bot import CompiledBot, compiled_bot_cache
+from app.engine.dispatch_index import ConnectionRun
 from app.engine.request import make_request
-from app.engine.variables import variable_substitution_pydantic, update_variables_dict, variable_substitution
+from app.engine.templates import render_model
+from app.engine.variables import update_variables_dict, variable_substitution, \
+    replace_variables_universal
 from app.loggers import BotLogger
 from app.loggers.bot import NoopBotLogger
-from app.managers.data_manager import DataManager
+from app.metrics.pipeline import in_progress, pipeline_metrics, timed
+from app.managers.data_manager import DataManager, l1_cache
 from app.managers.message_manager import MessageManager
 from app.models.base import UUID
 from app.models.connection import SearchType
@@ -36,12 +43,16 @@ from app.services.s3_storage_service import S3StorageService
 from sqlalchemy import text
 from app.database import sessionmanager
 from app.schemas.templates import TemplateInstancePublic
-from app.utils.dict import deep_merge_dicts, get_value_by_list_keys, deep_set, get_value_by_path
-from app.engine.safe_env import safe_globals
+from app.utils.dict import LayeredContext, LazyCopyDict, deep_merge_dicts, get_value_by_list_keys, deep_set, \
+    get_value_by_path
+from app.engine.safe_env import build_globals, code_cache
 
 redis = Redis.from_url(settings.CACHE_REDIS_URL)
 logger = logging.getLogger(__name__)
 
+# Пространства переменных, которые MessageProcessor сохраняет в конце run
+PERSISTED_NAMESPACES = ("bot", "user", "channel", "session")
+
 
 class ConnectionHandler(ABC):
     @abstractmethod
@@ -51,22 +62,22 @@ class ConnectionHandler(ABC):
 
 
 class ConnectionResponseHandler(ConnectionHandler):
-    def __init__(self, bot: BotProcessor, auth: AuthService, data_manager: DataManager, logger: Optional[BotLogger] = None, ):
+    def __init__(self, bot: BotProcessor, auth: AuthService, data_manager: DataManager, logger: Optional[BotLogger] = None,
+                 compiled_bot: CompiledBot | None = None):
         self.logger = logger or NoopBotLogger()
         self.auth = auth
         self.data_manager = data_manager
         self.bot = bot
+        self.compiled_bot = compiled_bot
 
+    @timed(pipeline_metrics.handler_duration, handler="response")
     async def handle(self, connection_group: ConnectionGroupExport, context: dict,
                      all_variables: dict = {}):
         await self.logger.info("Working response handler...")
 
         try:
             if connection_group.request:
-                request_in: RequestSubstitute = await variable_substitution_pydantic(
-                    RequestSubstitute.model_validate(connection_group.request.__dict__),
-                    context=deep_merge_dicts(context, all_variables)
-                )
+                request_in: RequestSubstitute = await self._prepare_request(connection_group, context, all_variables)
         except Exception as e:
             await self.logger.error(f"Error in response handler: {e}")
             return {"response": None}
@@ -76,6 +87,7 @@ class ConnectionResponseHandler(ConnectionHandler):
                 if bot_id:
                     headers = {}
                     await self.auth.apply(
+                        resolver=CredentialsResolver(self.data_manager),
                         bot_id=str(bot_id),
                         headers=headers,
                         request_url=request_in.request_url,
@@ -89,6 +101,7 @@ class ConnectionResponseHandler(ConnectionHandler):
         except Exception as e:
             await self.logger.error(f"Auth injection failed: {e}")
 
+        files = []
         try:
             files = await self._prepare_request_files(request_in.attachments)
         except Exception as e:
@@ -103,17 +116,39 @@ class ConnectionResponseHandler(ConnectionHandler):
                 data=request_in.data,
                 files=files,
                 headers=request_in.headers,
-                proxies=request_in.proxies
+                proxies=request_in.proxies,
+                timeout=request_in.timeout,
+                cache_ttl=request_in.cache_ttl,
+                cache_key=request_in.cache_key,
+                bot_id=self.bot.id if self.bot else None,
             )
             await self.logger.info(f"Response: {result_json}")
-            for file in files:
-                file[1].close()
             return result_json
         except Exception as e:
             await self.logger.error(f"Error in response handler: {e}")
             return None
+        finally:
+            for _, (_, stream, _) in files:
+                stream.close()
+
+    async def _prepare_request(self, connection_group: ConnectionGroupExport, context: dict,
+                               all_variables: dict) -> RequestSubstitute:
+        """
+        Берёт заранее разобранный запрос из скомпилированного бота; подстановка выполняется,
+        только если в запросе есть переменные.
+        """
+        request_in = self.compiled_bot.get_request(connection_group) if self.compiled_bot else None
+        if request_in is None:
+            request_in = RequestSubstitute.model_validate(connection_group.request.__dict__)
+        elif not self.compiled_bot.is_dynamic(f"request:{connection_group.id}"):
+            return request_in
+        return render_model(request_in, LayeredContext(all_variables, context))
 
     async def _prepare_request_files(self, attachments: list | None):
+        """
+        Вложения запроса как открытые файлы: объект S3 копируется частями в SpooledTemporaryFile,
+        и httpx читает его при отправке multipart. Файлы закрывает вызывающий.
+        """
         files = []
         if not attachments:
             return files
@@ -122,23 +157,27 @@ class ConnectionResponseHandler(ConnectionHandler):
         repo = SqlAttachmentRepository(sessionmanager.engine)
         storage = S3StorageService()
 
-        for att in attachments:
-            attachment_id = att.get("id") if isinstance(att, dict) else att
-            if not attachment_id:
-                continue
-
-            meta = await repo.get_by_id(attachment_id)
-            if not meta:
-                await self.logger.info(f"Attachment not found: {attachment_id}")
-                continue
-
-            key = meta.key
-            content_type = meta.content_type or "application/octet-stream"
-            data = await storage.get_bytes(key)
-            filename = key.split("/")[-1] if isinstance(key, str) else "file"
-
-            # httpx files format supports tuples: (name, bytes, content_type)
-            files.append(("files", (filename, data, content_type)))
+        try:
+            for att in attachments:
+                attachment_id = att.get("id") if isinstance(att, dict) else att
+                if not attachment_id:
+                    continue
+
+                meta = await repo.get_by_id(attachment_id)
+                if not meta:
+                    await self.logger.info(f"Attachment not found: {attachment_id}")
+                    continue
+
+                key = meta.key
+                content_type = meta.content_type or "application/octet-stream"
+                filename = key.split("/")[-1] if isinstance(key, str) else "file"
+
+                # httpx files format supports tuples: (name, file object, content_type)
+                files.append(("files", (filename, await storage.open(key), content_type)))
+        except BaseException:
+            for _, (_, stream, _) in files:
+                stream.close()
+            raise
         return files
 
 
@@ -146,13 +185,17 @@ class ConnectionCodeHandler(ConnectionHandler):
     def __init__(self, logger):
         self.logger = logger
 
+    @timed(pipeline_metrics.handler_duration, handler="code")
     async def handle(self, connection_group: ConnectionGroupExport, context: dict,
                      all_variables: dict = {}):
         await self.logger.info("Working code handler...")
         try:
             if connection_group.code:
+                if settings.CODE_EXECUTION_MODE == "process":
+                    # Переменные передаются процессу JSON-строкой, отдельная копия не нужна
+                    return await ProcessCodeExecutor(self.logger).execute(connection_group.code, context, all_variables)
                 return await CodeExecutor(self.logger).execute(connection_group.code, context,
-                                                                               deepcopy(all_variables))
+                                                               LazyCopyDict(all_variables))
         except Exception as e:
 
             await self.logger.error(f"Error in code handler: {e}")
@@ -169,16 +212,14 @@ class CodeExecutorBase(ABC):
 class CodeExecutor(CodeExecutorBase):
     def __init__(self, logger: BotLogger):
         self.logger = logger
-        self.available_globals = safe_globals
-        self.available_globals[self.logger.print.__name__] = self.logger.print
 
     async def execute(self, code: str, context: dict | None = None, variables: dict | None = None):
         available_variables = {}
         context = context or {}
         variables = variables or {}
         try:
-            exec(compile(code, '<string>', 'exec'),
-                 {"__builtins__": None, **self.available_globals},
+            exec(code_cache.compile(code),
+                 build_globals(print=self.logger.print),
                  available_variables)
 
             if 'main' not in available_variables:
@@ -195,17 +236,40 @@ class CodeExecutor(CodeExecutorBase):
             return context
 
 
+class ProcessCodeExecutor(CodeExecutorBase):
+    """Выполняет сниппет в пуле процессов code_pool с ограничением времени и памяти."""
+
+    def __init__(self, logger: BotLogger):
+        self.logger = logger
+
+    async def execute(self, code: str, context: dict | None = None, variables: dict | None = None):
+        context = context or {}
+        try:
+            result = await code_pool.run(code, context, variables or {})
+        except (CodeTimeoutError, CodeProcessLostError) as e:
+            await self.logger.error(f"Execution error: {e}")
+            return context
+
+        for line in result.prints:
+            await self.logger.print(line)
+        if not result.ok:
+            await self.logger.error(result.error)
+            return context
+        return result.result
+
+
 class ConnectionHandlerFactory:
     @staticmethod
     def get_handler(search_type: SearchType, logger,
                     bot: BotProcessor | None = None,
                     auth: AuthService | None = None,
-                    data_manager: DataManager | None = None) -> ConnectionHandler | None:
+                    data_manager: DataManager | None = None,
+                    compiled_bot: CompiledBot | None = None) -> ConnectionHandler | None:
         match search_type:
             case SearchType.message:
                 return None
             case SearchType.response:
-                return ConnectionResponseHandler(bot, auth, data_manager, logger)
+                return ConnectionResponseHandler(bot, auth, data_manager, logger, compiled_bot)
             case SearchType.code:
                 return ConnectionCodeHandler(logger)
             case SearchType.integration:
@@ -250,6 +314,7 @@ class Processor(BaseProcessor):
         self.data_manager: DataManager = data_manager
         self.logger: BotLogger = logger
         self.all_variables = all_variables
+        self.compiled_bot: CompiledBot | None = None
         self.current_step = None
         self.context: dict[str, Any] = {}
         self.message: dict[str, Any] = {}
@@ -274,24 +339,46 @@ class Processor(BaseProcessor):
         next_step = self._get_current_step(connection.next_step_id)
         return await self._switch_to_next_step(next_step)
 
+    def _get_group_variables(self, connection_group: ConnectionGroupExport):
+        if self.compiled_bot:
+            return self.compiled_bot.get_group_variables(connection_group)
+        return connection_group.variables
+
+    def _rules_context(self, context: dict) -> LayeredContext:
+        """Контекст проверки правил: переменные бота, дополненные контекстом сообщения."""
+        safe_all_variables = self.all_variables if self.all_variables is not None else {}
+        for key, value in safe_all_variables.items():
+            if value is None:
+                safe_all_variables[key] = {}
+        return LayeredContext(context, safe_all_variables)
+
     async def _evaluate_and_switch(self, connection: ConnectionExport, context: dict) -> bool:
         await self.logger.info("Check rules and context")
-        rules_str = connection.rules
-        if not rules_str or not context:
+        rules = self.compiled_bot.get_rules(connection) if self.compiled_bot else connection.rules
+        if not rules or not context:
             return await self.switch_to_next_step(connection)
 
         await self.logger.info("Create context")
+        context = self._rules_context(context)
+
+        rule_fn = self.compiled_bot.get_rule_fn(connection) if self.compiled_bot else None
+        if rule_fn is not None:
+            await self.logger.info("Working compiled rules...")
+            try:
+                if rule_fn(context):
+                    return await self.switch_to_next_step(connection)
+            except Exception as e:
+                await self.logger.error(f"Error evaluating rules: {e}")
+            return False
 
-        safe_all_variables = self.all_variables if self.all_variables is not None else {}
-        for key, value in safe_all_variables.items():
-            if value is None:
-                safe_all_variables[key] = {}
-        context = deep_merge_dicts(safe_all_variables, context or None)
         await self.logger.info("Substitution variables...")
 
         try:
-            rules_str = await variable_substitution(rules_str, context)
-            evaluator = Evaluator(json.loads(rules_str))
+            if isinstance(rules, str) or not self.compiled_bot:
+                rules = json.loads(await variable_substitution(rules, context))
+            elif self.compiled_bot.is_dynamic(f"rules:{connection.id}"):
+                rules = await replace_variables_universal(rules, context)
+            evaluator = Evaluator(rules)
         except Exception as e:
             await self.logger.error(f"Error variable substitution: {e}")
             return False
@@ -307,23 +394,46 @@ class Processor(BaseProcessor):
         return False
 
     async def process_connection_groups(self, connection_groups: list[ConnectionGroupExport], context: dict):
-        for connection_group in connection_groups:
-            await self.logger.info("Processing connection group...")
-            resolver = CredentialsResolver(self.data_manager)
-            auth_service = AuthService(resolver)
-            handler = ConnectionHandlerFactory.get_handler(connection_group.search_type, self.logger, self.bot, auth_service, self.data_manager)
-            if handler:
-                self.context = await handler.handle(connection_group, context, self.all_variables)
-            await self._save_variables(connection_group.variables, self.context)
-            await self.logger.info("Start evaluate rules and switch step...")
-
-            for connection in connection_group.connections:
-                if await self._evaluate_and_switch(connection, self.context):
+        plan = self.compiled_bot.get_dispatch_plan(connection_groups) if self.compiled_bot else None
+        position = 0
+        while position < len(connection_groups):
+            run = plan.run_at(position) if plan else None
+            if run is not None and self.context:
+                if await self._dispatch_run(run):
                     return True
+                position = run.end
+                continue
+
+            if await self._process_connection_group(connection_groups[position], context):
+                return True
+            position += 1
 
         await self.logger.info("No connection matched in group.")
         return False
 
+    async def _process_connection_group(self, connection_group: ConnectionGroupExport, context: dict) -> bool:
+        await self.logger.info("Processing connection group...")
+        handler = ConnectionHandlerFactory.get_handler(connection_group.search_type, self.logger, self.bot,
+                                                       auth_service, self.data_manager, self.compiled_bot)
+        if handler:
+            self.context = await handler.handle(connection_group, context, self.all_variables)
+        await self._save_variables(self._get_group_variables(connection_group), self.context)
+        await self.logger.info("Start evaluate rules and switch step...")
+
+        for connection in connection_group.connections:
+            if await self._evaluate_and_switch(connection, self.context):
+                return True
+        return False
+
+    async def _dispatch_run(self, run: ConnectionRun) -> bool:
+        """Проверяет прогон групп поиска по сообщению: только связи-кандидаты из индекса, в исходном порядке."""
+        candidates = run.index.candidates(self._rules_context(self.context))
+        await self.logger.info(f"Dispatch index: {len(candidates)} of {len(run.index.connections)} connection(s)")
+        for connection in candidates:
+            if await self._evaluate_and_switch(connection, self.context):
+                return True
+        return False
+
     async def _switch_to_next_step(self, next_step: StepExport):
         """
             Выполняет переход к следующему шагу.
@@ -338,7 +448,7 @@ class Processor(BaseProcessor):
         for key, value in safe_all_variables.items():
             if value is None:
                 safe_all_variables[key] = {}
-        context = deep_merge_dicts(safe_all_variables, self.message)
+        context = LayeredContext(self.message, safe_all_variables)
 
         if next_step.message:
             await self.logger.info("Create step message...")
@@ -437,13 +547,12 @@ class MessageProcessor(Processor):
                  data_manager: DataManager):
         super().__init__(logger, {}, data_manager)
         self.sender_id = sender_id
-        cache_structure = bot.get("cache_structure")
-        if not isinstance(cache_structure, dict):
-            raise ValueError(f"Invalid bot id-{bot.get('id')}: missing cache_structure")
-        self.bot = BotProcessor(**cache_structure)
+        self.compiled_bot = compiled_bot_cache.get_or_compile(bot)
+        self.bot: BotProcessor = self.compiled_bot.bot
         self.channel = ChannelSimple(**channel)
         self.message: dict[str, Any] = message
         self.all_variables = None
+        self._variables_snapshot: dict[str, dict[str, str]] = {}
         self.session = None
         self.current_step = None
         self.context: dict[str, Any] = {}
@@ -466,12 +575,13 @@ class MessageProcessor(Processor):
         for key, value in safe_all_variables.items():
             if value is None:
                 safe_all_variables[key] = {}
-        context = deep_merge_dicts(safe_all_variables, self.message)
+        context = LayeredContext(self.message, safe_all_variables)
 
         if next_step.message:
             await self.logger.info("Create step message...")
             message_service = MessageService(engine=sessionmanager.engine)
-            await message_service.send_message(self.session, next_step.message, context=context)
+            await message_service.send_message(self.session, next_step.message, context=context,
+                                               substitute=self.compiled_bot.is_dynamic(f"message:{next_step.id}"))
         if next_step.template_instance:
             await self.logger.info("Processing template...")
 
@@ -489,11 +599,47 @@ class MessageProcessor(Processor):
         return True
 
     def _get_current_step(self, step_id):
-        for step in self.bot.steps:
-            if step.id == step_id:
-                return step
+        return self.compiled_bot.get_step(step_id)
+
+    @staticmethod
+    def _dump_namespace(variables: Any) -> dict[str, str]:
+        if not isinstance(variables, dict):
+            return {}
+        return {key: json.dumps(value, sort_keys=True, default=str) for key, value in variables.items()}
+
+    def _changed_namespaces(self) -> dict[str, tuple[dict, list[str]]]:
+        """
+        Изменения переменных относительно загруженных в начале run:
+        {namespace: (новые/изменённые ключи верхнего уровня, удалённые ключи)}.
+        """
+        changes = {}
+        for namespace in PERSISTED_NAMESPACES:
+            variables = self.all_variables.get(namespace)
+            variables = variables if isinstance(variables, dict) else {}
+            current = self._dump_namespace(variables)
+            loaded = self._variables_snapshot.get(namespace, {})
+            patch = {key: variables[key] for key, value in current.items() if loaded.get(key) != value}
+            removed = [key for key in loaded if key not in current]
+            if patch or removed:
+                changes[namespace] = (patch, removed)
+        return changes
+
+    async def _flush_state(self):
+        """Сохраняет изменившиеся переменные и шаг сессии."""
+        step_id = None
+        if str(self.current_step.id) != str(self.session.step_id):
+            step_id = self.current_step.id
+        self.session.step_id = self.current_step.id
+        await self.data_manager.flush_changes(self.sender_id, self.bot.id, self.channel.id, self.session.id,
+                                              self._changed_namespaces(), step_id)
 
     async def run(self, *args, **kwargs):
+        try:
+            await self._run()
+        finally:
+            await self.logger.flush()
+
+    async def _run(self):
         await self.logger.info("Start working bot...")
         await self.logger.info("Get or create session...")
 
@@ -509,16 +655,12 @@ class MessageProcessor(Processor):
         for key, value in self.all_variables.items():
             if value is None:
                 self.all_variables[key] = {}
+        self._variables_snapshot = {namespace: self._dump_namespace(self.all_variables.get(namespace))
+                                    for namespace in PERSISTED_NAMESPACES}
         self.context = self.message
         await self.logger.info("Check master groups...")
         if await self.process_connection_groups(self.bot.master_connection_groups, self.context):
-            await self.data_manager.update_all_variables(self.sender_id, self.bot.id, self.channel.id,
-                                                         self.session.id, self.all_variables)
-            self.session.step_id = self.current_step.id
-            await self.data_manager.update_session(self.session.user_id,
-                                                   self.session.bot_id,
-                                                   self.session.channel_id,
-                                                   self.session.step_id)
+            await self._flush_state()
             return
 
         await self.logger.info("Check groups...")
@@ -527,28 +669,38 @@ class MessageProcessor(Processor):
         self.logger.set_step(self.current_step.id)
 
         if await self.process_connection_groups(self.current_step.connection_groups, self.context):
-            await self.data_manager.update_all_variables(self.sender_id, self.bot.id, self.channel.id,
-                                                         self.session.id, self.all_variables)
-            self.session.step_id = self.current_step.id
-            await self.data_manager.update_session(self.session.user_id,
-                                                   self.session.bot_id,
-                                                   self.session.channel_id,
-                                                   self.session.step_id)
+            await self._flush_state()
             return
 
         await self.logger.info("No transitions triggered, committing any updated variables.")
-        await self.data_manager.update_all_variables(self.sender_id, self.bot.id, self.channel.id,
-                                                     self.session.id, self.all_variables)
-        self.session.step_id = self.current_step.id
-        await self.data_manager.update_session(self.session.user_id,
-                                               self.session.bot_id,
-                                               self.session.channel_id,
-                                               self.session.step_id)
+        await self._flush_state()
+
+
+async def run_bots_concurrently(sender_id: str, bots: list[dict], channel: dict, message: dict,
+                                data_manager: DataManager):
+    """
+    Обрабатывает сообщение всеми ботами канала параллельно (не больше BOT_FANOUT_CONCURRENCY одновременно).
+    Ошибка одного бота не влияет на остальных.
+    Каждый бот получает свою копию message: кодовые группы меняют context на месте.
+    """
+    semaphore = asyncio.Semaphore(settings.BOT_FANOUT_CONCURRENCY)
+
+    async def run_bot(bot: dict):
+        async with semaphore:
+            try:
+                message_processor = MessageProcessor(sender_id, bot, channel, copy.deepcopy(message), data_manager)
+                await message_processor.run()
+            except Exception as e:
+                logger.error(f"[ERROR][check_message] bot {bot.get('id')}: {e}")
 
+    await asyncio.gather(*(run_bot(bot) for bot in bots))
 
+
+@in_progress(pipeline_metrics.messages_in_flight)
+@timed(pipeline_metrics.message_duration)
 async def check_message(message: dict, channel_id: UUID | str | None = None):
     """Check and process a message."""
-    data_manager = DataManager(redis, sessionmanager.engine)
+    data_manager = DataManager(redis, sessionmanager.engine, l1_cache)
 
     channel = await data_manager.get_channel(channel_id)
     logger.info("Start check message")
@@ -565,24 +717,11 @@ async def check_message(message: dict, channel_id: UUID | str | None = None):
     sender_id = message_obj.get("sender_id")
     if not recipient_id:
         default_bot_id = channel.get("default_bot_id")
-        bot = await data_manager.get_bot(default_bot_id)
-        try:
-            message_processor = MessageProcessor(sender_id, bot, channel, message, data_manager)
-        except Exception as e:
-            logger.error(f"[ERROR][check_message] {e}")
-            return
-        await message_processor.run()
         subscribers = await data_manager.get_channel_subscribers(channel_id)
-        for subscriber in subscribers:
-            subscriber_id = subscriber.get("id")
-            if subscriber_id != default_bot_id:
-                bot = await data_manager.get_bot(subscriber_id)
-                try:
-                    message_processor = MessageProcessor(sender_id, bot, channel, message, data_manager)
-                except Exception as e:
-                    logger.error(f"[ERROR][check_message] {e}")
-                    return
-                await message_processor.run()
+        bot_ids = [default_bot_id] + [subscriber.get("id") for subscriber in subscribers
+                                      if subscriber.get("id") and str(subscriber.get("id")) != str(default_bot_id)]
+        bots = await data_manager.get_bots([bot_id for bot_id in bot_ids if bot_id])
+        await run_bots_concurrently(sender_id, list(bots.values()), channel, message, data_manager)
         return True
 
     if recipient_id:
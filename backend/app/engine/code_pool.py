@@ -0,0 +1,150 @@
+"""Пул заранее запущенных процессов для выполнения кодовых групп с ограничением времени и памяти."""
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.config import settings
+from app.engine.code_worker import READY, serve
+from app.metrics.code import code_metrics
+
+logger = logging.getLogger(__name__)
+
+_mp = multiprocessing.get_context("spawn")
+
+# Время на запуск процесса (импорт модулей) — не входит в timeout сниппета
+STARTUP_TIMEOUT = 30
+
+
+class CodeTimeoutError(Exception):
+    pass
+
+
+class CodeProcessLostError(Exception):
+    pass
+
+
+@dataclass
+class CodeResult:
+    ok: bool
+    result: Any = None
+    error: str | None = None
+    prints: list[str] = field(default_factory=list)
+
+
+class _PoolProcess:
+    def __init__(self, memory_limit_mb: int):
+        self.conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(target=serve, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    async def wait_ready(self) -> None:
+        if self.ready:
+            return
+        message = await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(None, self.conn.recv),
+                                         timeout=STARTUP_TIMEOUT)
+        if message != READY:
+            raise CodeProcessLostError(f"Unexpected message from pool process: {message!r}")
+        self.ready = True
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class CodeProcessPool:
+    """
+    Выполняет сниппеты в size дочерних процессах. Контекст и переменные передаются JSON-строками.
+    Процесс, превысивший timeout или упавший (например, по лимиту памяти), убивается и заменяется новым.
+    """
+
+    def __init__(self, size: int = 2, timeout: float = 5.0, memory_limit_mb: int = 256):
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._idle: asyncio.Queue[_PoolProcess] | None = None
+        self._processes: list[_PoolProcess] = []
+
+    def start(self) -> None:
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._spawn()
+        logger.info(f"Code process pool started: {self.size} processes")
+
+    def _spawn(self) -> None:
+        process = _PoolProcess(self.memory_limit_mb)
+        self._processes.append(process)
+        self._idle.put_nowait(process)
+
+    def _replace(self, process: _PoolProcess, reason: str) -> None:
+        code_metrics.inc_kill(reason)
+        process.kill()
+        if self._idle is None:
+            # Пул уже закрыт
+            return
+        self._processes.remove(process)
+        self._spawn()
+
+    async def run(self, code: str, context: dict, variables: dict) -> CodeResult:
+        self.start()
+        payload = (code, json.dumps(context, default=str), json.dumps(variables, default=str))
+
+        waited = time.monotonic()
+        process = await self._idle.get()
+        code_metrics.observe_queue_wait(time.monotonic() - waited)
+
+        loop = asyncio.get_running_loop()
+        try:
+            await process.wait_ready()
+        except asyncio.CancelledError:
+            # Ответ старта может прийти позже и сбить протокол — процесс не возвращаем в пул
+            self._replace(process, "cancelled")
+            raise
+        except (asyncio.TimeoutError, EOFError, OSError, CodeProcessLostError) as e:
+            self._replace(process, "startup")
+            raise CodeProcessLostError(f"Execution process failed to start: {e}")
+
+        started = time.monotonic()
+        try:
+            process.conn.send(payload)
+            ok, result, prints = await asyncio.wait_for(loop.run_in_executor(None, process.conn.recv),
+                                                         timeout=self.timeout)
+        except asyncio.CancelledError:
+            # Сниппет ещё выполняется — процесс заменяем, иначе слот пула теряется навсегда
+            self._replace(process, "cancelled")
+            raise
+        except asyncio.TimeoutError:
+            self._replace(process, "timeout")
+            raise CodeTimeoutError(f"Execution timed out after {self.timeout}s")
+        except (EOFError, OSError) as e:
+            self._replace(process, "lost")
+            raise CodeProcessLostError(f"Execution process died: {e}")
+        finally:
+            code_metrics.observe_run(time.monotonic() - started)
+
+        self._idle.put_nowait(process)
+        if ok:
+            return CodeResult(ok=True, result=json.loads(result), prints=prints)
+        return CodeResult(ok=False, error=result, prints=prints)
+
+    async def close(self) -> None:
+        for process in self._processes:
+            process.kill()
+        self._processes = []
+        self._idle = None
+
+
+code_pool = CodeProcessPool(
+    size=settings.CODE_POOL_SIZE,
+    timeout=settings.CODE_TIMEOUT,
+    memory_limit_mb=settings.CODE_MEMORY_LIMIT_MB,
+)
@@ -0,0 +1,55 @@
+"""Дочерний процесс пула CodeProcessPool: выполняет сниппеты кодовых групп вне event loop воркера."""
+import asyncio
+import json
+import traceback
+
+from app.engine.safe_env import build_globals, code_cache
+
+
+# Первое сообщение процесса после импорта и установки лимитов
+READY = "ready"
+
+
+def _set_memory_limit(memory_limit_mb: int) -> None:
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+async def _run(code: str, context: dict, variables: dict, prints: list) -> tuple[bool, object]:
+    async def sandbox_print(*args, sep=' ', end='\n'):
+        prints.append((sep.join(str(arg) for arg in args) + end).rstrip('\n'))
+
+    available_variables = {}
+    exec(code_cache.compile(code), build_globals(print=sandbox_print), available_variables)
+    if 'main' not in available_variables:
+        return False, "Error: функция 'main' не определена."
+    return True, await available_variables['main'](context, variables=variables)
+
+
+def serve(conn, memory_limit_mb: int = 0) -> None:
+    """
+    Цикл дочернего процесса: принимает (code, context_json, variables_json),
+    отвечает (ok, result_json | error, prints). Завершается, когда родитель закрывает канал.
+    """
+    _set_memory_limit(memory_limit_mb)
+    conn.send(READY)
+    while True:
+        try:
+            code, context_json, variables_json = conn.recv()
+        except (EOFError, OSError):
+            return
+        prints: list[str] = []
+        try:
+            ok, result = asyncio.run(_run(code, json.loads(context_json), json.loads(variables_json), prints))
+            payload = json.dumps(result, default=str) if ok else result
+        except MemoryError:
+            ok, payload = False, "Execution error: memory limit exceeded"
+        except BaseException as e:
+            ok, payload = False, "Execution error:\n" + ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+        conn.send((ok, payload, prints))
@@ -0,0 +1,226 @@
+"""Скомпилированное представление структуры бота для MessageProcessor."""
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Iterator
+
+from app.config import settings
+from app.engine.dispatch_index import DispatchPlan
+from app.engine.rules import RuleCompileError, RuleFn, compile_rules
+from app.engine.safe_env import code_cache
+from app.engine.variables import contains_variables
+from app.schemas.bot import BotProcessor
+from app.schemas.connection import ConnectionExport, ConnectionGroupExport
+from app.schemas.request import RequestSubstitute
+from app.schemas.step import StepExport
+
+logger = logging.getLogger(__name__)
+
+STRUCTURE_VERSION_KEY = "structure_version"
+
+
+def structure_version(cache_structure: dict) -> str:
+    """
+    Возвращает версию структуры бота.
+    Берёт хеш, записанный cache_structure_bot, либо считает его по содержимому (старые кеши).
+    """
+    version = cache_structure.get(STRUCTURE_VERSION_KEY)
+    if version:
+        return str(version)
+    return compute_structure_version(cache_structure)
+
+
+def compute_structure_version(cache_structure: dict) -> str:
+    payload = {k: v for k, v in cache_structure.items() if k != STRUCTURE_VERSION_KEY}
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def compile_code(code: str) -> str | None:
+    """Компилирует сниппет кодовой группы в code_cache. Возвращает текст ошибки или None."""
+    try:
+        code_cache.compile(code)
+    except (SyntaxError, ValueError) as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def check_code_snippets(cache_structure: dict) -> dict[str, str]:
+    """Ошибки компиляции кодовых групп в экспортированной структуре бота: {group_id: ошибка}."""
+    groups = list(cache_structure.get("master_connection_groups") or [])
+    for step in cache_structure.get("steps") or []:
+        groups.extend(step.get("connection_groups") or [])
+    errors = {}
+    for group in groups:
+        if group.get("code"):
+            error = compile_code(group["code"])
+            if error:
+                errors[str(group.get("id"))] = error
+    return errors
+
+
+class CompiledBot:
+    """
+    Структура бота, разобранная один раз на версию cache_structure.
+    Содержит индекс шагов, разобранные variables групп, правила связей
+    (в том числе скомпилированные в функции) и заранее подготовленные шаблоны подстановки.
+    """
+
+    def __init__(self, cache_structure: dict, version: str | None = None):
+        self.version = version or structure_version(cache_structure)
+        self.bot = BotProcessor(**cache_structure)
+        self.steps: dict[str, StepExport] = {str(step.id): step for step in self.bot.steps}
+        self.group_variables: dict[str, Any] = {}
+        self.rules: dict[str, Any] = {}
+        self.rule_fns: dict[str, RuleFn] = {}
+        self.requests: dict[str, RequestSubstitute] = {}
+        self.code_errors: dict[str, str] = {}
+        self._dispatch_plans: dict[tuple[str, ...], DispatchPlan] = {}
+        # Ключи шаблонов ("message:<step_id>", "request:<group_id>", "rules:<connection_id>"),
+        # в которых встречаются переменные {$...$}
+        self.dynamic_templates: set[str] = set()
+
+        for step in self.bot.steps:
+            if step.message and contains_variables(step.message.model_dump()):
+                self.dynamic_templates.add(f"message:{step.id}")
+        for group in self._iter_groups():
+            self._compile_group(group)
+        self.get_dispatch_plan(self.bot.master_connection_groups)
+        for step in self.bot.steps:
+            self.get_dispatch_plan(step.connection_groups)
+
+    def _iter_groups(self) -> Iterator[ConnectionGroupExport]:
+        yield from self.bot.master_connection_groups
+        for step in self.bot.steps:
+            yield from step.connection_groups
+
+    def _compile_group(self, group: ConnectionGroupExport) -> None:
+        group_id = str(group.id)
+        variables = group.variables
+        if isinstance(variables, str):
+            try:
+                variables = json.loads(variables)
+            except json.JSONDecodeError:
+                logger.warning(f"Invalid variables in connection group {group_id}")
+        self.group_variables[group_id] = variables
+
+        if group.request:
+            request = RequestSubstitute.model_validate(group.request.__dict__)
+            self.requests[group_id] = request
+            if contains_variables(request.model_dump()):
+                self.dynamic_templates.add(f"request:{group_id}")
+
+        if group.code:
+            error = compile_code(group.code)
+            if error:
+                self.code_errors[group_id] = error
+                logger.warning(f"Code in connection group {group_id} does not compile: {error}")
+
+        for connection in group.connections:
+            self._compile_rules(connection)
+
+    def _compile_rules(self, connection: ConnectionExport) -> None:
+        connection_id = str(connection.id)
+        rules = connection.rules
+        if isinstance(rules, str):
+            try:
+                rules = json.loads(rules)
+            except json.JSONDecodeError:
+                pass
+        self.rules[connection_id] = rules
+        if contains_variables(rules):
+            self.dynamic_templates.add(f"rules:{connection_id}")
+        if rules and isinstance(rules, dict):
+            try:
+                self.rule_fns[connection_id] = compile_rules(rules)
+            except RuleCompileError as e:
+                logger.debug(f"Rules of connection {connection_id} are evaluated without compilation: {e}")
+
+    @property
+    def id(self):
+        return self.bot.id
+
+    def get_step(self, step_id) -> StepExport | None:
+        if step_id is None:
+            return None
+        return self.steps.get(str(step_id))
+
+    def get_group_variables(self, group: ConnectionGroupExport) -> Any:
+        return self.group_variables.get(str(group.id), group.variables)
+
+    def get_rules(self, connection: ConnectionExport) -> Any:
+        return self.rules.get(str(connection.id), connection.rules)
+
+    def get_rule_fn(self, connection: ConnectionExport) -> RuleFn | None:
+        return self.rule_fns.get(str(connection.id))
+
+    def get_dispatch_plan(self, groups: list[ConnectionGroupExport]) -> DispatchPlan:
+        """План диспетчеризации для списка групп (master или шага), строится один раз."""
+        key = tuple(str(group.id) for group in groups)
+        plan = self._dispatch_plans.get(key)
+        if plan is None:
+            plan = DispatchPlan(groups, self.group_variables, self.rules)
+            self._dispatch_plans[key] = plan
+        return plan
+
+    def get_request(self, group: ConnectionGroupExport) -> RequestSubstitute | None:
+        request = self.requests.get(str(group.id))
+        return request.model_copy(deep=True) if request is not None else None
+
+    def is_dynamic(self, template_key: str) -> bool:
+        return template_key in self.dynamic_templates
+
+
+class CompiledBotCache:
+    """
+    Ограниченный LRU-кеш скомпилированных ботов внутри процесса.
+    Хранит одну версию на бота: при смене structure_version старая запись вытесняется.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._items: OrderedDict[str, CompiledBot] = OrderedDict()
+
+    def get_or_compile(self, bot: dict[str, Any]) -> CompiledBot:
+        cache_structure = bot.get("cache_structure")
+        if not isinstance(cache_structure, dict):
+            raise ValueError(f"Invalid bot id-{bot.get('id')}: missing cache_structure")
+
+        bot_id = str(bot.get("id") or cache_structure.get("id"))
+        version = structure_version(cache_structure)
+
+        compiled = self._items.get(bot_id)
+        if compiled is not None and compiled.version == version:
+            self._items.move_to_end(bot_id)
+            return compiled
+
+        compiled = CompiledBot(cache_structure, version)
+        self._items[bot_id] = compiled
+        self._items.move_to_end(bot_id)
+        while len(self._items) > self.max_size:
+            evicted_id, _ = self._items.popitem(last=False)
+            logger.debug(f"Compiled bot evicted: {evicted_id}")
+        logger.debug(f"Compiled bot {bot_id} version {version}")
+        return compiled
+
+    def invalidate(self, bot_id) -> None:
+        self._items.pop(str(bot_id), None)
+
+    def handle_invalidation(self, key: str) -> None:
+        """Обработчик канала инвалидации DataManager: реагирует на ключи вида bot:<id> и "*"."""
+        if key == "*":
+            self.clear()
+            return
+        parts = key.split(":")
+        if len(parts) == 2 and parts[0] == "bot":
+            self.invalidate(parts[1])
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+compiled_bot_cache = CompiledBotCache(max_size=settings.COMPILED_BOT_CACHE_SIZE)
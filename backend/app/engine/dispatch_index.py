@@ -0,0 +1,104 @@
+"""
+Индекс диспетчеризации связей по равенству полей сообщения.
+
+Подряд идущие группы поиска по сообщению без variables проверяются одним проходом:
+связи с правилом вида "field equal value" раскладываются в хеш-таблицы,
+остальные проверяются как раньше. Порядок первого совпадения сохраняется.
+"""
+from typing import Any, Iterable
+
+from app.engine.rules import equality_terms, make_cast, walk_field
+from app.models.connection import SearchType
+from app.schemas.connection import ConnectionExport, ConnectionGroupExport
+
+
+class ConnectionIndex:
+    """Связи одного прогона групп в исходном порядке и хеш-таблицы {(field, type): {значение: [позиции]}}."""
+
+    def __init__(self, connections: list[ConnectionExport], rules: dict[str, Any]):
+        self.connections = connections
+        # Позиции связей, которые проверяются всегда
+        self.fallback: list[int] = []
+        self.tables: dict[tuple[str, str], dict[Any, list[int]]] = {}
+        self._readers: dict[tuple[str, str], tuple[list[str], Any]] = {}
+
+        for position, connection in enumerate(connections):
+            term = equality_terms(rules.get(str(connection.id)))
+            if term is None:
+                self.fallback.append(position)
+                continue
+            field, type_, values = term
+            typecast = make_cast(type_)
+            try:
+                keys = {typecast(value) for value in values}
+            except (TypeError, ValueError):
+                self.fallback.append(position)
+                continue
+            table = self.tables.setdefault((field, type_), {})
+            self._readers[(field, type_)] = (field.split("."), typecast)
+            for key in keys:
+                table.setdefault(key, []).append(position)
+
+    @property
+    def indexed_count(self) -> int:
+        return len(self.connections) - len(self.fallback)
+
+    def _lookup(self, table_key: tuple[str, str], context: dict) -> Iterable[int]:
+        table = self.tables[table_key]
+        fields, typecast = self._readers[table_key]
+        try:
+            value = walk_field(context, fields)
+            keys = [typecast(item) for item in value] if isinstance(value, list) else [typecast(value)]
+            return [position for key in keys for position in table.get(key, ())]
+        except Exception:
+            # Правила упадут и при обычной проверке — проверяем их как раньше, чтобы ошибка попала в лог
+            return [position for positions in table.values() for position in positions]
+
+    def candidates(self, context: dict) -> list[ConnectionExport]:
+        """Связи, которые могут сработать на контексте, в исходном порядке."""
+        positions = set(self.fallback)
+        for table_key in self.tables:
+            positions.update(self._lookup(table_key, context))
+        return [self.connections[position] for position in sorted(positions)]
+
+
+class ConnectionRun:
+    """Прогон групп connection_groups[start:end], проверяемый через индекс."""
+
+    def __init__(self, start: int, end: int, index: ConnectionIndex):
+        self.start = start
+        self.end = end
+        self.index = index
+
+
+def is_plain_message_group(group: ConnectionGroupExport, variables: Any) -> bool:
+    """Группа без обработчика и без сохранения переменных: контекст между её связями не меняется."""
+    return group.search_type == SearchType.message and not variables and not group.code and not group.request
+
+
+class DispatchPlan:
+    """Прогоны индексируемых групп в списке connection_groups, по индексу первой группы прогона."""
+
+    def __init__(self, groups: list[ConnectionGroupExport], group_variables: dict[str, Any],
+                 rules: dict[str, Any]):
+        self.runs: dict[int, ConnectionRun] = {}
+        start = None
+        for position, group in enumerate(list(groups) + [None]):
+            plain = group is not None and is_plain_message_group(group, group_variables.get(str(group.id)))
+            if plain and start is None:
+                start = position
+            elif not plain and start is not None:
+                self._add_run(groups, start, position, rules)
+                start = None
+
+    def _add_run(self, groups: list[ConnectionGroupExport], start: int, end: int, rules: dict[str, Any]) -> None:
+        connections = [connection for group in groups[start:end] for connection in group.connections]
+        index = ConnectionIndex(connections, rules)
+        if index.indexed_count:
+            self.runs[start] = ConnectionRun(start, end, index)
+
+    def run_at(self, position: int) -> ConnectionRun | None:
+        return self.runs.get(position)
+
+    def __bool__(self) -> bool:
+        return bool(self.runs)
@@ -0,0 +1,80 @@
+"""Партиционированный диспетчер сообщений для воркеров FastStream."""
+import asyncio
+import zlib
+from typing import Any, Awaitable, Callable
+
+
+def session_partition_key(message_data: Any) -> str:
+    """
+    Ключ партиции сообщения из стрима: (sender_id, channel_id).
+    Сессии пишутся по ключу session:user:<sender>:bot:<bot>:channel:<channel>, а рассылка в канал
+    задевает сессии всех ботов канала — поэтому личные сообщения боту и сообщения в канал
+    одного пользователя в одном канале обрабатываются в одной партиции по очереди.
+    """
+    if not isinstance(message_data, dict):
+        return ""
+    message = message_data.get("message")
+    if isinstance(message, dict) and isinstance(message.get("message"), dict):
+        message = message["message"]
+    if not isinstance(message, dict):
+        return ""
+    channel_id = message.get("channel_id") or message_data.get("channel_id")
+    return f"{message.get('sender_id')}:{channel_id}"
+
+
+class PartitionedDispatcher:
+    """
+    Выполняет сообщения в N партициях: внутри партиции строго по очереди,
+    разные партиции — параллельно. Партиция выбирается по crc32 ключа сессии.
+    """
+
+    def __init__(self, handler: Callable[[Any], Awaitable[Any]], partitions: int):
+        if partitions < 1:
+            raise ValueError("partitions must be >= 1")
+        self.handler = handler
+        self.partitions = partitions
+        self._queues: list[asyncio.Queue] = []
+        self._workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self.partitions)]
+        self._workers = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = []
+
+    def partition_for(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.partitions
+
+    def submit(self, key: str, item: Any) -> asyncio.Future:
+        """Ставит сообщение в очередь партиции; future завершится результатом обработчика."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[self.partition_for(key)].put_nowait((item, future))
+        return future
+
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item, future = await queue.get()
+            try:
+                result = await self.handler(item)
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
@@ -4,11 +4,12 @@ from uuid import UUID
 
 from app.engine.bot_processor import ConnectionHandler
 from app.engine.variables import replace_variables_universal
-from app.utils.dict import deep_merge_dicts
+from app.utils.dict import LayeredContext
 from app.integrations.registry import registry
 from app.auth.credentials_resolver import CredentialsResolver
 from app.managers.data_manager import DataManager
 from app.loggers.bot import BotLogger
+from app.metrics.pipeline import pipeline_metrics, timed
 from app.schemas.connection import ConnectionGroupExport
 
 
@@ -27,6 +28,7 @@ class ConnectionIntegrationHandler(ConnectionHandler):
         else:
             self.bot_id = bot_id
     
+    @timed(pipeline_metrics.handler_duration, handler="integration")
     async def handle(
         self,
         connection_group: ConnectionGroupExport,
@@ -59,8 +61,8 @@ class ConnectionIntegrationHandler(ConnectionHandler):
             return None
         
         # Подставляем переменные в конфигурацию интеграции
-        # Объединяем context и all_variables для подстановки
-        merged_context = deep_merge_dicts(context, all_variables)
+        # Объединяем context и all_variables для подстановки (без копирования)
+        merged_context = LayeredContext(all_variables, context)
         
         try:
             # Подставляем переменные в config (рекурсивно для всех значений)
@@ -1,30 +1,183 @@
-from httpx import AsyncClient, Response, Limits, Timeout, AsyncHTTPTransport
+import base64
+import json
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+from httpx import USE_CLIENT_DEFAULT, AsyncBaseTransport, AsyncClient, AsyncHTTPTransport, Limits, Response, Timeout, \
+    URL
 
-global_http_client = AsyncClient(
-    timeout=Timeout(30.0),
-    limits=Limits(
-        max_connections=100,           # до 100 одновременных соединений (параллельных)
-        max_keepalive_connections=20   # держать открытыми 20 соединений
-    ),
+from app.config import settings
+from app.engine.resilience import outbound_guard
+from app.engine.response_cache import CACHEABLE_METHODS, response_cache, response_cache_key
+
+logger = logging.getLogger(__name__)
+
+TEXT_CONTENT_TYPES = ("text/", "application/xml", "application/javascript", "application/x-www-form-urlencoded")
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_proxies(proxies: str | dict | None) -> tuple[tuple[str, str], ...]:
+    """
+    Нормализует поле proxies запроса в ключ реестра: ((шаблон, url прокси), ...).
+    Строка — один прокси для всех запросов, JSON-объект/словарь — {"http://": url, "https://": url}.
+    """
+    if not proxies:
+        return ()
+    if isinstance(proxies, str):
+        proxies = proxies.strip()
+        if not proxies.startswith("{"):
+            return (("all://", proxies),)
+        proxies = json.loads(proxies)
+    return tuple(sorted((str(pattern), str(url)) for pattern, url in proxies.items() if url))
+
+
+class HttpClientRegistry:
+    """
+    Переиспользуемые AsyncClient для make_request: один клиент на набор прокси.
+    Клиенты с прокси хранятся в LRU на max_clients записей; вытесненный клиент закрывается,
+    как только завершатся запросы, которые его используют. Клиент без прокси не вытесняется.
+    """
+
+    def __init__(self, max_clients: int = 32, max_connections: int = 100, max_keepalive: int = 20,
+                 http2: bool = False, timeout: float = 30.0, transport: AsyncBaseTransport | None = None):
+        if http2 and not http2_available():
+            logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        self.max_clients = max_clients
+        self.limits = Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.http2 = http2
+        self.timeout = Timeout(timeout)
+        # Подменяет сетевой транспорт всех клиентов (тесты, бенчмарки)
+        self._transport = transport
+        self._default: AsyncClient | None = None
+        self._clients: OrderedDict[tuple[tuple[str, str], ...], AsyncClient] = OrderedDict()
+        self._leases: dict[AsyncClient, int] = {}
+        self._retired: set[AsyncClient] = set()
+
+    def _make_transport(self, proxy: str | None = None) -> AsyncBaseTransport:
+        if self._transport is not None:
+            return self._transport
+        if proxy is None:
+            return AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+        return AsyncHTTPTransport(proxy=proxy, limits=self.limits, http2=self.http2, local_address="0.0.0.0")
+
+    def _create(self, proxies: tuple[tuple[str, str], ...]) -> AsyncClient:
+        if not proxies:
+            return AsyncClient(timeout=self.timeout, transport=self._make_transport())
+        return AsyncClient(timeout=self.timeout,
+                           mounts={pattern: self._make_transport(url) for pattern, url in proxies})
+
+    async def _acquire(self, proxies: tuple[tuple[str, str], ...]) -> AsyncClient:
+        if not proxies:
+            if self._default is None:
+                self._default = self._create(proxies)
+            return self._default
+
+        client = self._clients.get(proxies)
+        if client is not None:
+            self._clients.move_to_end(proxies)
+            return client
+
+        client = self._clients[proxies] = self._create(proxies)
+        while len(self._clients) > self.max_clients:
+            _, evicted = self._clients.popitem(last=False)
+            if self._leases.get(evicted):
+                self._retired.add(evicted)
+            else:
+                await evicted.aclose()
+        return client
+
+    @asynccontextmanager
+    async def lease(self, proxies: str | dict | None = None) -> AsyncIterator[AsyncClient]:
+        """Выдаёт клиент для набора прокси на время запроса."""
+        client = await self._acquire(parse_proxies(proxies))
+        self._leases[client] = self._leases.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            self._leases[client] -= 1
+            if not self._leases[client]:
+                del self._leases[client]
+                if client in self._retired:
+                    self._retired.discard(client)
+                    await client.aclose()
+
+    def __len__(self) -> int:
+        return len(self._clients) + (self._default is not None)
+
+    async def aclose(self) -> None:
+        clients = [*self._clients.values(), *self._retired]
+        if self._default is not None:
+            clients.append(self._default)
+        self._clients.clear()
+        self._retired.clear()
+        self._default = None
+        for client in clients:
+            await client.aclose()
+
+
+http_clients = HttpClientRegistry(
+    max_clients=settings.HTTP_CLIENT_CACHE_SIZE,
+    max_connections=settings.HTTP_MAX_CONNECTIONS,
+    max_keepalive=settings.HTTP_MAX_KEEPALIVE,
+    http2=settings.HTTP_HTTP2,
+    timeout=settings.HTTP_TIMEOUT,
 )
 
 
+def response_body(response: Response):
+    """
+    Тело ответа: JSON, если его удаётся разобрать; текст для текстовых типов;
+    base64 для бинарных; None для пустого ответа.
+    """
+    if not response.content:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        pass
+    content_type = response.headers.get("content-type", "").lower()
+    if content_type.startswith(TEXT_CONTENT_TYPES) or not content_type:
+        return response.text
+    return base64.b64encode(response.content).decode("ascii")
+
+
 async def make_request(method, url, params=None, headers=None, content=None, data=None, json_field=None, files=None,
-                       proxies=None) -> dict:
-    http_client = global_http_client
-    if proxies is not None:
-        http_client = AsyncClient(
-            timeout=Timeout(30.0),
-            limits=Limits(
-                max_connections=100,  # до 100 одновременных соединений (параллельных)
-                max_keepalive_connections=20  # держать открытыми 20 соединений
-            ),
-            proxies=proxies,
-            transport=AsyncHTTPTransport(local_address="0.0.0.0")
-        )
-    response: Response = await http_client.request(
-        method, url, params=params, files=files, content=content, json=json_field, data=data, headers=headers,
-    )
-    json_result = {"response": response.json()}
+                       proxies=None, timeout: float | None = None, bot_id=None,
+                       cache_ttl: int | None = None, cache_key: str | None = None) -> dict:
+    """
+    Выполняет запрос группы через outbound_guard: bulkhead'ы хоста и бота, circuit breaker хоста.
+    timeout — таймаут из определения запроса (секунды), иначе HTTP_TIMEOUT клиента.
+    cache_ttl — для GET включает общий кеш ответов бота (cache_key — ключ вместо параметров и заголовков).
+    """
+    request_timeout = Timeout(timeout) if timeout else USE_CLIENT_DEFAULT
+
+    async def send(extra_headers: dict[str, str] | None = None) -> Response:
+        request_headers = headers
+        if extra_headers and (headers is None or isinstance(headers, dict)):
+            request_headers = {**(headers or {}), **extra_headers}
+        async with http_clients.lease(proxies) as http_client:
+            return await outbound_guard.run(
+                URL(url).host,
+                lambda: http_client.request(
+                    method, url, params=params, files=files, content=content, json=json_field, data=data,
+                    headers=request_headers, timeout=request_timeout,
+                ),
+                bot_id=bot_id,
+            )
+
+    if cache_ttl and str(method).upper() in CACHEABLE_METHODS and not files:
+        key = response_cache_key(method, url, params, headers, cache_key, bot_id=bot_id)
+        return {"response": await response_cache.get_or_fetch(key, cache_ttl, send, response_body)}
+
+    json_result = {"response": response_body(await send())}
     return json_result
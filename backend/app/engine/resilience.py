@@ -0,0 +1,222 @@
+"""Изоляция исходящих вызовов групп запросов: bulkhead'ы по хосту и боту и circuit breaker по хосту."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from httpx import Response
+
+from app.config import settings
+from app.metrics.http import http_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundRejectedError(RuntimeError):
+    """Вызов отклонён без отправки запроса."""
+
+
+class BulkheadFullError(OutboundRejectedError):
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class CircuitOpenError(OutboundRejectedError):
+    pass
+
+
+class Bulkhead:
+    """
+    Ограничивает число одновременных вызовов по ключу (хост, бот); limit=0 — без ограничения.
+    Слот ждётся не дольше max_wait секунд (0 — без ограничения), затем вызов отклоняется.
+    Семафоры ключей удаляются, когда ими никто не пользуется.
+    """
+
+    def __init__(self, name: str, limit: int, max_wait: float = 0):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._users: dict[str, int] = {}
+
+    @asynccontextmanager
+    async def slot(self, key: str) -> AsyncIterator[None]:
+        if not self.limit:
+            yield
+            return
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self.limit)
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.max_wait or None)
+            except asyncio.TimeoutError:
+                raise BulkheadFullError(f"No free {self.name} slot for {key} within {self.max_wait}s",
+                                        self.name) from None
+            try:
+                yield
+            finally:
+                semaphore.release()
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._semaphores[key]
+
+
+class CircuitBreaker:
+    """
+    closed: вызовы проходят, failure_threshold ошибок подряд переводят в open.
+    open: вызовы отклоняются; через cooldown секунд — half_open.
+    half_open: пропускается не больше half_open_calls пробных вызовов; успех закрывает цепь, ошибка открывает снова.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, half_open_calls: int = 1,
+                 on_state_change: Optional[Callable[[str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_calls = half_open_calls
+        self.on_state_change = on_state_change
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            if self.on_state_change is not None:
+                self.on_state_change(state)
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.cooldown:
+                return False
+            self._probes = 0
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                return False
+            self._probes += 1
+        return True
+
+    def cancel(self) -> None:
+        """Разрешённый allow() вызов не состоялся: возвращает пробный слот half_open."""
+        if self.state == self.HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self._set_state(self.OPEN)
+
+
+class OutboundGuard:
+    """
+    Обёртка исходящего вызова: circuit breaker хоста, bulkhead бота, bulkhead хоста.
+    Ошибкой для breaker'а считаются исключения httpx, таймауты и ответы 5xx.
+    failure_threshold=0 выключает circuit breaker.
+    """
+
+    def __init__(self, host_limit: int = 20, bot_limit: int = 0, max_wait: float = 5.0,
+                 failure_threshold: int = 5, cooldown: float = 30.0, half_open_calls: int = 1,
+                 max_breakers: int = 1024):
+        self.hosts = Bulkhead("host_bulkhead", host_limit, max_wait)
+        self.bots = Bulkhead("bot_bulkhead", bot_limit, max_wait)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_calls = half_open_calls
+        self.max_breakers = max_breakers
+        self._breakers: OrderedDict[str, CircuitBreaker] = OrderedDict()
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is not None:
+            self._breakers.move_to_end(host)
+            return breaker
+        breaker = self._breakers[host] = CircuitBreaker(
+            self.failure_threshold, self.cooldown, self.half_open_calls,
+            on_state_change=lambda state: self._on_state_change(host, state),
+        )
+        while len(self._breakers) > self.max_breakers:
+            evicted, _ = self._breakers.popitem(last=False)
+            http_metrics.set_circuit_state(evicted, CircuitBreaker.CLOSED)
+        return breaker
+
+    @staticmethod
+    def _on_state_change(host: str, state: str) -> None:
+        http_metrics.set_circuit_state(host, state)
+        if state == CircuitBreaker.OPEN:
+            logger.warning(f"Circuit for {host} opened")
+        else:
+            logger.info(f"Circuit for {host} is {state}")
+
+    async def run(self, host: str, call: Callable[[], Awaitable[Response]], bot_id: str | None = None) -> Response:
+        breaker = self.breaker(host) if self.failure_threshold else None
+        if breaker is not None and not breaker.allow():
+            http_metrics.inc_rejected(host, "circuit_open")
+            raise CircuitOpenError(f"Circuit for {host} is open")
+
+        try:
+            async with self.bots.slot(str(bot_id)) if bot_id is not None else _no_slot():
+                async with self.hosts.slot(host):
+                    return await self._call(host, call, breaker)
+        except BulkheadFullError as e:
+            http_metrics.inc_rejected(host, e.reason)
+            if breaker is not None:
+                breaker.cancel()
+            raise
+
+    @staticmethod
+    async def _call(host: str, call: Callable[[], Awaitable[Response]], breaker: CircuitBreaker | None) -> Response:
+        started = time.perf_counter()
+        http_metrics.inc_in_flight(host)
+        # None — вызов отменён, исход для breaker'а не засчитывается
+        failed = None
+        try:
+            response = await call()
+            failed = response.status_code >= 500
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            http_metrics.dec_in_flight(host)
+            http_metrics.observe_call(host, time.perf_counter() - started, bool(failed))
+            if breaker is not None:
+                if failed is None:
+                    breaker.cancel()
+                elif failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+
+
+@asynccontextmanager
+async def _no_slot() -> AsyncIterator[None]:
+    yield
+
+
+outbound_guard = OutboundGuard(
+    host_limit=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+    bot_limit=settings.HTTP_MAX_CONNECTIONS_PER_BOT,
+    max_wait=settings.HTTP_BULKHEAD_MAX_WAIT,
+    failure_threshold=settings.HTTP_CIRCUIT_FAILURE_THRESHOLD,
+    cooldown=settings.HTTP_CIRCUIT_COOLDOWN,
+    half_open_calls=settings.HTTP_CIRCUIT_HALF_OPEN_CALLS,
+)
@@ -0,0 +1,179 @@
+"""Общий кеш ответов GET-запросов групп (L1 в процессе + L2 Redis) со схлопыванием одинаковых запросов."""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from httpx import Response
+from redis.asyncio import Redis
+
+from app.config import settings
+from app.managers.data_manager import LocalCache
+from app.metrics.pipeline import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_FAMILY = "http"
+CACHEABLE_METHODS = ("GET",)
+
+SendFn = Callable[[dict[str, str]], Awaitable[Response]]
+BodyFn = Callable[[Response], Any]
+
+
+def response_cache_key(method: str, url: str, params: Any = None, headers: Any = None,
+                       template_key: str | None = None, bot_id: Any = None) -> str:
+    """
+    Ключ записи всегда включает бота, метод и url — боты не видят ответы друг друга.
+    Дальше — заданный в запросе шаблон cache_key (уже с подставленными переменными)
+    либо параметры и заголовки (ответы с разной авторизацией не смешиваются).
+    """
+    scope = [str(bot_id or ""), method.upper(), url]
+    if template_key:
+        raw = json.dumps([*scope, "key", template_key], default=str)
+    else:
+        raw = json.dumps([*scope, params, headers], sort_keys=True, default=str)
+    return f"{CACHE_FAMILY}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+def parse_cache_control(value: str | None) -> dict[str, str | None]:
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def freshness(response: Response, ttl: int) -> int | None:
+    """
+    Сколько секунд ответ считается свежим с учётом Cache-Control, не больше ttl.
+    None — ответ не кешируется (не 200, no-store, private).
+    """
+    if response.status_code != 200:
+        return None
+    directives = parse_cache_control(response.headers.get("cache-control"))
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    max_age = directives.get("s-maxage") or directives.get("max-age")
+    if max_age is not None:
+        try:
+            return max(0, min(int(max_age), ttl))
+        except ValueError:
+            pass
+    return ttl
+
+
+class ResponseCache:
+    """
+    Запись: {"body", "etag", "last_modified", "expires_at"}.
+    Свежая запись отдаётся без обращения к upstream. Запись с ETag/Last-Modified хранится в Redis
+    ещё stale_ttl секунд после истечения и перепроверяется условным запросом (304 продлевает её).
+    Одинаковые одновременные промахи процесса ждут один upstream-вызов.
+    """
+
+    def __init__(self, redis: Redis | None = None, local_cache: LocalCache | None = None, stale_ttl: int = 3600):
+        self._redis = redis
+        self.local_cache = local_cache
+        self.stale_ttl = stale_ttl
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(settings.CACHE_REDIS_URL)
+        return self._redis
+
+    @staticmethod
+    def _is_fresh(entry: dict) -> bool:
+        return entry["expires_at"] > time.time()
+
+    def _get_local(self, key: str) -> dict | None:
+        if self.local_cache is None:
+            return None
+        raw = self.local_cache.get(key)
+        entry = json.loads(raw) if raw is not None else None
+        hit = entry is not None and self._is_fresh(entry)
+        pipeline_metrics.observe_cache(CACHE_FAMILY, "l1", hit)
+        return entry if hit else None
+
+    async def _get_remote(self, key: str) -> dict | None:
+        try:
+            raw = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed for {key}: {e}")
+            return None
+        if raw is None:
+            pipeline_metrics.observe_cache(CACHE_FAMILY, "l2", False)
+            return None
+        entry = json.loads(raw)
+        fresh = self._is_fresh(entry)
+        pipeline_metrics.observe_cache(CACHE_FAMILY, "l2", fresh)
+        if fresh and self.local_cache is not None:
+            self.local_cache.set(key, raw, max(1, int(entry["expires_at"] - time.time())))
+        return entry
+
+    async def _store(self, key: str, entry: dict, fresh_for: int) -> None:
+        raw = json.dumps(entry, default=str)
+        keep_for = fresh_for + (self.stale_ttl if entry.get("etag") or entry.get("last_modified") else 0)
+        if keep_for <= 0:
+            return
+        if fresh_for > 0 and self.local_cache is not None:
+            self.local_cache.set(key, raw, fresh_for)
+        try:
+            await self.redis.set(key, raw, ex=keep_for)
+        except Exception as e:
+            logger.warning(f"Response cache write failed for {key}: {e}")
+
+    async def get_or_fetch(self, key: str, ttl: int, send: SendFn, body: BodyFn) -> Any:
+        """Тело ответа из кеша или от upstream; send(extra_headers) выполняет запрос, body разбирает ответ."""
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry["body"]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, ttl, send, body))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, key: str, ttl: int, send: SendFn, body: BodyFn) -> Any:
+        stale = await self._get_remote(key)
+        if stale is not None and self._is_fresh(stale):
+            return stale["body"]
+
+        extra_headers = {}
+        if stale is not None and stale.get("etag"):
+            extra_headers["If-None-Match"] = stale["etag"]
+        if stale is not None and stale.get("last_modified"):
+            extra_headers["If-Modified-Since"] = stale["last_modified"]
+        response = await send(extra_headers)
+
+        if response.status_code == 304 and stale is not None:
+            fresh_for = freshness(Response(200, headers=response.headers), ttl)
+            if fresh_for is not None:
+                await self._store(key, {**stale, "expires_at": time.time() + fresh_for}, fresh_for)
+            return stale["body"]
+
+        result = body(response)
+        fresh_for = freshness(response, ttl)
+        if fresh_for is not None:
+            entry = {
+                "body": result,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "expires_at": time.time() + fresh_for,
+            }
+            await self._store(key, entry, fresh_for)
+        return result
+
+
+response_cache = ResponseCache(
+    local_cache=LocalCache(max_size=settings.HTTP_CACHE_L1_MAX_SIZE, ttl=settings.HTTP_CACHE_L1_TTL)
+    if settings.HTTP_CACHE_L1_MAX_SIZE else None,
+    stale_ttl=settings.HTTP_CACHE_STALE_TTL,
+)
@@ -0,0 +1,243 @@
+"""
+Компиляция правил связей (формат jQuery QueryBuilder) в замыкания.
+
+Семантика совпадает с jqqb_evaluator.Evaluator: тот же обход поля, приведение типов и операторы.
+Пути полей разбиваются, операторы выбираются и константные значения приводятся к типу один раз;
+переменные {$...$} в field/value подставляются из контекста при вычислении,
+как это делает replace_variables_universal.
+"""
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable
+
+from jqqb_evaluator.operators import Operators
+from pytimeparse.timeparse import timeparse
+
+from app.engine.variables import VARIABLE_PATTERN, contains_variables
+from app.utils.dict import get_value_by_list_keys
+
+RuleFn = Callable[[dict], bool]
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+TRUTHY_STRINGS = frozenset(['true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
+RULE_KEYS = ('id', 'field', 'type', 'input', 'operator', 'value')
+
+
+class RuleCompileError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _parse_datetime(value: str) -> datetime:
+    return datetime.strptime(value, DATETIME_FORMAT)
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(value: str):
+    return timeparse(value)
+
+
+def _identity(value):
+    return value
+
+
+def _cast_datetime(value):
+    return _parse_datetime(value) if isinstance(value, str) else value
+
+
+def _cast_time(value):
+    return _parse_time(value) if isinstance(value, str) else value
+
+
+def _cast_boolean(value):
+    if isinstance(value, str):
+        return value.lower() in TRUTHY_STRINGS
+    return value
+
+
+_CASTS: dict[str, Callable[[Any], Any]] = {
+    'string': str,
+    'integer': int,
+    'double': float,
+    'date': _cast_datetime,
+    'datetime': _cast_datetime,
+    'time': _cast_time,
+    'boolean': _cast_boolean,
+}
+
+
+def make_cast(type_: str) -> Callable[[Any], Any]:
+    cast = _CASTS.get(type_, _identity)
+
+    def typecast(value):
+        return None if value is None else cast(value)
+
+    return typecast
+
+
+def _cast_value(value, typecast):
+    if isinstance(value, list):
+        return [typecast(item) for item in value]
+    return typecast(value)
+
+
+def _substitute(data: Any, context: dict) -> Any:
+    """Синхронный аналог replace_variables_universal для значений правила."""
+    if isinstance(data, str):
+        if VARIABLE_PATTERN.search(data) is None:
+            return data
+
+        def replace_match(match: re.Match) -> str:
+            value = get_value_by_list_keys(context, match.group(1).split(".")) if context else None
+            if isinstance(value, (dict, list)):
+                return json.dumps(value, ensure_ascii=False)
+            return "" if value is None else str(value)
+
+        new_string = VARIABLE_PATTERN.sub(replace_match, data)
+        try:
+            return json.loads(new_string)
+        except json.JSONDecodeError:
+            return new_string
+    if isinstance(data, list):
+        return [_substitute(item, context) for item in data]
+    if isinstance(data, dict):
+        return {_substitute(key, context) if isinstance(key, str) else key: _substitute(value, context)
+                for key, value in data.items()}
+    return data
+
+
+def walk_field(obj: Any, fields: list[str]) -> Any:
+    """Rule.get_input без приведения типа."""
+    result = obj
+    steps = len(fields)
+    for i, name in enumerate(fields):
+        result = result.get(name)
+        if i == steps - 2 and isinstance(result, list) and isinstance(result[0], dict):
+            return [x[fields[-1]] for x in result]
+        if result is not None and isinstance(result, list) and i != steps - 1:
+            result = result[0]
+        if result is None:
+            break
+    return result
+
+
+def _compile_rule(rule: dict) -> RuleFn:
+    missing = [key for key in RULE_KEYS if key not in rule]
+    if missing:
+        raise RuleCompileError(f"Rule is missing keys: {', '.join(missing)}")
+    if contains_variables(rule['type']) or contains_variables(rule['operator']):
+        raise RuleCompileError("Variables in rule type or operator are not supported")
+
+    operator = getattr(Operators, f"eval_{rule['operator']}", None)
+    if operator is None:
+        raise RuleCompileError(f"Unknown operator: {rule['operator']}")
+    typecast = make_cast(rule['type'])
+
+    field = rule['field']
+    if contains_variables(field):
+        def get_fields(context):
+            return _substitute(field, context).split(".")
+    else:
+        fields = field.split(".")
+
+        def get_fields(context):
+            return fields
+
+    value = rule['value']
+    if contains_variables(value):
+        def get_value(context):
+            return _cast_value(_substitute(value, context), typecast)
+    else:
+        try:
+            cast_value = _cast_value(value, typecast)
+        except (TypeError, ValueError):
+            # Ошибку приведения jqqb выдаёт при вычислении — сохраняем это поведение
+            def get_value(context):
+                return _cast_value(value, typecast)
+        else:
+            def get_value(context):
+                return cast_value
+
+    def evaluate(context: dict) -> bool:
+        left = walk_field(context, get_fields(context))
+        return operator(_cast_value(left, typecast), get_value(context))
+
+    return evaluate
+
+
+def _compile_node(node: Any) -> RuleFn:
+    if not isinstance(node, dict):
+        raise RuleCompileError(f"Rule must be an object, got {type(node).__name__}")
+    if contains_variables(list(node.keys())):
+        raise RuleCompileError("Variables in rule keys are not supported")
+    if 'rules' in node:
+        return _compile_group(node)
+    return _compile_rule(node)
+
+
+def _compile_group(group: dict) -> RuleFn:
+    if 'condition' not in group or 'rules' not in group:
+        raise RuleCompileError("Rule group is missing condition or rules")
+    if contains_variables(group['condition']) or not isinstance(group['rules'], list):
+        raise RuleCompileError("Unsupported rule group")
+    children = tuple(_compile_node(rule) for rule in group['rules'])
+
+    if group['condition'] == 'AND':
+        def evaluate(context: dict) -> bool:
+            return all(child(context) for child in children)
+    else:
+        def evaluate(context: dict) -> bool:
+            return any(child(context) for child in children)
+
+    return evaluate
+
+
+def compile_rules(rules: dict) -> RuleFn:
+    """
+    Компилирует корневую группу правил в функцию context -> bool.
+    Бросает RuleCompileError, если правила нельзя скомпилировать —
+    тогда их следует вычислять через jqqb_evaluator.Evaluator.
+    """
+    if not isinstance(rules, dict):
+        raise RuleCompileError(f"Rules must be an object, got {type(rules).__name__}")
+    if contains_variables(list(rules.keys())):
+        raise RuleCompileError("Variables in rule keys are not supported")
+    return _compile_group(rules)
+
+
+def _equality_rule(rule: Any) -> tuple[str, str, Any] | None:
+    if not isinstance(rule, dict) or 'rules' in rule or rule.get('operator') != 'equal':
+        return None
+    field, type_, value = rule.get('field'), rule.get('type'), rule.get('value')
+    if type_ not in _CASTS or not isinstance(field, str) or contains_variables(field):
+        return None
+    if value is None or isinstance(value, (list, dict)) or contains_variables(value):
+        return None
+    return field, type_, value
+
+
+def equality_terms(rules: Any) -> tuple[str, str, list] | None:
+    """
+    Необходимое условие срабатывания правил в виде (field, type, [значения]):
+    правила могут выполниться, только если поле равно одному из значений.
+    Распознаются группа AND с правилом equal и группа OR из правил equal по одному полю.
+    Возвращает None, если такого условия нет.
+    """
+    if not isinstance(rules, dict) or not isinstance(rules.get('rules'), list) or not rules['rules']:
+        return None
+    children = rules['rules']
+    if rules.get('condition') == 'AND' or len(children) == 1:
+        for child in children:
+            term = _equality_rule(child)
+            if term is not None:
+                field, type_, value = term
+                return field, type_, [value]
+        return None
+
+    terms = [_equality_rule(child) for child in children]
+    if any(term is None for term in terms) or len({(field, type_) for field, type_, _ in terms}) != 1:
+        return None
+    field, type_, _ = terms[0]
+    return field, type_, [value for _, _, value in terms]
@@ -9,7 +9,11 @@ from itertools import (
     product, permutations, combinations, combinations_with_replacement,
     accumulate, groupby, chain, count, cycle, repeat
 )
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from hashlib import sha256
+from types import CodeType, MappingProxyType
+from typing import Any
 from uuid import uuid4
 import random
 import json
@@ -64,13 +68,52 @@ available_functions = (
     re.fullmatch, re.match, re.search, re.findall, re.sub, re.split, re.finditer
 )
 
-safe_globals = {f.__name__: f for f in available_functions}
-safe_globals.update(available_constants)
-safe_globals.update(
+_safe_globals = {f.__name__: f for f in available_functions}
+_safe_globals.update(available_constants)
+_safe_globals.update(
     {
         "Exception": Exception,
         "BaseException": BaseException,
     }
 )
+# Общий для всех вызовов слой только для чтения; на каждый вызов строится свой dict (build_globals)
+safe_globals = MappingProxyType(_safe_globals)
 
-__all__ = ["available_functions", "available_constants", "safe_globals"]
+
+def build_globals(**overrides: Any) -> dict:
+    """Globals для одного запуска сниппета: безопасное окружение + переданные функции (например, print)."""
+    return {"__builtins__": None, **safe_globals, **overrides}
+
+
+class CompiledCodeCache:
+    """LRU-кеш байткода сниппетов по sha256 исходника: каждый сниппет компилируется один раз на процесс."""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._items: OrderedDict[str, CodeType] = OrderedDict()
+
+    @staticmethod
+    def key(code: str) -> str:
+        return sha256(code.encode("utf-8")).hexdigest()
+
+    def compile(self, code: str) -> CodeType:
+        """Возвращает байткод сниппета; SyntaxError пробрасывается вызывающему."""
+        key = self.key(code)
+        compiled = self._items.get(key)
+        if compiled is not None:
+            self._items.move_to_end(key)
+            return compiled
+        compiled = compile(code, "<string>", "exec")
+        self._items[key] = compiled
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return compiled
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+code_cache = CompiledCodeCache()
+
+__all__ = ["available_functions", "available_constants", "safe_globals", "build_globals", "CompiledCodeCache",
+           "code_cache"]
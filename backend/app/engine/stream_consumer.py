@@ -0,0 +1,178 @@
+"""Потоковый (pipeline) потребитель Redis Stream с подтверждением каждого сообщения."""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.metrics.worker import worker_metrics
+
+logger = logging.getLogger(__name__)
+
+# Поле, в которое FastStream кладёт закодированное сообщение
+STREAM_DATA_KEY = b"__data__"
+
+
+def _to_str(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def decode_stream_fields(fields: dict, message_format) -> Any:
+    """
+    Декодирует поля записи стрима так же, как это делает подписчик FastStream.
+    Записи, добавленные напрямую через XADD (например, init), возвращаются словарём строк.
+    """
+    data = fields.get(STREAM_DATA_KEY) or fields.get(STREAM_DATA_KEY.decode())
+    if data is None:
+        return {_to_str(key): _to_str(value) for key, value in fields.items()}
+    body, _ = message_format.parse(data if isinstance(data, bytes) else data.encode())
+    try:
+        return json.loads(body)
+    except ValueError:
+        return _to_str(body)
+
+
+async def report_stream_stats(redis: Redis, stream: str, group: str) -> None:
+    """Обновляет gauge'и lag и pending группы потребителей по XINFO GROUPS."""
+    try:
+        for info in await redis.xinfo_groups(stream):
+            if _to_str(info.get("name")) != group:
+                continue
+            if info.get("lag") is not None:
+                worker_metrics.set_stream_lag(stream, info["lag"])
+            if info.get("pending") is not None:
+                worker_metrics.set_stream_pending(stream, info["pending"])
+    except Exception as e:
+        logger.debug(f"Failed to read stream stats for {stream}: {e}")
+
+
+class StreamPipelineConsumer:
+    """
+    Читает стрим через XREADGROUP без барьера на пачку: каждое сообщение обрабатывается
+    отдельной задачей и подтверждается (XACK) сразу после завершения.
+    Новые сообщения дочитываются, пока число необработанных ниже high_water;
+    размер XREADGROUP (prefetch) подстраивается под наблюдаемую задержку обработки.
+    """
+
+    def __init__(self, redis: Redis, stream: str, group: str, consumer: str,
+                 handler: Callable[[Any], Awaitable[Any]],
+                 message_format,
+                 high_water: int = 200,
+                 prefetch_min: int = 10,
+                 prefetch_max: int = 100,
+                 target_latency: float = 0.5,
+                 block_ms: int = 1000,
+                 backlog: Callable[[], int] | None = None):
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.handler = handler
+        self.message_format = message_format
+        self.high_water = high_water
+        self.prefetch_min = prefetch_min
+        self.prefetch_max = max(prefetch_min, prefetch_max)
+        self.prefetch = self.prefetch_min
+        self.target_latency = target_latency
+        self.block_ms = block_ms
+        self.backlog = backlog
+        self._latency: float | None = None
+        self._last_decrease = 0.0
+        self._last_lag_check = 0.0
+        self._tasks: set[asyncio.Task] = set()
+        self._slot_freed = asyncio.Event()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def run(self) -> None:
+        await self.ensure_group()
+        logger.info(f"Pipeline consumer started: stream={self.stream}, group={self.group}, consumer={self.consumer}")
+        while True:
+            try:
+                while self.in_flight >= self.high_water:
+                    self._slot_freed.clear()
+                    await self._slot_freed.wait()
+                free = self.high_water - self.in_flight
+
+                response = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                                       count=min(free, self.prefetch), block=self.block_ms)
+                for _, entries in response or []:
+                    for msg_id, fields in entries:
+                        task = asyncio.create_task(self._process(msg_id, fields))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._task_done)
+                self._report()
+                await self._refresh_lag()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Pipeline consumer error on {self.stream}: {e}")
+                await asyncio.sleep(1)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        # Слот освобождается до сигнала: run() должен увидеть уменьшившийся in_flight
+        self._tasks.discard(task)
+        self._slot_freed.set()
+        self._report()
+
+    async def stop(self) -> None:
+        """Дожидается уже прочитанных сообщений."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _process(self, msg_id, fields: dict) -> None:
+        started = time.monotonic()
+        failed = False
+        try:
+            await self.handler(decode_stream_fields(fields, self.message_format))
+        except asyncio.CancelledError:
+            # Не подтверждаем: сообщение останется в pending и будет переобработано
+            raise
+        except Exception:
+            failed = True
+            logger.exception(f"Failed to process message {_to_str(msg_id)}")
+
+        try:
+            await self.redis.xack(self.stream, self.group, msg_id)
+        except Exception as e:
+            logger.warning(f"XACK failed for {_to_str(msg_id)}: {e}")
+
+        duration = time.monotonic() - started
+        worker_metrics.observe_processed(self.stream, duration, failed)
+        self._adapt_prefetch(duration)
+
+    def _adapt_prefetch(self, duration: float) -> None:
+        """Аддитивно увеличивает prefetch при задержке ниже целевой и вдвое уменьшает при превышении."""
+        self._latency = duration if self._latency is None else 0.8 * self._latency + 0.2 * duration
+        if self._latency <= self.target_latency:
+            self.prefetch = min(self.prefetch_max, self.prefetch + 1)
+            return
+        now = time.monotonic()
+        if now - self._last_decrease >= 1:
+            self._last_decrease = now
+            self.prefetch = max(self.prefetch_min, self.prefetch // 2)
+
+    def _report(self) -> None:
+        worker_metrics.set_in_flight(self.stream, self.in_flight)
+        worker_metrics.set_prefetch(self.stream, self.prefetch)
+        if self.backlog is not None:
+            worker_metrics.set_queue_depth(self.stream, self.backlog())
+
+    async def _refresh_lag(self) -> None:
+        now = time.monotonic()
+        if now - self._last_lag_check < 5:
+            return
+        self._last_lag_check = now
+        await report_stream_stats(self.redis, self.stream, self.group)
@@ -0,0 +1,165 @@
+"""Перезабор зависших сообщений стрима (XAUTOCLAIM) и dead-letter стрим."""
+import base64
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from app.engine.stream_consumer import decode_stream_fields
+
+logger = logging.getLogger(__name__)
+
+# Служебные поля, которые добавляются к записи при переносе в dead-letter стрим
+DEAD_LETTER_FIELDS = (b"dlq_original_id", b"dlq_group", b"dlq_deliveries", b"dlq_dead_at")
+
+
+def dead_letter_stream(stream: str) -> str:
+    return f"{stream}:dead"
+
+
+def _to_str(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _to_bytes(value: Any) -> bytes:
+    return value.encode() if isinstance(value, str) else value
+
+
+def _to_text(value: Any) -> Any:
+    """Значение поля для ответа API: UTF-8 как есть, бинарное (формат FastStream) — base64."""
+    if not isinstance(value, bytes):
+        return value
+    try:
+        return value.decode()
+    except UnicodeDecodeError:
+        return base64.b64encode(value).decode("ascii")
+
+
+async def _delivery_counts(redis: Redis, stream: str, group: str, consumer: str, entries: list) -> dict:
+    """
+    Счётчики доставок для пачки заклеймленных записей: XPENDING по каждому id в одном pipeline.
+    Запрос по диапазону мог обрезаться по count, и запись без счётчика никогда не попала бы в dead-letter.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        for msg_id, _ in entries:
+            pipe.xpending_range(stream, group, min=msg_id, max=msg_id, count=1, consumername=consumer)
+        replies = await pipe.execute()
+    return {_to_str(entry["message_id"]): entry["times_delivered"] for pending in replies for entry in pending}
+
+
+async def move_to_dead_letter(redis: Redis, stream: str, group: str, msg_id, fields: dict,
+                              deliveries: int) -> None:
+    """Копирует запись в {stream}:dead и подтверждает её в исходной группе — атомарно."""
+    dead_fields = {key: value for key, value in fields.items() if _to_bytes(key) not in DEAD_LETTER_FIELDS}
+    dead_fields.update({
+        "dlq_original_id": _to_str(msg_id),
+        "dlq_group": group,
+        "dlq_deliveries": deliveries,
+        "dlq_dead_at": int(time.time()),
+    })
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.xadd(dead_letter_stream(stream), dead_fields)
+        pipe.xack(stream, group, msg_id)
+        await pipe.execute()
+
+
+async def reclaim_pending(redis: Redis, stream: str, group: str, consumer: str,
+                          process: Callable[[list], Awaitable[Any]],
+                          batch_size: int = 100, min_idle_ms: int = 60_000, max_deliveries: int = 5) -> int:
+    """
+    Один проход XAUTOCLAIM по всему PEL группы с курсором.
+    Записи, доставленные больше max_deliveries раз, уходят в dead-letter стрим,
+    остальные передаются в process (он же отвечает за XACK). Возвращает число заклеймленных записей.
+    """
+    cursor = "0-0"
+    claimed_total = 0
+    while True:
+        response = await redis.xautoclaim(stream, group, consumer, min_idle_time=min_idle_ms,
+                                          start_id=cursor, count=batch_size)
+        cursor, claimed = response[0], response[1]
+        # Записи, удалённые из стрима, приходят без полей
+        claimed = [(msg_id, fields) for msg_id, fields in claimed if fields]
+        if claimed:
+            claimed_total += len(claimed)
+            counts = await _delivery_counts(redis, stream, group, consumer, claimed)
+            alive = []
+            for msg_id, fields in claimed:
+                deliveries = counts.get(_to_str(msg_id), 1)
+                if deliveries > max_deliveries:
+                    logger.warning(f"Moving {_to_str(msg_id)} to {dead_letter_stream(stream)} "
+                                   f"after {deliveries} deliveries")
+                    await move_to_dead_letter(redis, stream, group, msg_id, fields, deliveries)
+                else:
+                    alive.append((msg_id, fields))
+            if alive:
+                logger.info(f"Reclaimed {len(alive)} message(s) from {stream}")
+                await process(alive)
+        if _to_str(cursor) == "0-0":
+            return claimed_total
+
+
+def _split_dead_letter(fields: dict) -> tuple[dict, dict]:
+    meta, original = {}, {}
+    for key, value in fields.items():
+        if _to_bytes(key) in DEAD_LETTER_FIELDS:
+            meta[_to_str(key)[len("dlq_"):]] = _to_str(value)
+        else:
+            original[key] = value
+    return meta, original
+
+
+def _decode_message(original: dict, message_format) -> Any:
+    if message_format is None:
+        return None
+    try:
+        return decode_stream_fields(original, message_format)
+    except Exception as e:
+        logger.debug(f"Failed to decode dead-lettered message: {e}")
+        return None
+
+
+async def list_dead_letters(redis: Redis, stream: str, start: str = "-", count: int = 50,
+                            message_format=None) -> list[dict]:
+    """
+    Записи dead-letter стрима. message_format — формат брокера (broker.message_format),
+    им декодируется тело сообщения FastStream в поле message.
+    """
+    entries = await redis.xrange(dead_letter_stream(stream), min=start, max="+", count=count)
+    result = []
+    for msg_id, fields in entries:
+        meta, original = _split_dead_letter(fields)
+        result.append({"id": _to_str(msg_id), **meta,
+                       "fields": {_to_str(key): _to_text(value) for key, value in original.items()},
+                       "message": _decode_message(original, message_format)})
+    return result
+
+
+async def replay_dead_letters(redis: Redis, stream: str, ids: list[str] | None = None, count: int = 50) -> list[str]:
+    """Возвращает записи в исходный стрим (новыми id) и удаляет их из dead-letter стрима."""
+    dead_stream = dead_letter_stream(stream)
+    if ids:
+        entries = []
+        for msg_id in ids:
+            entries.extend(await redis.xrange(dead_stream, min=msg_id, max=msg_id, count=1))
+    else:
+        entries = await redis.xrange(dead_stream, min="-", max="+", count=count)
+
+    replayed = []
+    for msg_id, fields in entries:
+        _, original = _split_dead_letter(fields)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(stream, original)
+            pipe.xdel(dead_stream, msg_id)
+            await pipe.execute()
+        replayed.append(_to_str(msg_id))
+    return replayed
+
+
+async def purge_dead_letters(redis: Redis, stream: str, ids: list[str] | None = None) -> int:
+    dead_stream = dead_letter_stream(stream)
+    if ids:
+        return await redis.xdel(dead_stream, *ids)
+    length = await redis.xlen(dead_stream)
+    await redis.delete(dead_stream)
+    return length
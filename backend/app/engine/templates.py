@@ -0,0 +1,94 @@
+"""
+Шаблоны с переменными {$...$}.
+
+Строка разбирается один раз на литералы и пути переменных, результат кешируется.
+Подстановка синхронная и без пробного json.loads: тип результата определяется шаблоном.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+from app.utils.dict import get_value_by_list_keys
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+VARIABLE_PATTERN = re.compile(r'\{\$([a-zA-Z0-9._|]+)\$}')
+
+
+def _stringify(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class Template:
+    """
+    Разобранная строка: кортеж литералов (str) и путей переменных (tuple ключей).
+    Шаблон из одной переменной ("{$user.age$}") возвращает значение в исходном типе,
+    остальные шаблоны — строку, в которой dict/list записаны как JSON, а None — пустой строкой.
+    """
+    __slots__ = ("source", "segments", "is_static", "is_single")
+
+    def __init__(self, source: str):
+        self.source = source
+        segments: list[str | tuple[str, ...]] = []
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(source):
+            if match.start() > position:
+                segments.append(source[position:match.start()])
+            segments.append(tuple(match.group(1).split(".")))
+            position = match.end()
+        if position < len(source):
+            segments.append(source[position:])
+        self.segments = tuple(segments)
+        self.is_static = not any(isinstance(segment, tuple) for segment in segments)
+        self.is_single = len(segments) == 1 and not self.is_static
+
+    def render(self, context: dict | None) -> Any:
+        if self.is_static:
+            return self.source
+        if self.is_single:
+            value = _lookup(context, self.segments[0])
+            return "" if value is None else value
+        return "".join(segment if isinstance(segment, str) else _stringify(_lookup(context, segment))
+                       for segment in self.segments)
+
+    def render_str(self, context: dict | None) -> str:
+        """Подстановка, всегда возвращающая строку (для ключей словарей)."""
+        if self.is_static:
+            return self.source
+        return "".join(segment if isinstance(segment, str) else _stringify(_lookup(context, segment))
+                       for segment in self.segments)
+
+
+def _lookup(context: dict | None, keys: tuple[str, ...]) -> Any:
+    return get_value_by_list_keys(context, keys) if context else None
+
+
+@lru_cache(maxsize=8192)
+def compile_template(source: str) -> Template:
+    return Template(source)
+
+
+def render(data: Any, context: dict | None) -> Any:
+    """Рекурсивно подставляет переменные в строки, элементы списков, ключи и значения словарей."""
+    if isinstance(data, str):
+        if "{$" not in data:
+            return data
+        return compile_template(data).render(context)
+    if isinstance(data, list):
+        return [render(item, context) for item in data]
+    if isinstance(data, dict):
+        return {(compile_template(key).render_str(context) if isinstance(key, str) and "{$" in key else key):
+                render(value, context) for key, value in data.items()}
+    return data
+
+
+def render_model(model: ModelT, context: dict | None) -> ModelT:
+    """Подставляет переменные в поля pydantic-модели и валидирует результат."""
+    return model.model_validate(render(model.model_dump(), context))
@@ -15,9 +15,7 @@ from app.engine.files import create_universal_file_attachment
 from fastapi import UploadFile
 import io
 from functools import lru_cache
-
-# Compile Regex
-VARIABLE_PATTERN = re.compile(r'\{\$([a-zA-Z0-9._|]+)\$}')
+from app.engine.templates import VARIABLE_PATTERN, render_model
 
 
 async def variable_loader(
@@ -118,6 +116,19 @@ def extract_variable_names(text: str) -> Optional[List[str]]:
     return list(set(matches)) if matches else None
 
 
+def contains_variables(data: Any) -> bool:
+    """
+    Проверяет, есть ли в строке, списке или словаре (включая ключи) переменные {$...$}.
+    """
+    if isinstance(data, str):
+        return VARIABLE_PATTERN.search(data) is not None
+    if isinstance(data, list):
+        return any(contains_variables(item) for item in data)
+    if isinstance(data, dict):
+        return any(contains_variables(key) or contains_variables(value) for key, value in data.items())
+    return False
+
+
 async def variable_substitution(
         data: Union[str, List[Any], Dict[str, Any]],
         context: Dict[str, Any] | None = None) -> str:
@@ -367,10 +378,9 @@ async def variable_substitution_pydantic(
                                          model: Type[BaseModelPydantic],
                                          context: Dict[str, Any] | None = None) -> BaseModel:
     """
-    Выполняет подстановку переменных в полях Pydantic-модели.
+    Выполняет подстановку переменных в полях Pydantic-модели через скомпилированные шаблоны.
     """
-    data = await replace_variables_universal(model.model_dump(), context)
-    return model.model_validate(data)
+    return render_model(model, context)
 
 
 async def update_variables_dict(current_vars: dict,
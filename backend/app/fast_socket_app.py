@@ -31,8 +31,10 @@ async def handle_channel_message(msg: dict):
 async def handle_bot_message(msg: dict):
     try:
         bot_id = msg["bot_id"]
-        message_data = msg["message"]
-        await notify_bot(bot_id, message_data)
+        # Воркеры публикуют логи пачками ("messages"), в сокет они уходят по одному
+        messages = msg["messages"] if "messages" in msg else [msg["message"]]
+        for message_data in messages:
+            await notify_bot(bot_id, message_data)
     except Exception as e:
         logger.error(f"[ERROR][bot_message_queue] {e}")
 
@@ -9,6 +9,17 @@ from app.broker import broker
 from app.schemas import rebuild_models
 from app.config import settings
 from app.engine.bot_processor import check_message
+from app.engine.code_pool import code_pool
+from app.engine.compiled_bot import compiled_bot_cache
+from app.engine.dispatcher import PartitionedDispatcher, session_partition_key
+from app.engine.request import http_clients
+from app.engine.stream_consumer import StreamPipelineConsumer, decode_stream_fields, report_stream_stats
+from app.engine.stream_reclaim import reclaim_pending
+from app.managers.credential_cache import credential_cache
+from app.managers.data_manager import l1_cache, listen_cache_invalidation
+from app.loggers.shipper import bot_log_shipper
+from app.services.s3_client import s3_pool
+from app.metrics.pipeline import serve_metrics
 from redis.asyncio import Redis
 
 import logging.config
@@ -23,7 +34,6 @@ consumer_id = f"{role}-consumer-{uuid4()}"
 
 app = FastStream(broker)
 
-semaphore = asyncio.Semaphore(settings.DB_POOL_SIZE)
 
 
 async def handle_message(message_data):
@@ -37,23 +47,28 @@ async def handle_message(message_data):
     await check_message(message, channel_id)
 
 
+# Сообщения одной сессии (sender, bot/channel) обрабатываются по порядку, разные сессии — параллельно
+dispatcher = PartitionedDispatcher(handle_message, partitions=settings.WORKER_PARTITIONS)
+
+
 async def process_batch(messages, stream_name, group_name, from_claim=False):
     async def process_one_safe(m):
-        async with semaphore:
-            try:
-                if from_claim:
-                    msg_id, payload = m
-                    await handle_message(payload)
+        try:
+            if from_claim:
+                msg_id, payload = m
+                if isinstance(payload, dict) and payload.get("channel_id") == "init":
                     return msg_id
-                else:
-                    if isinstance(m.get("channel_id"), str) and m.get("channel_id") == "init":
-                        logger.debug("Skipping init message")
-                        return
-                    await handle_message(m)
-                    return None
-            except Exception:
-                logger.exception("Failed to process message")
+                await dispatcher.submit(session_partition_key(payload), payload)
+                return msg_id
+            else:
+                if isinstance(m.get("channel_id"), str) and m.get("channel_id") == "init":
+                    logger.debug("Skipping init message")
+                    return
+                await dispatcher.submit(session_partition_key(m), m)
                 return None
+        except Exception:
+            logger.exception("Failed to process message")
+            return None
 
     results = await asyncio.gather(*[process_one_safe(m) for m in messages])
 
@@ -63,7 +78,22 @@ async def process_batch(messages, stream_name, group_name, from_claim=False):
         if ack_ids:
             await broker._connection.xack(stream_name, group_name, *ack_ids)
 
-if role == "user":
+
+async def process_stream_message(message_data):
+    """Обработчик pipeline-режима: одно сообщение, XACK делает StreamPipelineConsumer."""
+    if isinstance(message_data, dict) and message_data.get("channel_id") == "init":
+        logger.debug("Skipping init message")
+        return
+    await dispatcher.submit(session_partition_key(message_data), message_data)
+
+
+if role not in ("user", "bot"):
+    raise ValueError(f"Unknown role: {role}")
+
+if settings.WORKER_MODE == "pipeline":
+    logger.info(f"[{role.upper()}] Worker runs in pipeline mode")
+
+elif role == "user":
 
     @broker.subscriber(stream=StreamSub(
         settings.USER_STREAM_NAME,
@@ -89,15 +119,14 @@ elif role == "bot":
         logger.info(f"Received {len(messages)} bot messages")
         await process_batch(messages, settings.BOT_STREAM_NAME, settings.BOT_STREAM_GROUP)
 
-else:
-    raise ValueError(f"Unknown role: {role}")
-
 
 @app.after_startup
 async def after_startup_tasks():
     stream_name = settings.BOT_STREAM_NAME if role == "bot" else settings.USER_STREAM_NAME
     group_name = settings.BOT_STREAM_GROUP if role == "bot" else settings.USER_STREAM_GROUP
 
+    serve_metrics(settings.WORKER_METRICS_PORT)
+
     redis = Redis.from_url(settings.REDIS_URL)
     try:
         await redis.xadd(stream_name, {"message": "init", "channel_id": "init"})
@@ -105,42 +134,73 @@ async def after_startup_tasks():
     except Exception as e:
         logger.warning(f"[{role.upper()}] Stream initialization skipped or failed: {e}")
 
-    async def reclaim_pending():
+    async def process_claimed(entries):
+        claimed = [(msg_id, decode_stream_fields(fields, broker.message_format)) for msg_id, fields in entries]
+        await process_batch(claimed, stream_name, group_name, from_claim=True)
+
+    async def reclaim_loop():
         logger.info(f"[{role.upper()}] Reclaim loop started for stream: {stream_name}, group: {group_name}, consumer: {consumer_id}")
 
         while True:
             try:
-                pending = await redis.xpending_range(
+                claimed = await reclaim_pending(
+                    redis,
                     stream_name,
                     group_name,
-                    min="-",
-                    max="+",
-                    count=10
+                    consumer_id,
+                    process_claimed,
+                    batch_size=settings.RECLAIM_BATCH_SIZE,
+                    min_idle_ms=settings.RECLAIM_MIN_IDLE_MS,
+                    max_deliveries=settings.STREAM_MAX_DELIVERIES,
                 )
-                logger.debug(f"[{role.upper()}] Pending messages: {len(pending)}")
-
-                to_reclaim = [entry for entry in pending if entry["consumer"] != consumer_id]
-                for entry in to_reclaim:
-                    msg_id = entry["message_id"]
-                    logger.warning(f"[{role.upper()}] Reclaiming {msg_id} from {entry['consumer']}")
-
-                    claimed = await redis.xclaim(
-                        stream_name,
-                        group_name,
-                        consumer_id,
-                        min_idle_time=10_000,
-                        message_ids=[msg_id],
-                    )
-                    logger.info(f"[{role.upper()}] Claimed {len(claimed)} message(s)")
-
-                    await process_batch(claimed, stream_name, group_name, from_claim=True)
+                logger.debug(f"[{role.upper()}] Reclaim pass done, claimed: {claimed}")
             except Exception as e:
                 logger.exception(f"[{role.upper()}] Error during reclaim_pending: {e}")
 
-            logger.debug(f"[{role.upper()}] Reclaim loop sleeping 30s...")
-            await asyncio.sleep(30)
-
-    asyncio.create_task(reclaim_pending())
+            await asyncio.sleep(settings.RECLAIM_INTERVAL)
+
+    asyncio.create_task(reclaim_loop())
+
+    if settings.WORKER_MODE == "pipeline":
+        consumer = StreamPipelineConsumer(
+            Redis.from_url(settings.REDIS_URL),
+            stream_name,
+            group_name,
+            consumer_id,
+            process_stream_message,
+            message_format=broker.message_format,
+            high_water=settings.WORKER_HIGH_WATER,
+            prefetch_min=settings.WORKER_PREFETCH_MIN,
+            prefetch_max=settings.WORKER_PREFETCH_MAX,
+            target_latency=settings.WORKER_TARGET_LATENCY,
+            backlog=dispatcher.pending,
+        )
+        asyncio.create_task(consumer.run())
+    else:
+        async def stream_stats_loop():
+            while True:
+                await report_stream_stats(redis, stream_name, group_name)
+                await asyncio.sleep(settings.WORKER_METRICS_INTERVAL)
+
+        asyncio.create_task(stream_stats_loop())
+
+    if settings.CODE_EXECUTION_MODE == "process":
+        code_pool.start()
+
+    invalidation_handlers = [compiled_bot_cache.handle_invalidation, credential_cache.handle_invalidation]
+    if l1_cache is not None:
+        invalidation_handlers.append(l1_cache.invalidate)
+    cache_redis = Redis.from_url(settings.CACHE_REDIS_URL)
+    asyncio.create_task(listen_cache_invalidation(cache_redis, invalidation_handlers))
+
+
+
+@app.on_shutdown
+async def shutdown_tasks():
+    await code_pool.close()
+    await bot_log_shipper.close()
+    await http_clients.aclose()
+    await s3_pool.close()
 
 
 if __name__ == "__main__":
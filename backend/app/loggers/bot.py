@@ -1,7 +1,7 @@
+import json
 import logging
-from app.broker import broker
 from app.logging_config import LOGGING_CONFIG
-from app.config import settings
+from app.loggers.shipper import bot_log_shipper
 
 
 class BotLogger:
@@ -10,6 +10,7 @@ class BotLogger:
         self.step_id = None
         self.logger = logging.getLogger(__name__)
         self.formatter = logging.Formatter(LOGGING_CONFIG["formatters"]["default"]["format"])
+        self._variables: dict | None = None
 
     def set_step(self, step_id: str):
         self.step_id = step_id
@@ -24,24 +25,33 @@ class BotLogger:
         await self.log(message, logging.ERROR)
 
     async def log(self, message: str, level: int = logging.INFO):
-        # Форматирование сообщения
+        # Логирование в обычный логгер
+        self.logger.log(level, message)
+
+        # Отправка лога в отладочный сокет бота, только если его кто-то слушает
+        if not await bot_log_shipper.is_listened(self.bot_id):
+            return
         record = self.logger.makeRecord(
             self.logger.name, level, None, None, message, None, None
         )
-        formatted_message = self.formatter.format(record)
-
-        # Логирование в обычный логгер
-        self.logger.log(level, formatted_message)
-
-        # Отправка лога в брокер
-        await broker.publish({"bot_id": self.bot_id, "message": {"type": "logs", "level": logging.getLevelName(level), "step_id": self.step_id, "message": formatted_message}}, "bot_message_queue")
+        bot_log_shipper.add(self.bot_id, {"type": "logs", "level": logging.getLevelName(level),
+                                          "step_id": self.step_id, "message": self.formatter.format(record)})
 
     async def print(self, *args, sep=' ', end='\n'):
         message = sep.join(str(arg) for arg in args) + end
         await self.info(message.rstrip('\n'))
 
     async def send_variables(self, variables: dict):
-        await broker.publish({"bot_id": self.bot_id, "message": {"type": "variables", "variables": variables}}, "bot_message_queue")
+        """Запоминает снимок переменных; в сокет уходит только последний снимок — при flush."""
+        self._variables = variables
+
+    async def flush(self):
+        """Вызывается в конце обработки сообщения."""
+        variables, self._variables = self._variables, None
+        if variables is None or not await bot_log_shipper.is_listened(self.bot_id):
+            return
+        bot_log_shipper.add(self.bot_id, {"type": "variables",
+                                          "variables": json.loads(json.dumps(variables, default=str))})
 
 
 class NoopBotLogger(BotLogger):
@@ -58,4 +68,6 @@ class NoopBotLogger(BotLogger):
 
     async def print(self, *args, **kwargs): return
 
-    async def send_variables(self, variables: dict): return
\ No newline at end of file
+    async def send_variables(self, variables: dict): return
+
+    async def flush(self): return
\ No newline at end of file
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from app.broker import broker
+from app.config import settings
+from app.managers.websocket.presence import BotListenerPresence, bot_listener_presence
+
+logger = logging.getLogger(__name__)
+
+BOT_MESSAGE_QUEUE = "bot_message_queue"
+
+
+async def _publish_to_broker(payload: dict) -> None:
+    await broker.publish(payload, BOT_MESSAGE_QUEUE)
+
+
+class BotLogShipper:
+    """
+    Буферизует сообщения отладочного сокета бота (логи, переменные) и публикует их пачками:
+    по таймеру flush_interval или при накоплении batch_size сообщений одного бота.
+    Сообщения ботов без открытых слушателей не буферизуются вовсе.
+    """
+
+    def __init__(self, publish: Callable[[dict], Awaitable[None]] = _publish_to_broker,
+                 presence: BotListenerPresence = bot_listener_presence,
+                 batch_size: int = 50, flush_interval: float = 0.5, max_buffer: int = 1000,
+                 presence_cache_ttl: float = 2.0):
+        self.publish = publish
+        self.presence = presence
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.presence_cache_ttl = presence_cache_ttl
+        self._buffers: dict[str, list[dict]] = {}
+        self._dropped: dict[str, int] = {}
+        self._listeners: dict[str, tuple[float, bool]] = {}
+        self._timer: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def is_listened(self, bot_id: str) -> bool:
+        """Есть ли у бота слушатель; ответ Redis кешируется на presence_cache_ttl."""
+        bot_id = str(bot_id)
+        now = time.monotonic()
+        cached = self._listeners.get(bot_id)
+        if cached is not None and now - cached[0] < self.presence_cache_ttl:
+            return cached[1]
+        try:
+            listened = await self.presence.has_listeners(bot_id)
+        except Exception as e:
+            logger.warning(f"Failed to check bot listeners for {bot_id}: {e}")
+            listened = True
+        self._listeners[bot_id] = (now, listened)
+        return listened
+
+    def add(self, bot_id: str, message: dict) -> None:
+        bot_id = str(bot_id)
+        buffer = self._buffers.setdefault(bot_id, [])
+        if len(buffer) >= self.max_buffer:
+            self._dropped[bot_id] = self._dropped.get(bot_id, 0) + 1
+            return
+        buffer.append(message)
+        self._ensure_timer()
+        if len(buffer) >= self.batch_size:
+            task = asyncio.create_task(self.flush(bot_id))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    def _ensure_timer(self) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self, bot_id: str | None = None) -> None:
+        bot_ids = [str(bot_id)] if bot_id is not None else list(self._buffers)
+        for current_id in bot_ids:
+            messages = self._buffers.pop(current_id, [])
+            dropped = self._dropped.pop(current_id, 0)
+            if dropped:
+                messages.append({"type": "logs", "level": "WARNING", "step_id": None,
+                                 "message": f"{dropped} log record(s) dropped: buffer limit {self.max_buffer}"})
+            if not messages:
+                continue
+            try:
+                await self.publish({"bot_id": current_id, "messages": messages})
+            except Exception as e:
+                logger.error(f"Failed to publish {len(messages)} bot log message(s) for {current_id}: {e}")
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+
+bot_log_shipper = BotLogShipper(
+    batch_size=settings.BOT_LOG_BATCH_SIZE,
+    flush_interval=settings.BOT_LOG_FLUSH_INTERVAL,
+    max_buffer=settings.BOT_LOG_MAX_BUFFER,
+    presence_cache_ttl=settings.BOT_LOG_PRESENCE_CACHE_TTL,
+)
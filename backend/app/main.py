@@ -1,10 +1,12 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import logging
 import logging.config
 import traceback
 from contextlib import asynccontextmanager
 import uvicorn
+from redis.asyncio import Redis
 from fastapi import FastAPI, Request
 from starlette.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
@@ -48,7 +50,10 @@ from app.admin import dashboard
 from database import sessionmanager
 from app.broker import broker
 from app.fast_socket_app import fast_socket_app
-from app.engine.request import global_http_client
+from app.engine.request import http_clients
+from app.services.s3_client import s3_pool
+from app.managers.credential_cache import credential_cache
+from app.managers.data_manager import listen_cache_invalidation
 from uvicorn.config import LOGGING_CONFIG as UVICORN_LOGGING_CONFIG
 
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -58,6 +63,8 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage startup and shutdown tasks for the FastAPI application."""
+    invalidation_listener = asyncio.create_task(listen_cache_invalidation(
+        Redis.from_url(settings.CACHE_REDIS_URL), [credential_cache.handle_invalidation]))
     try:
         await broker.start()
         await fast_socket_app.start()
@@ -66,10 +73,12 @@ async def lifespan(app: FastAPI):
     except Exception as exc:
         logging.error(f"Failed to start background services: {exc}")
     finally:
+        invalidation_listener.cancel()
         await broker.close()
         await fast_socket_app.stop()
         logging.info("Background services stopped")
-        await global_http_client.aclose()
+        await http_clients.aclose()
+        await s3_pool.close()
         if sessionmanager.engine is not None:  # pyright: ignore
             await sessionmanager.close()
 
@@ -0,0 +1,171 @@
+"""Кеш учёток: в Redis — строки с зашифрованным data, как в БД; расшифрованные payload — только в памяти процесса."""
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from app.config import settings
+from app.metrics.pipeline import pipeline_metrics
+from app.utils.secret_box import decrypt_blob_to_dict
+
+logger = logging.getLogger(__name__)
+
+CACHE_FAMILY = "credential"
+BOT_PREFIX = "credential:bot:"
+ID_PREFIX = "credential:id:"
+INVALIDATE_ALL = "*"  # как в data_manager.listen_cache_invalidation
+# Отсутствие учётки тоже кешируется, создание учётки сбрасывает кеш бота
+MISSING = "null"
+
+LoadRow = Callable[[], Awaitable[dict | None]]
+
+
+def bot_key(bot_id: str) -> str:
+    return f"{BOT_PREFIX}{bot_id}"
+
+
+class CredentialCache:
+    """
+    L2 (Redis): хеш credential:bot:<bot_id>:v<N> с полями вида "<provider>:<strategy>:<kind>"
+    и ключи credential:id:<id>:v<N>; значение — строка credentials_entity с зашифрованным data.
+    N — версия из <имя>:ver, её увеличивает инвалидация: загрузка, прочитавшая строку до изменения,
+    запишет её под старой версией, которую уже никто не читает.
+    L1 (процесс): расшифрованная учётка на ttl секунд.
+    Изменение учёток бота увеличивает версии и публикует credential:bot:<bot_id>
+    в канал инвалидации, по которому процессы сбрасывают L1 этого бота.
+    """
+
+    def __init__(self, redis: Redis | None = None, ttl: int = 30, redis_ttl: int = 300, max_size: int = 1000):
+        self._redis = redis
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.max_size = max_size
+        # key -> (expires_at, bot_id, учётка или None)
+        self._items: OrderedDict[str, tuple[float, str | None, dict | None]] = OrderedDict()
+        # Загрузка, начатая до инвалидации, не попадёт в L1
+        self._generation = 0
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(settings.CACHE_REDIS_URL)
+        return self._redis
+
+    @staticmethod
+    def _decrypt(raw: str) -> dict | None:
+        row = json.loads(raw)
+        if row is None:
+            return None
+        row["payload"] = decrypt_blob_to_dict(row.pop("data"))
+        return row
+
+    def _get_local(self, key: str) -> tuple[bool, dict | None]:
+        item = self._items.get(key)
+        if item is not None and item[0] <= time.monotonic():
+            del self._items[key]
+            item = None
+        pipeline_metrics.observe_cache(CACHE_FAMILY, "l1", item is not None)
+        if item is None:
+            return False, None
+        self._items.move_to_end(key)
+        return True, item[2]
+
+    def _set_local(self, key: str, bot_id: str | None, data: dict | None, generation: int) -> None:
+        if self.ttl <= 0 or generation != self._generation:
+            return
+        self._items[key] = (time.monotonic() + self.ttl, bot_id, data)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    @staticmethod
+    async def _read_version(redis: Redis, name: str) -> int | None:
+        try:
+            version = await redis.get(f"{name}:ver")
+        except Exception as e:
+            logger.warning(f"Credential cache version read failed for {name}: {e}")
+            return None
+        return int(version or 0)
+
+    async def _read_remote(self, redis: Redis, name: str, field: str | None) -> str | None:
+        try:
+            raw = await (redis.hget(name, field) if field is not None else redis.get(name))
+        except Exception as e:
+            logger.warning(f"Credential cache read failed for {name}: {e}")
+            return None
+        pipeline_metrics.observe_cache(CACHE_FAMILY, "l2", raw is not None)
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    async def _write_remote(self, redis: Redis, name: str, field: str | None, raw: str) -> None:
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                if field is not None:
+                    pipe.hset(name, field, raw)
+                    pipe.expire(name, self.redis_ttl)
+                else:
+                    pipe.set(name, raw, ex=self.redis_ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Credential cache write failed for {name}: {e}")
+
+    async def _get(self, redis: Redis, name: str, field: str | None, bot_id: str | None,
+                   load_row: LoadRow) -> dict | None:
+        local_key = f"{name}:{field}" if field is not None else name
+        found, data = self._get_local(local_key)
+        if found:
+            return data
+
+        generation = self._generation
+        version = await self._read_version(redis, name)
+        # Без версии Redis недоступен — читаем БД и ничего не кешируем в L2
+        raw = await self._read_remote(redis, f"{name}:v{version}", field) if version is not None else None
+        if raw is None:
+            row = await load_row()
+            raw = json.dumps(row, default=str) if row else MISSING
+            if version is not None:
+                await self._write_remote(redis, f"{name}:v{version}", field, raw)
+        data = self._decrypt(raw)
+        owner = bot_id or (str(data["bot_id"]) if data else None)
+        self._set_local(local_key, owner, data, generation)
+        return data
+
+    async def get_by_id(self, redis: Redis, cred_id: str, load_row: LoadRow) -> dict | None:
+        return await self._get(redis, f"{ID_PREFIX}{cred_id}", None, None, load_row)
+
+    async def get_for_bot(self, redis: Redis, bot_id: str, field: str, load_row: LoadRow) -> dict | None:
+        return await self._get(redis, bot_key(bot_id), field, str(bot_id), load_row)
+
+    def handle_invalidation(self, key: str) -> None:
+        """Обработчик канала инвалидации (listen_cache_invalidation)."""
+        if key == INVALIDATE_ALL:
+            self.clear()
+        elif key.startswith(BOT_PREFIX):
+            self.forget_bot(key[len(BOT_PREFIX):])
+
+    def forget_bot(self, bot_id: str) -> None:
+        self._generation += 1
+        for key in [key for key, (_, owner, _) in self._items.items() if owner == bot_id]:
+            del self._items[key]
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._items.clear()
+
+    async def invalidate(self, bot_id: str, cred_id: str | None = None) -> None:
+        """Сбрасывает учётки бота в Redis и во всех процессах."""
+        bot_id = str(bot_id)
+        self.forget_bot(bot_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            # Старые версии истекут по redis_ttl
+            pipe.incr(f"{bot_key(bot_id)}:ver")
+            if cred_id:
+                pipe.incr(f"{ID_PREFIX}{cred_id}:ver")
+            pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, bot_key(bot_id))
+            await pipe.execute()
+
+
+credential_cache = CredentialCache(ttl=settings.CREDENTIAL_CACHE_L1_TTL, redis_ttl=settings.CREDENTIAL_CACHE_TTL,
+                                   max_size=settings.CREDENTIAL_CACHE_L1_MAX_SIZE)
@@ -1,18 +1,26 @@
 import json
 import logging
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Callable, Optional, List, Tuple, Dict
+from typing import Any, Callable, Optional, List, Tuple, Dict, Iterable
 from uuid import uuid4
 
 from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy import text
 import asyncio
+from app.config import settings
+from app.metrics.pipeline import pipeline_metrics
+from app.managers.credential_cache import credential_cache
 from app.models.base import BaseModel
-from app.utils.secret_box import decrypt_blob_to_dict
 
 logger = logging.getLogger(__name__)
 
+# Ключ в канале инвалидации, означающий "сбросить весь L1-кеш"
+INVALIDATE_ALL = "*"
+
 
 class CacheLock:
     """
@@ -29,6 +37,117 @@ class CacheLock:
         return self.locks[key]
 
 
+class LocalCache:
+    """
+    Процессный L1-кеш поверх Redis (L2): ограничен по размеру (LRU) и по TTL.
+    DataManager хранит в нём сериализованный JSON, поэтому каждый get отдаёт свежую копию данных.
+    Вытеснения считаются в bot_cache_evictions_total по семействам ключей (bot, channel, variables:*, session, ...),
+    hit/miss L1 пишет DataManager в bot_cache_requests_total.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: int = 30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # Счётчики инвалидаций по ключам: загрузка, начатая до инвалидации, не попадёт в L1
+        self._generations: OrderedDict[str, int] = OrderedDict()
+
+    @staticmethod
+    def key_family(key: str) -> str:
+        parts = key.split(":")
+        if parts[0] == "variables" and len(parts) > 1:
+            return f"variables:{parts[1]}"
+        return parts[0]
+
+    def generation(self, key: str) -> int:
+        return self._generations.get(key, 0)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int | None = None, generation: int | None = None) -> None:
+        if generation is not None and generation != self.generation(key):
+            # Ключ инвалидирован, пока данные загружались
+            return
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        self._items[key] = (time.monotonic() + ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            evicted_key, _ = self._items.popitem(last=False)
+            pipeline_metrics.observe_cache_eviction(self.key_family(evicted_key))
+
+    def invalidate(self, key: str) -> None:
+        if key == INVALIDATE_ALL:
+            self.clear()
+            return
+        self._items.pop(key, None)
+        self._generations[key] = self._generations.pop(key, 0) + 1
+        while len(self._generations) > self.max_size:
+            self._generations.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+        for key in list(self._generations):
+            self._generations[key] += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+async def listen_cache_invalidation(redis: Redis, handlers: Iterable[Callable[[str], Any]]) -> None:
+    """
+    Слушает канал инвалидации и передаёт каждый ключ обработчикам (L1-кеш, кеш скомпилированных ботов).
+    После обрыва соединения переподписывается и сбрасывает локальные кеши целиком.
+    """
+    handlers = list(handlers)
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            logger.info(f"Subscribed to cache invalidation channel: {settings.CACHE_INVALIDATION_CHANNEL}")
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                key = message["data"]
+                if isinstance(key, bytes):
+                    key = key.decode()
+                for handler in handlers:
+                    try:
+                        handler(key)
+                    except Exception:
+                        logger.exception(f"Cache invalidation handler failed for key={key}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener error: {e}")
+            # Пока не были подписаны, могли пропустить инвалидации
+            for handler in handlers:
+                try:
+                    handler(INVALIDATE_ALL)
+                except Exception:
+                    logger.exception("Cache invalidation handler failed on reset")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+l1_cache: LocalCache | None = LocalCache(
+    max_size=settings.DATA_CACHE_L1_MAX_SIZE,
+    ttl=settings.DATA_CACHE_L1_TTL,
+) if settings.DATA_CACHE_L1_ENABLED else None
+
+
 class QueryProvider:
     """
     Класс для хранения SQL-запросов и логики извлечения из них.
@@ -54,6 +173,22 @@ class QueryProvider:
         return f"INSERT INTO {model} (:columns) VALUES (:values)", {"model": model, "columns": list(data.keys()),
                                                                     "values": list(data.values())}
 
+    @staticmethod
+    def combine_row_queries(queries: List[tuple[str, dict[str, Any]]]) -> tuple[str, dict[str, Any]]:
+        """
+        Объединяет несколько однострочных запросов в один SELECT.
+        Результат i-го запроса возвращается JSON-объектом в колонке r{i} (NULL, если строки нет).
+        Параметры переименовываются с префиксом q{i}_, чтобы не пересекаться.
+        """
+        columns = []
+        combined_params = {}
+        for i, (query, params) in enumerate(queries):
+            for name, value in params.items():
+                query = re.sub(rf"(?<!:):{name}\b", f":q{i}_{name}", query)
+                combined_params[f"q{i}_{name}"] = value
+            columns.append(f"(SELECT row_to_json(t) FROM ({query}) t LIMIT 1) AS r{i}")
+        return "SELECT " + ",\n".join(columns), combined_params
+
     @staticmethod
     def get_bot_query(bot_id: str) -> tuple[str, dict[str, Any]]:
         return "SELECT * FROM bot WHERE id = :id", {"id": bot_id}
@@ -178,6 +313,17 @@ class QueryProvider:
         return ("UPDATE user_variables SET data = :variables WHERE id = :id RETURNING data",
                 {"id": user_id, "variables": variables})
 
+    @staticmethod
+    def patch_variables_query(table: str, obj_id: str, patch: dict, removed: list[str]):
+        if table not in ("bot_variables", "user_variables", "channel_variables", "session_variables"):
+            raise ValueError(f"Unknown variables table: {table}")
+        return (f"""UPDATE {table}
+                    SET data = ((COALESCE(data::jsonb, '{{}}'::jsonb) - CAST(:removed AS text[]))
+                                || CAST(:patch AS jsonb))::json
+                    WHERE id = :id
+                    RETURNING data""",
+                {"id": obj_id, "patch": json.dumps(patch, default=str), "removed": list(removed)})
+
     @staticmethod
     def update_session_query(user_id: str, bot_id: str, channel_id: str, step_id: str) -> tuple[str, dict[str, Any]]:
         return """UPDATE session
@@ -268,12 +414,27 @@ class QueryProvider:
         return base, params
 
 class DataManager:
-    def __init__(self, redis: Redis, engine: AsyncEngine):
+    def __init__(self, redis: Redis, engine: AsyncEngine, local_cache: LocalCache | None = None):
         self.redis = redis
         self.engine = engine
+        self.local_cache = local_cache
         self.cache_lock = CacheLock()
         self.query_provider = QueryProvider(engine)
 
+    def _get_local(self, key: str) -> Any:
+        if self.local_cache is None:
+            return None
+        raw = self.local_cache.get(key)
+        pipeline_metrics.observe_cache(LocalCache.key_family(key), "l1", raw is not None)
+        return json.loads(raw) if raw is not None else None
+
+    def _set_local(self, key: str, raw: str | bytes, ttl: int, generation: int | None) -> None:
+        if self.local_cache is not None:
+            self.local_cache.set(key, raw, ttl, generation)
+
+    def _local_generation(self, key: str) -> int | None:
+        return self.local_cache.generation(key) if self.local_cache is not None else None
+
     @staticmethod
     async def _get_db_query(db_query: Callable[[], tuple[str, dict]], conn) -> dict:
         query, params = db_query()
@@ -292,9 +453,16 @@ class DataManager:
         return data
 
     async def _get_or_load_list(self, key: str, ttl: int, db_query: Callable[[], tuple[str, dict]]) -> list:
+        local = self._get_local(key)
+        if local is not None:
+            return local
+        generation = self._local_generation(key)
+
         cached = await self.redis.get(key)
+        pipeline_metrics.observe_cache(LocalCache.key_family(key), "l2", bool(cached))
         if cached:
             logger.debug(f"Cache hit: {key}")
+            self._set_local(key, cached, ttl, generation)
             return json.loads(cached)
 
         lock = self.cache_lock.get_lock(key)
@@ -302,16 +470,26 @@ class DataManager:
             if cached:
                 logger.debug(f"Delayed cache hit: {key}")
                 return json.loads(cached)
-            async with self.engine.connect() as conn:
-                data = await self._get_list_db_query(db_query, conn)
-                await self.redis.set(key, json.dumps(data, default=str), ex=ttl)
-                logger.debug(f"Cache miss: {key}, loading from DB")
-                return data
+            with pipeline_metrics.time_query(LocalCache.key_family(key)):
+                async with self.engine.connect() as conn:
+                    data = await self._get_list_db_query(db_query, conn)
+            raw = json.dumps(data, default=str)
+            await self.redis.set(key, raw, ex=ttl)
+            self._set_local(key, raw, ttl, generation)
+            logger.debug(f"Cache miss: {key}, loading from DB")
+            return data
 
     async def _get_or_load(self, key: str, ttl: int, db_query: Callable[[], tuple[str, dict]]) -> dict:
+        local = self._get_local(key)
+        if local is not None:
+            return local
+        generation = self._local_generation(key)
+
         cached = await self.redis.get(key)
+        pipeline_metrics.observe_cache(LocalCache.key_family(key), "l2", bool(cached))
         if cached:
             logger.debug(f"Cache hit: {key}")
+            self._set_local(key, cached, ttl, generation)
             return json.loads(cached)
 
         lock = self.cache_lock.get_lock(key)
@@ -319,13 +497,69 @@ class DataManager:
             cached = await self.redis.get(key)
             if cached:
                 logger.debug(f"Delayed cache hit: {key}")
+                self._set_local(key, cached, ttl, generation)
                 return json.loads(cached)
-            async with self.engine.connect() as conn:
+            with pipeline_metrics.time_query(LocalCache.key_family(key)):
+                async with self.engine.connect() as conn:
+                    data = await self._get_db_query(db_query, conn)
+            raw = json.dumps(data, default=str)
+            await self.redis.set(key, raw, ex=ttl)
+            self._set_local(key, raw, ttl, generation)
+            logger.debug(f"Cache miss: {key}, loading from DB")
+            return data
 
-                data = await self._get_db_query(db_query, conn)
-                await self.redis.set(key, json.dumps(data, default=str), ex=ttl)
+    async def _get_or_load_many(self, items: List[tuple[str, int, Callable[[], tuple[str, dict]]]]) -> List[dict]:
+        """
+        Пакетный вариант _get_or_load: L1, затем один MGET по оставшимся ключам,
+        промахи добираются одним объединённым SQL-запросом и записываются в Redis одним pipeline.
+        """
+        results: List[Optional[dict]] = [None] * len(items)
+        generations: Dict[int, Optional[int]] = {}
+        pending = []
+        for i, (key, _, _) in enumerate(items):
+            local = self._get_local(key)
+            if local is not None:
+                results[i] = local
+            else:
+                generations[i] = self._local_generation(key)
+                pending.append(i)
+        if not pending:
+            return results
+
+        cached_values = await self.redis.mget([items[i][0] for i in pending])
+        misses = []
+        for i, cached in zip(pending, cached_values):
+            key, ttl, _ = items[i]
+            pipeline_metrics.observe_cache(LocalCache.key_family(key), "l2", bool(cached))
+            if cached:
+                logger.debug(f"Cache hit: {key}")
+                self._set_local(key, cached, ttl, generations[i])
+                results[i] = json.loads(cached)
+            else:
+                misses.append(i)
+        if not misses:
+            return results
+
+        query, params = QueryProvider.combine_row_queries([items[i][2]() for i in misses])
+        with pipeline_metrics.time_query("batch"):
+            async with self.engine.connect() as conn:
+                result = await conn.execute(text(query), params)
+                row = result.first()
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for column, i in enumerate(misses):
+                key, ttl, _ = items[i]
+                data = row[column] if row is not None else None
+                if isinstance(data, str):
+                    data = json.loads(data)
+                data = data or {}
+                raw = json.dumps(data, default=str)
+                pipe.set(key, raw, ex=ttl)
+                self._set_local(key, raw, ttl, generations[i])
+                results[i] = data
                 logger.debug(f"Cache miss: {key}, loading from DB")
-                return data
+            await pipe.execute()
+        return results
 
     @staticmethod
     async def _update_db_query(db_query: Callable[[], tuple[str, dict]], conn) -> dict:
@@ -336,12 +570,22 @@ class DataManager:
         return row
 
     async def _update_cache(self, key: str, ttl: int, data: dict | list):
-        await self.redis.set(key, json.dumps(data, default=str), ex=ttl)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(data, default=str), ex=ttl)
+            pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, key)
+            await pipe.execute()
+        if self.local_cache is not None:
+            self.local_cache.invalidate(key)
         logger.debug(f"Cache updated: {key}")
 
     async def _invalidate_cache(self, key: str):
         """Инвалидирует кеш по ключу"""
-        await self.redis.delete(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(key)
+            pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, key)
+            await pipe.execute()
+        if self.local_cache is not None:
+            self.local_cache.invalidate(key)
         logger.debug(f"Cache invalidated: {key}")
 
     async def invalidate_user_variables_cache(self, user_id: str):
@@ -422,12 +666,43 @@ class DataManager:
             db_query=lambda: QueryProvider.get_obj("channel", channel_id)
         )
 
+    def _remember_structure_version(self, key: str, bot: dict, generation: int | None) -> None:
+        """
+        Старые кеши без structure_version: версия считается один раз на загрузку
+        и записывается в L1, иначе CompiledBotCache хешировал бы структуру на каждом сообщении.
+        """
+        from app.engine.compiled_bot import STRUCTURE_VERSION_KEY, compute_structure_version
+
+        structure = bot.get("cache_structure") if bot else None
+        if not isinstance(structure, dict) or structure.get(STRUCTURE_VERSION_KEY):
+            return
+        structure[STRUCTURE_VERSION_KEY] = compute_structure_version(structure)
+        self._set_local(key, json.dumps(bot, default=str), 3600, generation)
+
     async def get_bot(self, bot_id: str) -> dict:
-        return await self._get_or_load(
-            key=f"bot:{bot_id}",
+        key = f"bot:{bot_id}"
+        generation = self._local_generation(key)
+        bot = await self._get_or_load(
+            key=key,
             ttl=3600,
             db_query=lambda: QueryProvider.get_bot_query(bot_id)
         )
+        self._remember_structure_version(key, bot, generation)
+        return bot
+
+    async def get_bots(self, bot_ids: list[str]) -> dict[str, dict]:
+        """Пакетная загрузка ботов: один MGET, промахи — одним SQL-запросом."""
+        bot_ids = [str(bot_id) for bot_id in dict.fromkeys(bot_ids)]
+        if not bot_ids:
+            return {}
+        generations = {bot_id: self._local_generation(f"bot:{bot_id}") for bot_id in bot_ids}
+        bots = await self._get_or_load_many([
+            (f"bot:{bot_id}", 3600, lambda bot_id=bot_id: QueryProvider.get_bot_query(bot_id))
+            for bot_id in bot_ids
+        ])
+        for bot_id, bot in zip(bot_ids, bots):
+            self._remember_structure_version(f"bot:{bot_id}", bot, generations[bot_id])
+        return dict(zip(bot_ids, bots))
 
     async def get_bot_variables(self, bot_id: str) -> dict:
         return await self._get_or_load(
@@ -465,10 +740,13 @@ class DataManager:
         )
 
     async def get_all_variables(self, user_id: str, bot_id: str, channel_id: str, session_id: str) -> dict:
-        bot_result = await self.get_bot_variables(bot_id)
-        channel_result = await self.get_channel_variables(channel_id)
-        session_data = (await self.get_session_variables(session_id)).get("data")
-        user_result = await self.get_user_variables(user_id)
+        bot_result, channel_result, session_result, user_result = await self._get_or_load_many([
+            (f"variables:bot:{bot_id}", 300, lambda: QueryProvider.get_bot_variables_query(bot_id)),
+            (f"variables:channel:{channel_id}", 300, lambda: QueryProvider.get_channel_variables_query(channel_id)),
+            (f"variables:session:{session_id}", 300, lambda: QueryProvider.get_session_variables_query(session_id)),
+            (f"variables:user:{user_id}", 300, lambda: QueryProvider.get_user_variables_query(user_id)),
+        ])
+        session_data = session_result.get("data")
         
         bot_variables = bot_result.get("data") if bot_result.get("data") is not None else {}
         bot_base_data = {
@@ -511,9 +789,15 @@ class DataManager:
 
     async def get_or_create_session(self, user_id: str, bot_id: str, channel_id: str, first_step_id: str) -> dict:
         key = f"session:user:{user_id}:bot:{bot_id}:channel:{channel_id}"
+        local = self._get_local(key)
+        if local is not None:
+            return local
+        generation = self._local_generation(key)
+
         cached = await self.redis.get(key)
         if cached:
             logger.debug(f"Cache hit: {key}")
+            self._set_local(key, cached, 3600, generation)
             return json.loads(cached)
 
         lock = self.cache_lock.get_lock(key)
@@ -521,6 +805,7 @@ class DataManager:
             cached = await self.redis.get(key)
             if cached:
                 logger.debug(f"Delayed cache hit: {key}")
+                self._set_local(key, cached, 3600, generation)
                 return json.loads(cached)
 
             logger.debug(f"Cache miss: {key}, checking DB")
@@ -554,7 +839,9 @@ class DataManager:
                     result = await conn.execute(insert_query, insert_params)
                     session_data = dict(result.mappings().first())
 
-                await self.redis.set(key, json.dumps(session_data, default=str), ex=3600)
+                raw = json.dumps(session_data, default=str)
+                await self.redis.set(key, raw, ex=3600)
+                self._set_local(key, raw, 3600, generation)
                 return session_data
 
     async def update_bot(self, bot_id: str, cache_structure: dict) -> dict:
@@ -616,6 +903,56 @@ class DataManager:
         await self.update_channel_variables(channel_id, all_variables.get("channel"))
         await self.update_session_variables(session_id, all_variables.get("session"))
 
+    async def flush_changes(self, user_id: str, bot_id: str, channel_id: str, session_id: str,
+                            changes: dict[str, tuple[dict, list[str]]], step_id: str | None = None) -> None:
+        """
+        Записывает изменения переменных и, если передан step_id, шаг сессии — одной транзакцией.
+        changes: {namespace: (изменённые ключи верхнего уровня, удалённые ключи)} для bot/user/channel/session.
+        Ключи сливаются в data на стороне БД, поэтому параллельные боты не затирают чужие изменения.
+        Кеш переменных сбрасывается, кеш сессии перезаписывается — одним Redis pipeline.
+        """
+        namespaces = {
+            "bot": (f"variables:bot:{bot_id}", "bot_variables", bot_id),
+            "user": (f"variables:user:{user_id}", "user_variables", user_id),
+            "channel": (f"variables:channel:{channel_id}", "channel_variables", channel_id),
+            "session": (f"variables:session:{session_id}", "session_variables", session_id),
+        }
+        updates = []
+        for namespace, (patch, removed) in changes.items():
+            key, table, obj_id = namespaces[namespace]
+            updates.append((key, None, QueryProvider.patch_variables_query(table, obj_id, patch, removed)))
+        if step_id is not None:
+            updates.append((f"session:user:{user_id}:bot:{bot_id}:channel:{channel_id}", 3600,
+                            QueryProvider.update_session_query(user_id, bot_id, channel_id, step_id)))
+        if not updates:
+            return
+
+        try:
+            written = []
+            with pipeline_metrics.time_query("flush"):
+                async with self.engine.begin() as conn:
+                    for key, ttl, (query, params) in updates:
+                        row = (await conn.execute(text(query), params)).mappings().first()
+                        if not row:
+                            logger.warning(f"No row returned for update with key={key}")
+                            continue
+                        written.append((key, ttl, json.dumps(dict(row), default=str) if ttl else None))
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, ttl, raw in written:
+                    if raw is None:
+                        pipe.delete(key)
+                    else:
+                        pipe.set(key, raw, ex=ttl)
+                    pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, key)
+                await pipe.execute()
+            if self.local_cache is not None:
+                for key, _, _ in written:
+                    self.local_cache.invalidate(key)
+            logger.debug(f"Flushed keys: {[key for key, _, _ in written]}")
+        except Exception as e:
+            logger.exception(f"Error flushing changes for session={session_id}: {e}")
+
     async def get_bot_credentials_list(self, bot_id: str) -> list[dict]:
         return await self._get_or_load_list(
             key=f"bot:{bot_id}:credentials",
@@ -623,55 +960,32 @@ class DataManager:
             db_query=lambda: self.query_provider.list_bot_credentials(bot_id),
         )
 
-    async def get_credential_internal_by_id(self, cred_id: str) -> dict:
+    async def _fetch_credential_rows(self, q: str, p: dict[str, Any]) -> list[dict]:
         async with self.engine.connect() as conn:
-            q, p = self.query_provider.get_credential_by_id(cred_id)
-            row = (await conn.execute(text(q), p)).mappings().first()
-            if not row:
-                return {}
-            data = dict(row)
-            data["payload"] = decrypt_blob_to_dict(data.pop("data"))
-            return data
+            return [dict(r) for r in (await conn.execute(text(q), p)).mappings().all()]
+
+    async def get_credential_internal_by_id(self, cred_id: str) -> dict:
+        async def load_row():
+            rows = await self._fetch_credential_rows(*self.query_provider.get_credential_by_id(cred_id))
+            return rows[0] if rows else None
+
+        return await credential_cache.get_by_id(self.redis, cred_id, load_row) or {}
 
     async def resolve_default_credential(self, bot_id: str, provider: str, strategy: str | None = None) -> dict:
-        # Кэшируем credentials для быстрого доступа
-        cache_key = f"credential:bot:{bot_id}:provider:{provider}:strategy:{strategy or 'default'}:default"
-        cached = await self.redis.get(cache_key)
-        if cached:
-            logger.debug(f"Cache hit: {cache_key}")
-            return json.loads(cached)
-        
-        # Если нет в кэше, загружаем из БД
-        async with self.engine.connect() as conn:
-            q, p = self.query_provider.get_default_credential(bot_id, provider, strategy)
-            row = (await conn.execute(text(q), p)).mappings().first()
-            if not row:
-                return {}
-            data = dict(row)
-            data["payload"] = decrypt_blob_to_dict(data.pop("data"))
-            # Кэшируем на 5 минут (credentials редко меняются)
-            await self.redis.set(cache_key, json.dumps(data, default=str), ex=300)
-            logger.debug(f"Cache miss: {cache_key}, loaded from DB")
-            return data
+        async def load_row():
+            rows = await self._fetch_credential_rows(
+                *self.query_provider.get_default_credential(bot_id, provider, strategy))
+            return rows[0] if rows else None
+
+        field = f"{provider}:{strategy or '*'}:default"
+        return await credential_cache.get_for_bot(self.redis, bot_id, field, load_row) or {}
 
     async def resolve_singleton_credential(self, bot_id: str, provider: str,
                                            strategy: str | None = None) -> dict | None:
-        # Кэшируем credentials для быстрого доступа
-        cache_key = f"credential:bot:{bot_id}:provider:{provider}:strategy:{strategy or 'default'}:singleton"
-        cached = await self.redis.get(cache_key)
-        if cached:
-            logger.debug(f"Cache hit: {cache_key}")
-            return json.loads(cached)
-        
-        # Если нет в кэше, загружаем из БД
-        async with self.engine.connect() as conn:
-            q, p = self.query_provider.get_single_for_provider(bot_id, provider, strategy)
-            rows = [dict(r) for r in (await conn.execute(text(q), p)).mappings().all()]
-            if len(rows) != 1:
-                return None
-            data = rows[0]
-            data["payload"] = decrypt_blob_to_dict(data.pop("data"))
-            # Кэшируем на 5 минут
-            await self.redis.set(cache_key, json.dumps(data, default=str), ex=300)
-            logger.debug(f"Cache miss: {cache_key}, loaded from DB")
-            return data
\ No newline at end of file
+        async def load_row():
+            rows = await self._fetch_credential_rows(
+                *self.query_provider.get_single_for_provider(bot_id, provider, strategy))
+            return rows[0] if len(rows) == 1 else None
+
+        field = f"{provider}:{strategy or '*'}:singleton"
+        return await credential_cache.get_for_bot(self.redis, bot_id, field, load_row)
\ No newline at end of file
@@ -74,4 +74,8 @@ class WebSocketManagerBase:
                 del entity_conns[connection_uuid]
                 logger.info(f"[WS] Disconnected: {connection_uuid} from {entity_id}")
                 if not entity_conns:
-                    del self.active_connections[entity_id]
\ No newline at end of file
+                    del self.active_connections[entity_id]
+
+    async def touch(self, entity_id: Union[UUID, str], connection_uuid: Union[UUID, str]) -> None:
+        """Вызывается периодически, пока соединение открыто."""
+        return
@@ -1,9 +1,39 @@
+import logging
 from typing import Union
 from uuid import UUID
+from fastapi import WebSocket
 from pydantic import BaseModel
 from .base import WebSocketManagerBase
+from .presence import BotListenerPresence, bot_listener_presence
+
+logger = logging.getLogger(__name__)
 
 
 class BotWebSocketManager(WebSocketManagerBase):
+    def __init__(self, presence: BotListenerPresence = bot_listener_presence):
+        super().__init__()
+        self.presence = presence
+
     async def notify_bot(self, bot_id: Union[UUID, str], message: BaseModel | str) -> None:
         await self.notify(bot_id, message)
+
+    async def add_connection(self, entity_id: Union[UUID, str], connection_uuid: Union[UUID, str], websocket: WebSocket):
+        await super().add_connection(entity_id, connection_uuid, websocket)
+        await self.touch(entity_id, connection_uuid)
+
+    async def remove_connection(self, entity_id: Union[UUID, str], connection_uuid: Union[UUID, str]):
+        await super().remove_connection(entity_id, connection_uuid)
+        try:
+            await self.presence.remove(entity_id, connection_uuid)
+        except Exception as e:
+            logger.warning(f"[WS] Failed to remove listener presence for {entity_id}: {e}")
+
+    async def touch(self, entity_id: Union[UUID, str], connection_uuid: Union[UUID, str]) -> None:
+        """Продлевает отметку слушателя, по которой воркеры решают, отправлять ли логи бота."""
+        # Соединения, на которые не удалось отправить сообщение, notify уже убрал из active_connections
+        if connection_uuid not in self.active_connections.get(self._normalize_key(entity_id), {}):
+            return
+        try:
+            await self.presence.touch(entity_id, connection_uuid)
+        except Exception as e:
+            logger.warning(f"[WS] Failed to refresh listener presence for {entity_id}: {e}")
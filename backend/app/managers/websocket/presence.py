@@ -0,0 +1,48 @@
+import logging
+import time
+from typing import Union
+from uuid import UUID
+
+from redis.asyncio import Redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BotListenerPresence:
+    """
+    Отметки об открытых отладочных WebSocket-соединениях бота в Redis.
+    Ключ bot_listeners:<bot_id> — sorted set {connection_uuid: время истечения};
+    соединение продлевает свою отметку, пока открыто, поэтому упавший API-процесс не оставляет вечных слушателей.
+    """
+
+    def __init__(self, redis: Redis | None = None, ttl: int = 30):
+        self._redis = redis
+        self.ttl = ttl
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    @staticmethod
+    def key(bot_id: Union[UUID, str]) -> str:
+        return f"bot_listeners:{bot_id}"
+
+    async def touch(self, bot_id: Union[UUID, str], connection_uuid: Union[UUID, str]) -> None:
+        key = self.key(bot_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {str(connection_uuid): time.time() + self.ttl})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def remove(self, bot_id: Union[UUID, str], connection_uuid: Union[UUID, str]) -> None:
+        await self.redis.zrem(self.key(bot_id), str(connection_uuid))
+
+    async def has_listeners(self, bot_id: Union[UUID, str]) -> bool:
+        return await self.redis.zcount(self.key(bot_id), time.time(), "+inf") > 0
+
+
+bot_listener_presence = BotListenerPresence(ttl=settings.BOT_LOG_PRESENCE_TTL)
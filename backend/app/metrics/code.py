@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from prometheus_client import Counter, Histogram
+
+
+class CodeExecutionMetrics:
+    """Prometheus metrics helpers for the code connection group process pool."""
+
+    def __init__(self) -> None:
+        self._queue_wait = Histogram(
+            "code_pool_queue_wait_seconds",
+            "Time a snippet waited for a free pool process.",
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        )
+        self._run_duration = Histogram(
+            "code_pool_run_seconds",
+            "Time a snippet ran in a pool process.",
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+        )
+        self._kills = Counter(
+            "code_pool_kills_total",
+            "Pool processes killed or lost while running a snippet.",
+            labelnames=("reason",),
+        )
+
+    def observe_queue_wait(self, duration: float) -> None:
+        self._queue_wait.observe(duration)
+
+    def observe_run(self, duration: float) -> None:
+        self._run_duration.observe(duration)
+
+    def inc_kill(self, reason: str) -> None:
+        self._kills.labels(reason=reason).inc()
+
+
+code_metrics = CodeExecutionMetrics()
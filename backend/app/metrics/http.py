@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from prometheus_client import Counter, Gauge, Histogram
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class OutboundHttpMetrics:
+    """Prometheus metrics helpers for outbound HTTP calls of request connection groups."""
+
+    def __init__(self) -> None:
+        self._duration = Histogram(
+            "http_outbound_seconds",
+            "Outbound request duration by destination host and outcome.",
+            labelnames=("host", "outcome"),
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+        )
+        self._in_flight = Gauge(
+            "http_outbound_in_flight",
+            "Outbound requests currently running per destination host.",
+            labelnames=("host",),
+        )
+        self._rejected = Counter(
+            "http_outbound_rejected_total",
+            "Outbound requests rejected before sending (circuit_open, host_bulkhead, bot_bulkhead).",
+            labelnames=("host", "reason"),
+        )
+        self._circuit_state = Gauge(
+            "http_circuit_state",
+            "Circuit breaker state per destination host: 0 closed, 1 half-open, 2 open.",
+            labelnames=("host",),
+        )
+
+    def observe_call(self, host: str, duration: float, failed: bool) -> None:
+        self._duration.labels(host=host, outcome="failed" if failed else "ok").observe(duration)
+
+    def inc_in_flight(self, host: str) -> None:
+        self._in_flight.labels(host=host).inc()
+
+    def dec_in_flight(self, host: str) -> None:
+        self._in_flight.labels(host=host).dec()
+
+    def inc_rejected(self, host: str, reason: str) -> None:
+        self._rejected.labels(host=host, reason=reason).inc()
+
+    def set_circuit_state(self, host: str, state: str) -> None:
+        self._circuit_state.labels(host=host).set(CIRCUIT_STATES[state])
+
+
+http_metrics = OutboundHttpMetrics()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class PipelineMetrics:
+    """Prometheus metrics helpers for the bot execution pipeline in stream workers."""
+
+    def __init__(self) -> None:
+        self.message_duration = Histogram(
+            "bot_message_seconds",
+            "End-to-end time of check_message for one inbound message.",
+            buckets=LATENCY_BUCKETS,
+        )
+        self.messages_in_flight = Gauge(
+            "bot_messages_in_flight",
+            "Messages currently processed by check_message.",
+        )
+        self.handler_duration = Histogram(
+            "bot_handler_seconds",
+            "Time spent in a connection group handler.",
+            labelnames=("handler",),
+            buckets=LATENCY_BUCKETS,
+        )
+        self.query_duration = Histogram(
+            "bot_db_query_seconds",
+            "Time spent in DataManager database queries.",
+            labelnames=("query",),
+            buckets=LATENCY_BUCKETS,
+        )
+        self.cache_requests = Counter(
+            "bot_cache_requests_total",
+            "DataManager cache lookups by key family, tier (l1/l2) and result (hit/miss).",
+            labelnames=("family", "tier", "result"),
+        )
+        self.cache_evictions = Counter(
+            "bot_cache_evictions_total",
+            "Entries evicted from the process L1 cache by key family.",
+            labelnames=("family",),
+        )
+
+    def observe_cache(self, family: str, tier: str, hit: bool) -> None:
+        self.cache_requests.labels(family=family, tier=tier, result="hit" if hit else "miss").inc()
+
+    def observe_cache_eviction(self, family: str) -> None:
+        self.cache_evictions.labels(family=family).inc()
+
+    @contextmanager
+    def time_query(self, query: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.query_duration.labels(query=query).observe(time.perf_counter() - started)
+
+
+pipeline_metrics = PipelineMetrics()
+
+
+def timed(histogram: Histogram, **labels: str) -> Callable:
+    """
+    Декоратор: записывает время выполнения функции (sync или async) в histogram.
+    Метки разрешаются один раз при декорировании.
+    """
+    metric = histogram.labels(**labels) if labels else histogram
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    metric.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+
+def in_progress(gauge: Gauge, **labels: str) -> Callable:
+    """Декоратор: держит gauge увеличенным на 1, пока выполняется async-функция."""
+    metric = gauge.labels(**labels) if labels else gauge
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            metric.inc()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                metric.dec()
+        return wrapper
+
+    return decorator
+
+
+def serve_metrics(port: int) -> None:
+    """Поднимает HTTP-эндпоинт /metrics для процесса воркера (port=0 — выключено)."""
+    if not port:
+        return
+    try:
+        start_http_server(port)
+        logger.info(f"Prometheus metrics exposed on :{port}/metrics")
+    except OSError as e:
+        logger.warning(f"Failed to expose metrics on port {port}: {e}")
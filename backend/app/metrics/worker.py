@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from prometheus_client import Counter, Gauge, Histogram
+
+
+class WorkerMetrics:
+    """Prometheus metrics helpers for stream workers."""
+
+    def __init__(self) -> None:
+        self._queue_depth = Gauge(
+            "worker_queue_depth",
+            "Messages read from the stream and waiting for a free partition.",
+            labelnames=("stream",),
+        )
+        self._stream_lag = Gauge(
+            "worker_stream_lag",
+            "Entries in the stream not yet delivered to the consumer group.",
+            labelnames=("stream",),
+        )
+        self._stream_pending = Gauge(
+            "worker_stream_pending",
+            "Entries delivered to the consumer group and not yet acknowledged.",
+            labelnames=("stream",),
+        )
+        self._in_flight = Gauge(
+            "worker_in_flight",
+            "Messages read from the stream and not yet acknowledged.",
+            labelnames=("stream",),
+        )
+        self._prefetch = Gauge(
+            "worker_prefetch",
+            "Current XREADGROUP count used by the pipeline consumer.",
+            labelnames=("stream",),
+        )
+        self._processed = Counter(
+            "worker_messages_processed_total",
+            "Messages processed and acknowledged.",
+            labelnames=("stream", "status"),
+        )
+        self._processing_duration = Histogram(
+            "worker_message_processing_seconds",
+            "Time from reading a message to its acknowledgement.",
+            labelnames=("stream",),
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+        )
+
+    def set_queue_depth(self, stream: str, depth: int) -> None:
+        self._queue_depth.labels(stream=stream).set(depth)
+
+    def set_stream_lag(self, stream: str, lag: int) -> None:
+        self._stream_lag.labels(stream=stream).set(lag)
+
+    def set_stream_pending(self, stream: str, pending: int) -> None:
+        self._stream_pending.labels(stream=stream).set(pending)
+
+    def set_in_flight(self, stream: str, in_flight: int) -> None:
+        self._in_flight.labels(stream=stream).set(in_flight)
+
+    def set_prefetch(self, stream: str, prefetch: int) -> None:
+        self._prefetch.labels(stream=stream).set(prefetch)
+
+    def observe_processed(self, stream: str, duration: float, failed: bool = False) -> None:
+        """Record processing duration and success/failure counter."""
+        self._processing_duration.labels(stream=stream).observe(duration)
+        self._processed.labels(stream=stream, status="failed" if failed else "ok").inc()
+
+
+worker_metrics = WorkerMetrics()
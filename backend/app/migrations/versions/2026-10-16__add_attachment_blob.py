@@ -0,0 +1,43 @@
+"""add attachment_blob for content-addressed attachments
+
+Revision ID: add_attachment_blob
+Revises: add_request_cache
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_attachment_blob'
+down_revision = 'add_request_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Индекс SHA-256 содержимого → ключ объекта S3 со счётчиком ссылок
+    op.create_table(
+        'attachment_blob',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('sha256', name=op.f('pk_attachment_blob')),
+        sa.UniqueConstraint('key', name=op.f('uq_attachment_blob_key')),
+    )
+    op.add_column('attachment', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_attachment_content_hash'), 'attachment', ['content_hash'], unique=False)
+    op.create_foreign_key(op.f('fk_attachment_content_hash_attachment_blob'), 'attachment', 'attachment_blob',
+                          ['content_hash'], ['sha256'])
+
+
+def downgrade():
+    op.drop_constraint(op.f('fk_attachment_content_hash_attachment_blob'), 'attachment', type_='foreignkey')
+    op.drop_index(op.f('ix_attachment_content_hash'), table_name='attachment')
+    op.drop_column('attachment', 'content_hash')
+    op.drop_table('attachment_blob')
@@ -0,0 +1,28 @@
+"""add indexed object_name to attachment
+
+Revision ID: add_attachment_object_name
+Revises: add_attachment_blob
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_attachment_object_name'
+down_revision = 'add_attachment_blob'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Имя файла (последний сегмент ключа S3) для поиска /media/attachment/<name> без перебора S3
+    op.add_column('attachment', sa.Column('object_name', sa.String(), nullable=True))
+    op.execute("UPDATE attachment SET object_name = regexp_replace(file, '^.*/', '') WHERE file IS NOT NULL")
+    op.create_index(op.f('ix_attachment_object_name'), 'attachment', ['object_name'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_attachment_object_name'), table_name='attachment')
+    op.drop_column('attachment', 'object_name')
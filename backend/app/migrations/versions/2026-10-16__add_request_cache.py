@@ -0,0 +1,27 @@
+"""add response cache settings to request
+
+Revision ID: add_request_cache
+Revises: add_request_timeout
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_request_cache'
+down_revision = 'add_request_timeout'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Время жизни кеша ответа в секундах (NULL — не кешировать) и шаблон ключа кеша
+    op.add_column('request', sa.Column('cache_ttl', sa.Integer(), nullable=True))
+    op.add_column('request', sa.Column('cache_key', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('request', 'cache_key')
+    op.drop_column('request', 'cache_ttl')
@@ -0,0 +1,25 @@
+"""add timeout to request
+
+Revision ID: add_request_timeout
+Revises: add_integration_fields
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_request_timeout'
+down_revision = 'add_integration_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таймаут запроса в секундах; NULL — значение HTTP_TIMEOUT
+    op.add_column('request', sa.Column('timeout', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('request', 'timeout')
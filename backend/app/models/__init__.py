@@ -10,7 +10,7 @@ from .step import StepModel
 from .bot import BotModel, BotVariables
 from .widget import WidgetModel
 from .session import SessionModel, SessionVariables
-from .attachment import AttachmentModel
+from .attachment import AttachmentModel, AttachmentBlobModel
 from .request import RequestModel
 from .cron import CronModel
 from .emitter import EmitterModel
@@ -6,7 +6,7 @@ from sqlalchemy import ForeignKey, Column, Dialect
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .base import BaseModel, UUID
 from app.config import settings
-from sqlalchemy import String
+from sqlalchemy import BigInteger, Integer, String
 import random, string
 
 
@@ -18,6 +18,24 @@ class FileType(String):
     pass
 
 
+def key_basename(key: str | None) -> str | None:
+    """Имя файла — последний сегмент ключа S3, по нему /media/attachment/<name> находит объект."""
+    if not key:
+        return None
+    return str(key).rsplit("/", 1)[-1]
+
+
+class AttachmentBlobModel(BaseModel):
+    """Объект S3 с уникальным содержимым; ref_count — сколько вложений на него ссылается."""
+    __tablename__ = "attachment_blob"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    key: Mapped[str] = mapped_column(String, unique=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    content_type: Mapped[str | None]
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+
 class AttachmentModel(BaseModel):
     __tablename__ = "attachment"
 
@@ -25,6 +43,11 @@ class AttachmentModel(BaseModel):
     content_type: Mapped[str | None]
     # Stores S3 object key, e.g., "attachment/<random>.<ext>"
     file = Column(FileType)
+    # Последний сегмент ключа S3 для поиска по имени файла
+    object_name: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
+    # SHA-256 содержимого, если объект общий (режим ATTACHMENT_DEDUP)
+    content_hash: Mapped[str | None] = mapped_column(String(64), ForeignKey("attachment_blob.sha256"),
+                                                     nullable=True, index=True)
 
     message_id: Mapped[UUID] = mapped_column(ForeignKey("message.id"), nullable=True)
     message: Mapped["MessageModel"] = relationship("MessageModel", back_populates="attachments", foreign_keys=message_id, lazy="select", )
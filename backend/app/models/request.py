@@ -35,6 +35,11 @@ class RequestModel(BaseModel):
     attachments: Mapped[Optional[str]]
     headers: Mapped[Optional[str]]
     proxies: Mapped[Optional[str]]
+    # Таймаут запроса в секундах; NULL — HTTP_TIMEOUT
+    timeout: Mapped[Optional[float]]
+    # Кеш ответов GET-запроса: время жизни в секундах (NULL — не кешировать) и шаблон ключа ({$...$})
+    cache_ttl: Mapped[Optional[int]]
+    cache_key: Mapped[Optional[str]]
 
     url_params: Mapped[Optional[JSON]] = mapped_column(type_=JSON)
 
@@ -1,6 +1,7 @@
 ﻿import asyncio
 import logging
 import logging.config
+from datetime import timedelta
 from uuid import UUID, uuid4
 from typing import Union
 
@@ -16,6 +17,9 @@ from app.broker import broker
 from app.schemas import rebuild_models
 from app.database import sessionmanager
 from app.models.emitter import EmitterModel
+from app.services.attachment_repository_sql import SqlAttachmentRepository
+from app.services.attachment_service import AttachmentService
+from app.services.s3_storage_service import S3StorageService
 from app.utils.message import bot_send_message_by_id
 import app.crud.emitter as crud_emitter
 
@@ -79,10 +83,13 @@ async def process_emitter_batch(messages):
 
 
 class EmitterScheduler(AsyncIOScheduler):
+    service_job_ids = {"sync_emitters", "attachment_gc"}
+
     async def start_scheduler(self):
         logger.info("[SCHEDULER] Starting scheduler and loading emitters")
         super().start()
         self.schedule_sync_emitters()
+        self.schedule_attachment_gc()
 
         async with sessionmanager.session() as session:
             emitters = await crud_emitter.read_emitters(session)
@@ -90,7 +97,7 @@ class EmitterScheduler(AsyncIOScheduler):
 
             all_scheduler_jobs = self.get_jobs()
             for job in all_scheduler_jobs:
-                if job.id != "sync_emitters" and job.id not in emitter_job_ids:
+                if job.id not in self.service_job_ids and job.id not in emitter_job_ids:
                     logger.info(f"[SCHEDULER] Removing stale job: {job.id}")
                     self.remove_job(job.id)
 
@@ -199,7 +206,7 @@ class EmitterScheduler(AsyncIOScheduler):
                             )
 
                 for job in self.get_jobs():
-                    if job.id != "sync_emitters" and job.id not in valid_job_ids:
+                    if job.id not in self.service_job_ids and job.id not in valid_job_ids:
                         logger.info(f"[SYNC] Removing stale job: {job.id}")
                         self.remove_job(job.id)
 
@@ -210,6 +217,22 @@ class EmitterScheduler(AsyncIOScheduler):
         self.add_job(self._run_sync_emitters, trigger="interval", seconds=180, id="sync_emitters", name="Sync Emitters")
         logger.info("[SCHEDULER] Scheduled emitter sync job every 180 seconds")
 
+    async def _run_attachment_gc(self):
+        try:
+            service = AttachmentService(S3StorageService(), SqlAttachmentRepository(sessionmanager.engine))
+            removed = await service.collect_garbage(timedelta(seconds=settings.ATTACHMENT_GC_GRACE))
+            if removed:
+                logger.info(f"[GC] Removed {removed} unreferenced attachment objects")
+        except Exception as e:
+            logger.exception(f"[GC] Error during attachment garbage collection: {repr(e)}")
+
+    def schedule_attachment_gc(self):
+        if not settings.ATTACHMENT_DEDUP:
+            return
+        self.add_job(self._run_attachment_gc, trigger="interval", seconds=settings.ATTACHMENT_GC_INTERVAL,
+                     id="attachment_gc", name="Attachment GC")
+        logger.info(f"[SCHEDULER] Scheduled attachment GC every {settings.ATTACHMENT_GC_INTERVAL} seconds")
+
 
 scheduler = EmitterScheduler(timezone=settings.TIME_ZONE)
 
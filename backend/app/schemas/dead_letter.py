@@ -0,0 +1,25 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class DeadLetterPublic(BaseModel):
+    id: str
+    original_id: Optional[str] = None
+    group: Optional[str] = None
+    deliveries: Optional[int] = None
+    dead_at: Optional[int] = None
+    fields: dict[str, Any] = {}
+    message: Any = None
+
+
+class DeadLetterIds(BaseModel):
+    ids: Optional[list[str]] = None
+
+
+class DeadLetterReplayOut(BaseModel):
+    replayed: list[str]
+
+
+class DeadLetterPurgeOut(BaseModel):
+    purged: int
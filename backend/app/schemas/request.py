@@ -27,6 +27,9 @@ class RequestBase(BaseModel):
     url_params: Optional[Union[JsonSchemaValue, str]] = None
     attachments: Optional[str] = None
     proxies: Optional[str] = None
+    timeout: Optional[float] = Field(default=None, gt=0)
+    cache_ttl: Optional[int] = Field(default=None, ge=0)
+    cache_key: Optional[str] = None
 
 
 class RequestSimple(RequestBase, Timestamp):
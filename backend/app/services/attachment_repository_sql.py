@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import Optional
+from datetime import datetime
+from typing import Any, Optional
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
 
+from app.models.attachment import key_basename
 from app.services.attachment_service import AttachmentRepository, AttachmentMeta
 
 
@@ -11,46 +13,94 @@ class SqlAttachmentRepository(AttachmentRepository):
     def __init__(self, engine: AsyncEngine | AsyncConnection) -> None:
         self.engine = engine
 
-    async def create(self, content_type: Optional[str], key: str, message_id: Optional[str] = None) -> AttachmentMeta:
-        from uuid import uuid4
-        attachment_id = str(uuid4())
+    async def _execute(self, statement: str, params: dict[str, Any], commit: bool = False) -> list[dict]:
         if hasattr(self.engine, "connect"):
             async with self.engine.connect() as conn:  # type: ignore[attr-defined]
-                row = (await conn.execute(text(
-                    """
-                    INSERT INTO attachment (id, content_type, file, message_id, created_at, updated_at)
-                    VALUES (:id, :content_type, :file, :message_id, NOW(), NOW())
-                    RETURNING id, content_type, file
-                    """
-                ), {"id": attachment_id, "content_type": content_type, "file": key, "message_id": message_id})).mappings().first()
-                await conn.commit()
+                result = await conn.execute(text(statement), params)
+                rows = result.mappings().all() if result.returns_rows else []
+                if commit:
+                    await conn.commit()
         else:
             conn = self.engine  # type: ignore[assignment]
-            row = (await conn.execute(text(
-                """
-                INSERT INTO attachment (id, content_type, file, message_id, created_at, updated_at)
-                VALUES (:id, :content_type, :file, :message_id, NOW(), NOW())
-                RETURNING id, content_type, file
-                """
-            ), {"id": attachment_id, "content_type": content_type, "file": key, "message_id": message_id})).mappings().first()
-            await conn.commit()
-        data = dict(row)
+            result = await conn.execute(text(statement), params)
+            rows = result.mappings().all() if result.returns_rows else []
+            if commit:
+                await conn.commit()
+        return [dict(row) for row in rows]
+
+    async def create(self, content_type: Optional[str], key: str, message_id: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> AttachmentMeta:
+        from uuid import uuid4
+        attachment_id = str(uuid4())
+        now = datetime.now()
+        rows = await self._execute(
+            """
+            INSERT INTO attachment (id, content_type, file, object_name, message_id, content_hash,
+                                    created_at, updated_at)
+            VALUES (:id, :content_type, :file, :object_name, :message_id, :content_hash, :now, :now)
+            RETURNING id, content_type, file
+            """,
+            {"id": attachment_id, "content_type": content_type, "file": key, "object_name": key_basename(key),
+             "message_id": message_id, "content_hash": content_hash, "now": now},
+            commit=True,
+        )
+        data = rows[0]
         return AttachmentMeta(id=data["id"], content_type=data.get("content_type"), key=data.get("file"))
 
     async def get_by_id(self, attachment_id: str) -> Optional[AttachmentMeta]:
-        if hasattr(self.engine, "connect"):
-            async with self.engine.connect() as conn:  # type: ignore[attr-defined]
-                row = (await conn.execute(text(
-                    "SELECT id, content_type, file FROM attachment WHERE id = :id"
-                ), {"id": attachment_id})).mappings().first()
-        else:
-            conn = self.engine  # type: ignore[assignment]
-            row = (await conn.execute(text(
-                "SELECT id, content_type, file FROM attachment WHERE id = :id"
-            ), {"id": attachment_id})).mappings().first()
-        if not row:
+        rows = await self._execute("SELECT id, content_type, file FROM attachment WHERE id = :id",
+                                   {"id": attachment_id})
+        if not rows:
             return None
-        data = dict(row)
+        data = rows[0]
         return AttachmentMeta(id=data["id"], content_type=data.get("content_type"), key=data.get("file"))
 
+    async def acquire_blob(self, content_hash: str) -> Optional[str]:
+        rows = await self._execute(
+            """
+            UPDATE attachment_blob SET ref_count = ref_count + 1, updated_at = :now
+            WHERE sha256 = :sha256
+            RETURNING key
+            """,
+            {"sha256": content_hash, "now": datetime.now()},
+            commit=True,
+        )
+        return rows[0]["key"] if rows else None
+
+    async def register_blob(self, content_hash: str, key: str, size: int, content_type: Optional[str]) -> str:
+        now = datetime.now()
+        rows = await self._execute(
+            """
+            INSERT INTO attachment_blob (sha256, key, size, content_type, ref_count, created_at, updated_at)
+            VALUES (:sha256, :key, :size, :content_type, 1, :now, :now)
+            ON CONFLICT (sha256) DO UPDATE
+            SET ref_count = attachment_blob.ref_count + 1, updated_at = excluded.updated_at
+            RETURNING key
+            """,
+            {"sha256": content_hash, "key": key, "size": size, "content_type": content_type, "now": now},
+            commit=True,
+        )
+        return rows[0]["key"]
+
+    async def release_blob(self, content_hash: str) -> None:
+        await self._execute(
+            "UPDATE attachment_blob SET ref_count = ref_count - 1, updated_at = :now WHERE sha256 = :sha256",
+            {"sha256": content_hash, "now": datetime.now()},
+            commit=True,
+        )
 
+    async def pop_unreferenced_blobs(self, older_than: datetime, limit: int = 100) -> list[str]:
+        rows = await self._execute(
+            """
+            DELETE FROM attachment_blob
+            WHERE ref_count <= 0 AND sha256 IN (
+                SELECT sha256 FROM attachment_blob
+                WHERE ref_count <= 0 AND updated_at < :older_than
+                LIMIT :limit
+            )
+            RETURNING key
+            """,
+            {"older_than": older_than, "limit": limit},
+            commit=True,
+        )
+        return [row["key"] for row in rows]
@@ -2,11 +2,17 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from typing import Protocol, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import logging
 import re
 import os
 from uuid import uuid4
 
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class AttachmentMeta:
@@ -20,17 +26,26 @@ class AttachmentMeta:
 class AttachmentStoragePort(Protocol):
     async def upload(self, key: str, data: bytes, content_type: Optional[str] = None) -> None: ...
     async def get_bytes(self, key: str) -> bytes: ...
+    async def delete(self, key: str) -> None: ...
 
 
 class AttachmentRepository(Protocol):
-    async def create(self, content_type: Optional[str], key: str, message_id: Optional[str] = None) -> AttachmentMeta: ...
+    async def create(self, content_type: Optional[str], key: str, message_id: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> AttachmentMeta: ...
     async def get_by_id(self, attachment_id: str) -> Optional[AttachmentMeta]: ...
+    # Индекс содержимого (режим дедупликации): acquire/register увеличивают ref_count и возвращают ключ объекта
+    async def acquire_blob(self, content_hash: str) -> Optional[str]: ...
+    async def register_blob(self, content_hash: str, key: str, size: int, content_type: Optional[str]) -> str: ...
+    async def release_blob(self, content_hash: str) -> None: ...
+    async def pop_unreferenced_blobs(self, older_than: datetime, limit: int = 100) -> list[str]: ...
 
 
 class AttachmentService:
-    def __init__(self, storage: AttachmentStoragePort, repo: AttachmentRepository) -> None:
+    def __init__(self, storage: AttachmentStoragePort, repo: AttachmentRepository,
+                 dedup: bool | None = None) -> None:
         self.storage = storage
         self.repo = repo
+        self.dedup = settings.ATTACHMENT_DEDUP if dedup is None else dedup
 
     @staticmethod
     def _sanitize_filename(name: str) -> str:
@@ -77,6 +92,8 @@ class AttachmentService:
         return cls._build_random_name(ext)
 
     async def create_from_bytes(self, data: bytes, filename: str, content_type: Optional[str]) -> AttachmentMeta:
+        if self.dedup:
+            return await self._create_deduplicated(data, filename, content_type)
         key, unique_filename = self.build_storage_key(filename, content_type)
         await self.storage.upload(key, data, content_type=content_type)
         meta = await self.repo.create(content_type=content_type, key=key)
@@ -84,3 +101,39 @@ class AttachmentService:
         meta.size = len(data)
         return meta
 
+    async def _create_deduplicated(self, data: bytes, filename: str, content_type: Optional[str]) -> AttachmentMeta:
+        """
+        Вложение с уже известным SHA-256 ссылается на существующий объект без загрузки.
+        Новое содержимое загружается под случайным ключом; если параллельно такое же содержимое
+        успели зарегистрировать, лишняя копия удаляется.
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        key = await self.repo.acquire_blob(content_hash)
+        if key is None:
+            new_key, _ = self.build_storage_key(filename, content_type)
+            await self.storage.upload(new_key, data, content_type=content_type)
+            key = await self.repo.register_blob(content_hash, new_key, len(data), content_type)
+            if key != new_key:
+                await self.storage.delete(new_key)
+        try:
+            meta = await self.repo.create(content_type=content_type, key=key, content_hash=content_hash)
+        except BaseException:
+            await self.repo.release_blob(content_hash)
+            raise
+        meta.file_name = key.split("/")[-1]
+        meta.size = len(data)
+        return meta
+
+    async def collect_garbage(self, grace: timedelta, limit: int = 100) -> int:
+        """
+        Удаляет объекты, на которые больше нет ссылок дольше grace.
+        Строка индекса удаляется до объекта, поэтому новое вложение не может сослаться на удаляемый объект.
+        """
+        keys = await self.repo.pop_unreferenced_blobs(datetime.now() - grace, limit)
+        for key in keys:
+            try:
+                await self.storage.delete(key)
+            except Exception as e:
+                logger.warning(f"Failed to delete unreferenced attachment object {key}: {e}")
+        return len(keys)
+
@@ -0,0 +1,65 @@
+"""Поиск ключа S3 по имени файла вложения: Redis-кеш поверх индекса attachment.object_name."""
+import logging
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.attachment import AttachmentModel
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "media:key:"
+# Отрицательный результат кешируется строкой-маркером, чтобы повторные 404 не ходили в БД
+MISSING = b""
+
+
+class MediaKeyIndex:
+    def __init__(self, redis: Redis | None = None, ttl: int = 3600, missing_ttl: int = 60):
+        self._redis = redis
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(settings.CACHE_REDIS_URL)
+        return self._redis
+
+    async def _cached(self, name: str) -> bytes | None:
+        try:
+            return await self.redis.get(KEY_PREFIX + name)
+        except Exception as e:
+            logger.warning(f"Media index cache read failed for {name}: {e}")
+            return None
+
+    async def remember(self, name: str, key: str | None) -> None:
+        try:
+            if key is None:
+                await self.redis.set(KEY_PREFIX + name, MISSING, ex=self.missing_ttl)
+            else:
+                await self.redis.set(KEY_PREFIX + name, key, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Media index cache write failed for {name}: {e}")
+
+    async def resolve(self, session: AsyncSession, name: str) -> str | None:
+        """Ключ объекта по имени файла или None; один запрос к Redis, при промахе — один к БД по индексу."""
+        cached = await self._cached(name)
+        if cached is not None:
+            return cached.decode() if cached != MISSING else None
+        key = (await session.execute(
+            select(AttachmentModel.file).where(AttachmentModel.object_name == name).limit(1)
+        )).scalar_one_or_none()
+        key = str(key) if key else None
+        await self.remember(name, key)
+        return key
+
+    async def forget(self, name: str) -> None:
+        try:
+            await self.redis.delete(KEY_PREFIX + name)
+        except Exception as e:
+            logger.warning(f"Media index cache delete failed for {name}: {e}")
+
+
+media_index = MediaKeyIndex(ttl=settings.MEDIA_INDEX_TTL, missing_ttl=settings.MEDIA_INDEX_MISSING_TTL)
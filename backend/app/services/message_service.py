@@ -1,5 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncEngine  
-from app.engine.variables import variable_substitution_pydantic
+from app.engine.templates import render_model
 from app.managers.message_manager import MessageManager
 from app.managers.widget_manager import WidgetManager
 from app.schemas.message import MessagePublic, MessageCreate
@@ -14,13 +14,17 @@ class MessageService:
         self.message_manager = MessageManager(engine)
         self.widget_manager = WidgetManager(engine)
 
-    async def send_message(self, session: SessionSimple, message_schema: MessagePublic, context: dict) -> dict:
+    async def send_message(self, session: SessionSimple, message_schema: MessagePublic, context: dict,
+                           substitute: bool = True) -> dict:
 
         # TODO: Реализовать проверку доступа
         # recipient_id = message_schema.recipient_id or session.user_id
         # await check_channel_access(...)
 
-        message_copy_in: MessagePublic = await variable_substitution_pydantic(message_schema, context)
+        if substitute:
+            message_copy_in: MessagePublic = render_model(message_schema, context)
+        else:
+            message_copy_in = message_schema.model_copy(deep=True)
 
         if message_copy_in.widget:
             widget_data = message_copy_in.widget.model_dump()
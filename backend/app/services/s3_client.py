@@ -0,0 +1,80 @@
+"""Долгоживущие клиенты S3 процесса (один на endpoint) с общим пулом соединений."""
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Any
+
+import aiobotocore.session
+from aiobotocore.config import AioConfig
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class S3ClientPool:
+    """
+    Клиент создаётся при первом обращении (или в start) и живёт до close.
+    Отдельный клиент для публичного endpoint нужен только для presigned-ссылок,
+    сетевых запросов он не делает.
+    """
+
+    def __init__(self, endpoint_url: str | None = None, public_endpoint_url: str | None = None,
+                 max_connections: int = 50, session: Any = None):
+        self.endpoint_url = endpoint_url
+        self.public_endpoint_url = public_endpoint_url or endpoint_url
+        self.max_connections = max_connections
+        self._session = session or aiobotocore.session.AioSession()
+        self._stack: AsyncExitStack | None = None
+        self._clients: dict[str | None, Any] = {}
+        self._lock = asyncio.Lock()
+
+    def _create_client(self, endpoint_url: str | None):
+        return self._session.create_client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=settings.S3_REGION,
+            config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"},
+                             max_pool_connections=self.max_connections),
+            aws_secret_access_key=settings.S3_SECRET_KEY,
+            aws_access_key_id=settings.S3_ACCESS_KEY,
+        )
+
+    async def _get(self, endpoint_url: str | None):
+        client = self._clients.get(endpoint_url)
+        if client is not None:
+            return client
+        async with self._lock:
+            client = self._clients.get(endpoint_url)
+            if client is None:
+                if self._stack is None:
+                    self._stack = AsyncExitStack()
+                client = await self._stack.enter_async_context(self._create_client(endpoint_url))
+                self._clients[endpoint_url] = client
+        return client
+
+    async def client(self):
+        return await self._get(self.endpoint_url)
+
+    async def presign_client(self):
+        return await self._get(self.public_endpoint_url)
+
+    async def start(self) -> None:
+        await self.client()
+
+    async def close(self) -> None:
+        async with self._lock:
+            stack, self._stack = self._stack, None
+            self._clients.clear()
+        if stack is not None:
+            try:
+                await stack.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close S3 clients: {e}")
+
+
+s3_pool = S3ClientPool(
+    endpoint_url=settings.S3_ENDPOINT,
+    public_endpoint_url=settings.S3_PUBLIC_ENDPOINT,
+    max_connections=settings.S3_MAX_POOL_CONNECTIONS,
+)
@@ -1,162 +1,239 @@
-from typing import Optional
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterable, AsyncIterator, Optional
 
-import aiobotocore.session
-from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
 
 from app.config import settings
+from app.services.s3_client import s3_pool
 from datetime import datetime
 from email.utils import format_datetime
 
 
-aiobotocore_session = aiobotocore.session.AioSession()
+# S3 не принимает части multipart меньше 5 МиБ (кроме последней)
+MIN_PART_SIZE = 5 * 1024 * 1024
 
 
-async def upload_bytes(key: str, data: bytes, content_type: Optional[str] = None) -> None:
-    async with aiobotocore_session.create_client(
-        "s3",
-        endpoint_url=settings.S3_ENDPOINT,
-        region_name=settings.S3_REGION,
-        config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
-        aws_secret_access_key=settings.S3_SECRET_KEY,
-        aws_access_key_id=settings.S3_ACCESS_KEY,
-    ) as s3_client:
-        params = {"Bucket": settings.S3_BUCKET, "Key": key, "Body": data}
-        if content_type:
-            params["ContentType"] = content_type
-        await s3_client.put_object(**params)
-
-
-async def generate_presigned_get_url(key: str, expires_in: int = 3600) -> str:
-    presign_endpoint = settings.S3_PUBLIC_ENDPOINT or settings.S3_ENDPOINT
-    async with aiobotocore_session.create_client(
-        "s3",
-        endpoint_url=presign_endpoint,
-        region_name=settings.S3_REGION,
-        config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
-        aws_secret_access_key=settings.S3_SECRET_KEY,
-        aws_access_key_id=settings.S3_ACCESS_KEY,
-    ) as s3_client:
-        return await s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": settings.S3_BUCKET, "Key": key},
-            ExpiresIn=expires_in,
-        )
-
-
-async def object_exists(key: str) -> bool:
-    async with aiobotocore_session.create_client(
-        "s3",
-        endpoint_url=settings.S3_ENDPOINT,
-        region_name=settings.S3_REGION,
-        config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
-        aws_secret_access_key=settings.S3_SECRET_KEY,
-        aws_access_key_id=settings.S3_ACCESS_KEY,
-    ) as s3_client:
-        try:
-            await s3_client.head_object(Bucket=settings.S3_BUCKET, Key=key)
-            return True
-        except Exception:
-            return False
-
-
-async def stream_object(key: str, chunk_size: int = 1024 * 1024):
-    """Return async iterator over object bytes and response metadata headers.
-
-    Uses HEAD to fetch headers first, then streams via GET in a safe async context.
-    """
-    # Fetch headers via HEAD
-    async with aiobotocore_session.create_client(
-        "s3",
-        endpoint_url=settings.S3_ENDPOINT,
-        region_name=settings.S3_REGION,
-        config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
-        aws_secret_access_key=settings.S3_SECRET_KEY,
-        aws_access_key_id=settings.S3_ACCESS_KEY,
-    ) as head_client:
-        head = await head_client.head_object(Bucket=settings.S3_BUCKET, Key=key)
-
+def _object_headers(resp: dict) -> dict:
     headers = {
-        "Content-Length": str(head.get("ContentLength", "")),
-        "Content-Type": head.get("ContentType", "application/octet-stream"),
+        "Content-Length": str(resp.get("ContentLength", "")),
+        "Content-Type": resp.get("ContentType", "application/octet-stream"),
     }
-    etag = head.get("ETag")
+    etag = resp.get("ETag")
     if etag:
         headers["ETag"] = etag
-    last_modified = head.get("LastModified")
+    last_modified = resp.get("LastModified")
     if isinstance(last_modified, datetime):
         try:
             headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
         except Exception:
             pass
+    return headers
+
 
-    async def iterator():
-        async with aiobotocore_session.create_client(
-            "s3",
-            endpoint_url=settings.S3_ENDPOINT,
-            region_name=settings.S3_REGION,
-            config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
-            aws_secret_access_key=settings.S3_SECRET_KEY,
-            aws_access_key_id=settings.S3_ACCESS_KEY,
-        ) as s3_client:
-            resp = await s3_client.get_object(Bucket=settings.S3_BUCKET, Key=key)
-            body = resp["Body"]
+async def _close_body(body) -> None:
+    # body.close may be sync in some transports
+    try:
+        close_result = body.close()
+        if close_result is not None:
+            # Some implementations return awaitable
             try:
-                while True:
-                    chunk = await body.read(chunk_size)
-                    if not chunk:
-                        break
-                    yield chunk
-            finally:
-                # body.close may be sync in some transports
-                try:
-                    close_result = body.close()
-                    if close_result is not None:
-                        # Some implementations return awaitable
-                        try:
-                            await close_result  # type: ignore
-                        except TypeError:
-                            pass
-                except Exception:
-                    pass
-
-    return iterator(), headers
+                await close_result  # type: ignore
+            except TypeError:
+                pass
+    except Exception:
+        pass
 
 
-async def get_object_bytes(key: str) -> tuple[bytes, dict]:
-    """Download full object into memory and return (bytes, headers). Suitable for small-to-medium files."""
-    async with aiobotocore_session.create_client(
-        "s3",
-        endpoint_url=settings.S3_ENDPOINT,
-        region_name=settings.S3_REGION,
-        config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
-        aws_secret_access_key=settings.S3_SECRET_KEY,
-        aws_access_key_id=settings.S3_ACCESS_KEY,
-    ) as s3_client:
-        resp = await s3_client.get_object(Bucket=settings.S3_BUCKET, Key=key)
-        body = resp["Body"]
-        data = await body.read()
-        try:
-            close_result = body.close()
-            if close_result is not None:
-                try:
-                    await close_result  # type: ignore
-                except TypeError:
-                    pass
-        except Exception:
-            pass
-        headers = {
-            "Content-Length": str(resp.get("ContentLength", "")),
-            "Content-Type": resp.get("ContentType", "application/octet-stream"),
-        }
-        etag = resp.get("ETag")
-        if etag:
-            headers["ETag"] = etag
-        last_modified = resp.get("LastModified")
-        if isinstance(last_modified, datetime):
+async def _iter_body(body, chunk_size: int) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await body.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await _close_body(body)
+
+
+async def _iter_bytes(data: bytes, chunk_size: int) -> AsyncIterator[bytes]:
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+async def upload_bytes(key: str, data: bytes, content_type: Optional[str] = None) -> None:
+    if len(data) > settings.S3_MULTIPART_THRESHOLD:
+        await upload_stream(key, _iter_bytes(data, settings.S3_MULTIPART_CHUNK_SIZE), content_type)
+        return
+    s3_client = await s3_pool.client()
+    params = {"Bucket": settings.S3_BUCKET, "Key": key, "Body": data}
+    if content_type:
+        params["ContentType"] = content_type
+    await s3_client.put_object(**params)
+
+
+async def upload_stream(key: str, chunks: AsyncIterable[bytes], content_type: Optional[str] = None) -> int:
+    """
+    Загружает объект из потока частей и возвращает его размер.
+    Пока данных не больше S3_MULTIPART_THRESHOLD, они уходят одним put_object;
+    дальше — multipart-загрузка частями по S3_MULTIPART_CHUNK_SIZE, при ошибке она отменяется.
+    """
+    s3_client = await s3_pool.client()
+    params = {"Bucket": settings.S3_BUCKET, "Key": key}
+    if content_type:
+        params["ContentType"] = content_type
+    part_size = max(settings.S3_MULTIPART_CHUNK_SIZE, MIN_PART_SIZE)
+    buffer = bytearray()
+    size = 0
+    upload_id = None
+    parts = []
+
+    async def upload_part(data: bytes) -> None:
+        part_number = len(parts) + 1
+        resp = await s3_client.upload_part(Bucket=settings.S3_BUCKET, Key=key, UploadId=upload_id,
+                                           PartNumber=part_number, Body=data)
+        parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
+
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            size += len(chunk)
+            if upload_id is None:
+                if len(buffer) <= settings.S3_MULTIPART_THRESHOLD:
+                    continue
+                upload_id = (await s3_client.create_multipart_upload(**params))["UploadId"]
+            while len(buffer) >= part_size:
+                await upload_part(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+
+        if upload_id is None:
+            await s3_client.put_object(Body=bytes(buffer), **params)
+            return size
+        if buffer or not parts:
+            await upload_part(bytes(buffer))
+        await s3_client.complete_multipart_upload(Bucket=settings.S3_BUCKET, Key=key, UploadId=upload_id,
+                                                  MultipartUpload={"Parts": parts})
+        return size
+    except BaseException:
+        if upload_id is not None:
             try:
-                headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+                await s3_client.abort_multipart_upload(Bucket=settings.S3_BUCKET, Key=key, UploadId=upload_id)
             except Exception:
                 pass
-        return data, headers
+        raise
+
+
+async def delete_object(key: str) -> None:
+    s3_client = await s3_pool.client()
+    await s3_client.delete_object(Bucket=settings.S3_BUCKET, Key=key)
+
+
+async def generate_presigned_get_url(key: str, expires_in: int = 3600, content_disposition: str | None = None) -> str:
+    s3_client = await s3_pool.presign_client()
+    params = {"Bucket": settings.S3_BUCKET, "Key": key}
+    if content_disposition:
+        params["ResponseContentDisposition"] = content_disposition
+    return await s3_client.generate_presigned_url(
+        "get_object",
+        Params=params,
+        ExpiresIn=expires_in,
+    )
+
+
+async def object_exists(key: str) -> bool:
+    s3_client = await s3_pool.client()
+    try:
+        await s3_client.head_object(Bucket=settings.S3_BUCKET, Key=key)
+        return True
+    except Exception:
+        return False
+
+
+async def iter_object(key: str, chunk_size: int | None = None) -> AsyncIterator[bytes]:
+    """Читает объект частями по chunk_size байт, не загружая его целиком в память."""
+    s3_client = await s3_pool.client()
+    resp = await s3_client.get_object(Bucket=settings.S3_BUCKET, Key=key)
+    async for chunk in _iter_body(resp["Body"], chunk_size or settings.S3_STREAM_CHUNK_SIZE):
+        yield chunk
 
 
+async def stream_object(key: str, chunk_size: int | None = None):
+    """Return async iterator over object bytes and response metadata headers.
+
+    Headers come from the same GET, the body is read lazily by the iterator.
+    """
+    s3_client = await s3_pool.client()
+    resp = await s3_client.get_object(Bucket=settings.S3_BUCKET, Key=key)
+    return _iter_body(resp["Body"], chunk_size or settings.S3_STREAM_CHUNK_SIZE), _object_headers(resp)
+
+
+@dataclass
+class ObjectResponse:
+    """Результат условного GET: status 200/206 с телом, 304/412/416 без тела, 404 если объекта нет."""
+    status: int
+    headers: dict = field(default_factory=dict)
+    body: AsyncIterator[bytes] | None = None
+
+
+async def open_object(key: str, range_header: str | None = None, if_none_match: str | None = None,
+                      if_modified_since: str | None = None, chunk_size: int | None = None) -> ObjectResponse:
+    """
+    Один GET с передачей Range/If-None-Match/If-Modified-Since в S3,
+    поэтому отдельный HEAD не нужен и частичные/неизменённые ответы не читают объект целиком.
+    """
+    params = {"Bucket": settings.S3_BUCKET, "Key": key}
+    if range_header:
+        params["Range"] = range_header
+    if if_none_match:
+        params["IfNoneMatch"] = if_none_match
+    if if_modified_since:
+        params["IfModifiedSince"] = if_modified_since
+    s3_client = await s3_pool.client()
+    try:
+        resp = await s3_client.get_object(**params)
+    except ClientError as e:
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        code = e.response.get("Error", {}).get("Code")
+        if status == 304 or code in ("304", "NotModified"):
+            return ObjectResponse(304, {"ETag": if_none_match} if if_none_match else {})
+        if code in ("NoSuchKey", "404") or status == 404:
+            return ObjectResponse(404)
+        if status in (412, 416):
+            return ObjectResponse(status)
+        raise
+    headers = _object_headers(resp)
+    headers["Accept-Ranges"] = "bytes"
+    status = 200
+    if resp.get("ContentRange"):
+        headers["Content-Range"] = resp["ContentRange"]
+        status = 206
+    return ObjectResponse(status, headers, _iter_body(resp["Body"], chunk_size or settings.S3_STREAM_CHUNK_SIZE))
+
+
+async def spool_object(key: str) -> SpooledTemporaryFile:
+    """
+    Копирует объект в SpooledTemporaryFile: до S3_SPOOL_MAX_MEMORY байт в памяти, больше — во временном файле.
+    Файл открыт и стоит на начале; закрывает его вызывающий.
+    """
+    spooled = SpooledTemporaryFile(max_size=settings.S3_SPOOL_MAX_MEMORY)
+    try:
+        async for chunk in iter_object(key):
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+
+async def get_object_bytes(key: str) -> tuple[bytes, dict]:
+    """Download full object into memory and return (bytes, headers). Suitable for small-to-medium files."""
+    s3_client = await s3_pool.client()
+    resp = await s3_client.get_object(Bucket=settings.S3_BUCKET, Key=key)
+    body = resp["Body"]
+    try:
+        data = await body.read()
+    finally:
+        await _close_body(body)
+    return data, _object_headers(resp)
@@ -0,0 +1,460 @@
+"""
+Синтетическая нагрузка на MessageProcessor.
+
+Генерирует параметризованные графы ботов и поток сообщений, прогоняет их через MessageProcessor
+с DataManager поверх in-memory заменителей Redis и Postgres и заглушкой исходящего HTTP.
+Отчёт: сообщений/с, p50/p95/p99, пиковая память на сообщение, SQL-запросы и обращения к Redis на сообщение.
+
+Запуск вне pytest: python -m app.tests.benchmarks.harness [сценарий ...]
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Iterator
+
+import httpx
+
+from app.engine import request as request_module
+from app.engine.bot_processor import MessageProcessor
+from app.engine.compiled_bot import STRUCTURE_VERSION_KEY, compute_structure_version
+from app.engine.request import HttpClientRegistry
+from app.loggers.shipper import bot_log_shipper
+from app.managers.data_manager import DataManager, LocalCache
+from app.managers.websocket.presence import BotListenerPresence
+
+
+@dataclass(frozen=True)
+class BotGraphSpec:
+    """
+    Форма графа бота. На каждом шаге: группа поиска по сообщению с commands связями
+    (rules_per_connection правил в каждой), затем code_groups кодовых групп,
+    response_groups групп запросов (template_vars переменных в шаблоне запроса)
+    и группа без правил, переводящая на следующий шаг.
+    """
+    steps: int = 3
+    commands: int = 20
+    rules_per_connection: int = 2
+    code_groups: int = 0
+    response_groups: int = 0
+    template_vars: int = 2
+
+
+SCENARIOS: dict[str, BotGraphSpec] = {
+    "routing": BotGraphSpec(steps=5, commands=100, rules_per_connection=3),
+    "code": BotGraphSpec(steps=3, commands=20, code_groups=2),
+    "response": BotGraphSpec(steps=3, commands=20, response_groups=1, template_vars=6),
+    "mixed": BotGraphSpec(steps=10, commands=50, code_groups=1, response_groups=1, template_vars=4),
+}
+
+CODE_SNIPPET = """
+async def main(context, variables):
+    result = dict(context)
+    words = context["message"]["text"].split()
+    result["score"] = sum(len(word) for word in words) + len(variables.get("session", {}))
+    return result
+"""
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _rule(field: str, type_: str, operator: str, value: Any) -> dict:
+    return {"id": field, "field": field, "type": type_, "input": "text", "operator": operator, "value": value}
+
+
+def _command_rules(command: int, rules_per_connection: int) -> dict:
+    rules = [_rule("message.text", "string", "equal", f"/cmd{command}")]
+    extra = [
+        _rule("user.level", "integer", "greater_or_equal", "0"),
+        _rule("bot.mode", "string", "equal", "{$bot.mode$}"),
+        _rule("message.text", "string", "begins_with", "/"),
+    ]
+    for i in range(rules_per_connection - 1):
+        rules.append(extra[i % len(extra)])
+    return {"condition": "AND", "rules": rules}
+
+
+def _connection(rng: random.Random, group_id: str, next_step: dict, rules: dict | None) -> dict:
+    return {
+        "id": _uuid(rng),
+        "group_id": group_id,
+        "next_step_id": next_step["id"],
+        "next_step": {key: value for key, value in next_step.items() if key != "connection_groups"},
+        "rules": json.dumps(rules) if rules is not None else None,
+    }
+
+
+def _never_rules() -> dict:
+    return {"condition": "AND", "rules": [_rule("message.text", "string", "equal", "__never__")]}
+
+
+def build_bot(spec: BotGraphSpec, seed: int = 0) -> dict:
+    """Бот в формате, в котором DataManager отдаёт его из кеша (с cache_structure)."""
+    rng = random.Random(seed)
+    bot_id = _uuid(rng)
+    steps = [{"id": _uuid(rng), "name": f"step {i}", "is_proxy": False, "bot_id": bot_id}
+             for i in range(spec.steps)]
+    for i, step in enumerate(steps):
+        next_step = steps[(i + 1) % len(steps)]
+        groups = []
+
+        group_id = _uuid(rng)
+        groups.append({
+            "id": group_id,
+            "search_type": "message",
+            "variables": json.dumps({"message.text": "session.last_command"}),
+            "connections": [_connection(rng, group_id, steps[(i + 1 + k) % len(steps)],
+                                        _command_rules(k, spec.rules_per_connection))
+                            for k in range(spec.commands)],
+        })
+
+        for _ in range(spec.code_groups):
+            group_id = _uuid(rng)
+            groups.append({
+                "id": group_id,
+                "search_type": "code",
+                "code": CODE_SNIPPET,
+                "variables": json.dumps({"score": "session.score"}),
+                "connections": [_connection(rng, group_id, next_step, _never_rules())],
+            })
+
+        for _ in range(spec.response_groups):
+            group_id = _uuid(rng)
+            fields = ["message.text", "user.id", "bot.mode", "session.last_command", "user.level", "channel.name"]
+            body = {f"field_{k}": "{$" + fields[k % len(fields)] + "$}" for k in range(spec.template_vars)}
+            groups.append({
+                "id": group_id,
+                "search_type": "response",
+                "variables": json.dumps({"response.status": "session.last_status"}),
+                "request": {
+                    "id": _uuid(rng),
+                    "name": "bench",
+                    "method": "POST",
+                    "request_url": "https://api.bench.test/users/{$user.id$}/events",
+                    "json_field": body,
+                },
+                "connections": [_connection(rng, group_id, next_step, _never_rules())],
+            })
+
+        group_id = _uuid(rng)
+        groups.append({
+            "id": group_id,
+            "search_type": "message",
+            "connections": [_connection(rng, group_id, next_step, None)],
+        })
+        step["connection_groups"] = groups
+
+    structure = {"id": bot_id, "name": "bench", "type": "bot", "first_step_id": steps[0]["id"],
+                 "steps": steps, "master_connection_groups": []}
+    structure[STRUCTURE_VERSION_KEY] = compute_structure_version(structure)
+    return {"id": bot_id, "name": "bench", "cache_structure": structure}
+
+
+def message_stream(spec: BotGraphSpec, count: int, users: int = 50, command_ratio: float = 0.7,
+                   seed: int = 0) -> list[tuple[str, dict]]:
+    """Поток (sender_id, message): command_ratio сообщений — команды графа, остальные — свободный текст."""
+    rng = random.Random(seed)
+    senders = [_uuid(rng) for _ in range(users)]
+    stream = []
+    for _ in range(count):
+        sender_id = rng.choice(senders)
+        if rng.random() < command_ratio:
+            text = f"/cmd{rng.randrange(spec.commands)}"
+        else:
+            text = " ".join(rng.choice(("hello", "price", "order", "status", "help")) for _ in range(3))
+        stream.append((sender_id, {"message": {"text": text, "sender_id": sender_id}}))
+    return stream
+
+
+class MemoryPipeline:
+    def __init__(self, redis: "MemoryRedis"):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append(("set", key, value))
+
+    def delete(self, key):
+        self.commands.append(("delete", key, None))
+
+    def publish(self, channel, message):
+        self.commands.append(("publish", channel, message))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        for command, key, value in self.commands:
+            if command == "set":
+                self.redis.store[key] = value
+            elif command == "delete":
+                self.redis.store.pop(key, None)
+        self.commands = []
+
+
+class MemoryRedis:
+    """Заменитель Redis: только команды, которые использует DataManager; считает обращения."""
+
+    def __init__(self):
+        self.store: dict[str, Any] = {}
+        self.round_trips = 0
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.store.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.round_trips += 1
+        self.store[key] = value
+
+    async def delete(self, key):
+        self.round_trips += 1
+        self.store.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.round_trips += 1
+
+    async def zcount(self, key, minimum, maximum):
+        self.round_trips += 1
+        return 0
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+
+class MemoryResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+VARIABLES_TABLES = {"bot_id": "bot_variables", "user_id": "user_variables",
+                    "channel_id": "channel_variables", "session_id": "session_variables"}
+
+
+class MemoryDatabase:
+    """
+    Заменитель Postgres для DataManager: сессии и переменные в словарях,
+    запросы распознаются по тексту. Неизвестные запросы возвращают пустой результат.
+    """
+
+    def __init__(self):
+        self.sessions: dict[tuple[str, str, str], dict] = {}
+        self.variables: dict[tuple[str, str], dict] = {}
+        self.queries = 0
+
+    def connect(self):
+        return MemoryConnection(self)
+
+    def begin(self):
+        return MemoryConnection(self)
+
+    def execute(self, query: str, params: dict) -> MemoryResult:
+        self.queries += 1
+        if "AS r0" in query:
+            return MemoryResult([self._combined_row(params)])
+        if "INSERT INTO session" in query:
+            row = {**params, "id": params["id"]}
+            self.sessions[(str(params["user_id"]), str(params["bot_id"]), str(params["channel_id"]))] = row
+            return MemoryResult([row])
+        match = re.match(r"\s*UPDATE (\w+)", query)
+        if match and match.group(1) == "session":
+            row = self.sessions.get((str(params["user_id"]), str(params["bot_id"]), str(params["channel_id"])))
+            if row is None:
+                return MemoryResult([])
+            row.update(step_id=params["step_id"], updated_at=datetime.utcnow())
+            return MemoryResult([row])
+        if match and match.group(1) in VARIABLES_TABLES.values():
+            data = self.variables.setdefault((match.group(1), str(params["id"])), {})
+            for key in params.get("removed") or []:
+                data.pop(key, None)
+            data.update(json.loads(params.get("patch") or "{}"))
+            return MemoryResult([{"data": data}])
+        if "FROM session" in query and "user_id" in params:
+            row = self.sessions.get((str(params["user_id"]), str(params["bot_id"]), str(params["channel_id"])))
+            return MemoryResult([row] if row else [])
+        return MemoryResult([])
+
+    def _combined_row(self, params: dict) -> tuple:
+        columns = {}
+        for name, value in params.items():
+            prefix, _, param = name.partition("_")
+            table = VARIABLES_TABLES.get(param)
+            if table:
+                data = self.variables.get((table, str(value)), {})
+                columns[int(prefix[1:])] = {"data": data, "id": str(value)}
+        return tuple(columns.get(i) for i in range(len(columns)))
+
+
+class MemoryConnection:
+    def __init__(self, database: MemoryDatabase):
+        self.database = database
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        return self.database.execute(str(query), params or {})
+
+    async def commit(self):
+        pass
+
+
+def _http_stub(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"status": "ok", "path": request.url.path})
+
+
+@dataclass
+class BenchmarkEnvironment:
+    redis: MemoryRedis
+    database: MemoryDatabase
+    data_manager: DataManager
+    channel: dict
+
+
+@contextmanager
+def bench_environment() -> Iterator[BenchmarkEnvironment]:
+    """Подменяет HTTP-клиент и Redis отладочного сокета на заглушки на время прогона."""
+    redis = MemoryRedis()
+    database = MemoryDatabase()
+    environment = BenchmarkEnvironment(
+        redis=redis,
+        database=database,
+        data_manager=DataManager(redis, database, LocalCache()),
+        channel={"id": str(uuid.UUID(int=1)), "name": "bench"},
+    )
+    http_clients = request_module.http_clients
+    presence = bot_log_shipper.presence
+    request_module.http_clients = HttpClientRegistry(transport=httpx.MockTransport(_http_stub))
+    # Отметки слушателей живут в другом Redis и кешируются по времени — в счётчик обращений не входят
+    bot_log_shipper.presence = BotListenerPresence(redis=MemoryRedis())
+    level = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    try:
+        yield environment
+    finally:
+        logging.disable(level)
+        request_module.http_clients = http_clients
+        bot_log_shipper.presence = presence
+
+
+@dataclass
+class BenchmarkResult:
+    scenario: str
+    messages: int
+    messages_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_kib_per_message: float
+    queries_per_message: float
+    redis_round_trips_per_message: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу; values должен быть отсортирован."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+async def _process(environment: BenchmarkEnvironment, bot: dict, sender_id: str, message: dict) -> None:
+    processor = MessageProcessor(sender_id, bot, environment.channel, message, environment.data_manager)
+    await processor.run()
+
+
+async def replay(scenario: str, spec: BotGraphSpec, messages: int = 500, users: int = 50,
+                 warmup: int = 50, traced: int = 50, seed: int = 0) -> BenchmarkResult:
+    """
+    Прогоняет поток сообщений через MessageProcessor.
+    Первые warmup сообщений прогревают кеши и не попадают в отчёт;
+    память меряется отдельным проходом по traced сообщениям под tracemalloc, чтобы не искажать задержки.
+    """
+    bot = build_bot(spec, seed)
+    stream = message_stream(spec, warmup + messages + traced, users=users, seed=seed)
+    with bench_environment() as environment:
+        variables = environment.database.variables
+        variables[("bot_variables", bot["id"])] = {"mode": "live"}
+        for sender_id, _ in stream:
+            variables[("user_variables", sender_id)] = {"level": 1}
+        for sender_id, message in stream[:warmup]:
+            await _process(environment, bot, sender_id, message)
+
+        queries = environment.database.queries
+        round_trips = environment.redis.round_trips
+        latencies = []
+        started = time.perf_counter()
+        for sender_id, message in stream[warmup:warmup + messages]:
+            message_started = time.perf_counter()
+            await _process(environment, bot, sender_id, message)
+            latencies.append(time.perf_counter() - message_started)
+        elapsed = time.perf_counter() - started
+        queries = environment.database.queries - queries
+        round_trips = environment.redis.round_trips - round_trips
+
+        peaks = []
+        tracemalloc.start()
+        try:
+            for sender_id, message in stream[warmup + messages:]:
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                await _process(environment, bot, sender_id, message)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        await bot_log_shipper.flush()
+
+    latencies.sort()
+    return BenchmarkResult(
+        scenario=scenario,
+        messages=messages,
+        messages_per_second=round(messages / elapsed, 1) if elapsed else 0.0,
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p95_ms=round(percentile(latencies, 95) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+        peak_kib_per_message=round(sum(peaks) / len(peaks) / 1024, 1) if peaks else 0.0,
+        queries_per_message=round(queries / messages, 3),
+        redis_round_trips_per_message=round(round_trips / messages, 3),
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app.schemas import rebuild_models
+
+    rebuild_models()
+    for name in sys.argv[1:] or SCENARIOS:
+        print(json.dumps(asyncio.run(replay(name, SCENARIOS[name])).to_dict()))
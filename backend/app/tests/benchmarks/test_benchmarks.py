@@ -0,0 +1,51 @@
+"""
+Сравнение прогонов харнесса с сохранёнными базовыми значениями (baselines.json).
+
+BENCHMARK_UPDATE_BASELINES=1 — перезаписать baselines.json результатами текущего прогона.
+Число SQL-запросов и обращений к Redis на сообщение детерминировано и проверяется всегда.
+BENCHMARK_TIMINGS=1 — дополнительно сравнить p95 и пропускную способность; baselines записаны на одной машине,
+поэтому по умолчанию (на CI) время не проверяется.
+BENCHMARK_TOLERANCE — во сколько раз допускается ухудшение времени (по умолчанию 3).
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from app.tests.benchmarks.harness import SCENARIOS, replay
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+MESSAGES = 200
+UPDATE_BASELINES = os.getenv("BENCHMARK_UPDATE_BASELINES", "").lower() in ("1", "true", "yes")
+CHECK_TIMINGS = os.getenv("BENCHMARK_TIMINGS", "").lower() in ("1", "true", "yes")
+TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE", 3))
+
+
+def load_baselines() -> dict:
+    if not BASELINES_PATH.exists():
+        return {}
+    return json.loads(BASELINES_PATH.read_text())
+
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_benchmark_against_baseline(scenario):
+    result = asyncio.run(replay(scenario, SCENARIOS[scenario], messages=MESSAGES)).to_dict()
+
+    if UPDATE_BASELINES:
+        baselines = load_baselines()
+        baselines[scenario] = result
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        return
+
+    baseline = load_baselines().get(scenario)
+    if baseline is None:
+        pytest.skip(f"No baseline for {scenario}; run with BENCHMARK_UPDATE_BASELINES=1")
+
+    assert result["queries_per_message"] <= baseline["queries_per_message"], result
+    assert result["redis_round_trips_per_message"] <= baseline["redis_round_trips_per_message"], result
+    if not CHECK_TIMINGS:
+        return
+    assert result["p95_ms"] <= baseline["p95_ms"] * TOLERANCE, result
+    assert result["messages_per_second"] >= baseline["messages_per_second"] / TOLERANCE, result
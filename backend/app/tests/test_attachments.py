@@ -1,4 +1,6 @@
 
+from datetime import timedelta
+
 import pytest
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
@@ -7,16 +9,21 @@ from sqlalchemy.ext.asyncio import async_sessionmaker
 from app.engine.files import create_universal_file_attachment
 from app.services.attachment_service import AttachmentService, AttachmentStoragePort
 from app.services.attachment_repository_sql import SqlAttachmentRepository
-from app.models.attachment import AttachmentModel
+from app.models.attachment import AttachmentModel, AttachmentBlobModel
 
 
 class FakeStorage(AttachmentStoragePort):
     def __init__(self):
         self._store: dict[str, bytes] = {}
+        self.uploads = 0
 
     async def upload(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        self.uploads += 1
         self._store[key] = data
 
+    async def delete(self, key: str) -> None:
+        self._store.pop(key, None)
+
     async def get_bytes(self, key: str) -> bytes:
         return self._store[key]
 
@@ -74,3 +81,35 @@ async def test_create_universal_file_attachment_inserts_record_and_uploads():
         # Fake storage contains data
         data = await storage.get_bytes(row["file"])
         assert isinstance(data, (bytes, bytearray)) and len(data) > 0
+
+
+@pytest.mark.asyncio
+async def test_deduplicated_attachments_share_one_object():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: AttachmentBlobModel.__table__.create(sync_conn))
+        await conn.run_sync(lambda sync_conn: AttachmentModel.__table__.create(sync_conn))
+    storage = FakeStorage()
+    repo = SqlAttachmentRepository(engine)
+    service = AttachmentService(storage, repo, dedup=True)
+
+    first = await service.create_from_bytes(b"report", "report.csv", "text/csv")
+    second = await service.create_from_bytes(b"report", "copy.csv", "text/csv")
+    other = await service.create_from_bytes(b"other", "other.csv", "text/csv")
+
+    assert first.id != second.id
+    assert first.key == second.key != other.key
+    assert storage.uploads == 2
+
+    # Параллельная регистрация того же содержимого возвращает уже сохранённый ключ
+    content_hash = (await repo._execute("SELECT content_hash FROM attachment WHERE id = :id",
+                                        {"id": first.id}))[0]["content_hash"]
+    assert await repo.register_blob(content_hash, "attachment/race.csv", 6, "text/csv") == first.key
+    for _ in range(3):
+        await repo.release_blob(content_hash)
+
+    assert await service.collect_garbage(timedelta(hours=1)) == 0
+    assert await service.collect_garbage(timedelta(0)) == 1
+    assert first.key not in storage._store and other.key in storage._store
+    assert await repo.acquire_blob(content_hash) is None
+    await engine.dispose()
@@ -0,0 +1,86 @@
+import asyncio
+
+from app.loggers import bot as bot_logger_module
+from app.loggers.bot import BotLogger
+from app.loggers.shipper import BotLogShipper
+
+
+class FakePresence:
+    def __init__(self, listened: set[str]):
+        self.listened = listened
+        self.checks = 0
+
+    async def has_listeners(self, bot_id):
+        self.checks += 1
+        return str(bot_id) in self.listened
+
+
+def make_shipper(listened: set[str], **kwargs):
+    published = []
+
+    async def publish(payload):
+        published.append(payload)
+
+    presence = FakePresence(listened)
+    shipper = BotLogShipper(publish=publish, presence=presence, **{"flush_interval": 60, **kwargs})
+    return shipper, presence, published
+
+
+def run_messages(shipper, bot_id: str, count: int):
+    async def scenario():
+        logger = BotLogger(bot_id)
+        for i in range(count):
+            await logger.info(f"step {i}")
+            await logger.send_variables({"user": {"i": i}})
+        await logger.flush()
+        await shipper.close()
+
+    original = bot_logger_module.bot_log_shipper
+    bot_logger_module.bot_log_shipper = shipper
+    try:
+        asyncio.run(scenario())
+    finally:
+        bot_logger_module.bot_log_shipper = original
+
+
+def test_logs_are_batched_and_variables_coalesced():
+    shipper, presence, published = make_shipper({"bot-1"})
+
+    run_messages(shipper, "bot-1", 10)
+
+    assert len(published) == 1
+    messages = published[0]["messages"]
+    assert [m["type"] for m in messages] == ["logs"] * 10 + ["variables"]
+    assert messages[-1]["variables"] == {"user": {"i": 9}}
+    assert presence.checks == 1
+
+
+def test_nothing_is_published_without_listeners():
+    shipper, _, published = make_shipper(set())
+
+    run_messages(shipper, "bot-2", 10)
+
+    assert published == []
+
+
+def test_size_threshold_and_buffer_limit():
+    shipper, _, published = make_shipper({"bot-3"}, batch_size=4, max_buffer=6)
+
+    async def scenario():
+        for i in range(3):
+            shipper.add("bot-3", {"type": "logs", "message": str(i)})
+        assert published == []
+        shipper.add("bot-3", {"type": "logs", "message": "3"})
+        await asyncio.sleep(0)
+        assert len(published) == 1 and len(published[0]["messages"]) == 4
+
+        shipper.batch_size = 100
+        for i in range(10):
+            shipper.add("bot-3", {"type": "logs", "message": str(i)})
+        await shipper.close()
+
+    asyncio.run(scenario())
+
+    last = published[-1]["messages"]
+    assert len(last) == 7
+    assert last[-1]["message"].startswith("4 log record(s) dropped")
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import uuid
+
+from app.engine.bot_processor import run_bots_concurrently
+from app.engine.compiled_bot import STRUCTURE_VERSION_KEY, compute_structure_version
+from app.tests.benchmarks.harness import bench_environment
+
+CODE = """
+async def main(context, variables):
+    previous = context["message"].get("owner", "none")
+    context["message"]["owner"] = "{owner}"
+    return {{"previous": previous}}
+"""
+
+
+def code_bot(owner: str) -> dict:
+    """Бот из одного шага с кодовой группой, которая пишет во вложенный ключ context."""
+    bot_id, step_id, group_id = (str(uuid.uuid4()) for _ in range(3))
+    step = {"id": step_id, "name": "step", "is_proxy": False, "bot_id": bot_id}
+    never = {"condition": "AND", "rules": [{"id": "message.text", "field": "message.text", "type": "string",
+                                            "input": "text", "operator": "equal", "value": "__never__"}]}
+    step["connection_groups"] = [{
+        "id": group_id,
+        "search_type": "code",
+        "code": CODE.format(owner=owner),
+        "variables": json.dumps({"previous": "session.previous"}),
+        "connections": [{"id": str(uuid.uuid4()), "group_id": group_id, "next_step_id": step_id,
+                         "next_step": dict(step), "rules": json.dumps(never)}],
+    }]
+    structure = {"id": bot_id, "name": owner, "type": "bot", "first_step_id": step_id,
+                 "steps": [step], "master_connection_groups": []}
+    structure[STRUCTURE_VERSION_KEY] = compute_structure_version(structure)
+    return {"id": bot_id, "name": owner, "cache_structure": structure}
+
+
+def test_concurrent_bots_do_not_share_message():
+    bots = [code_bot("first"), code_bot("second")]
+    message = {"message": {"text": "hello", "sender_id": "user"}}
+
+    with bench_environment() as environment:
+        asyncio.run(run_bots_concurrently("user", bots, environment.channel, message, environment.data_manager))
+        sessions = {bot_id: row["id"] for (_, bot_id, _), row in environment.database.sessions.items()}
+        owners = {bot["name"]: environment.database.variables[("session_variables", str(sessions[bot["id"]]))]
+                  for bot in bots}
+
+    # Каждый бот видит сообщение без записей другого бота
+    assert owners == {"first": {"previous": "none"}, "second": {"previous": "none"}}
+    assert message == {"message": {"text": "hello", "sender_id": "user"}}
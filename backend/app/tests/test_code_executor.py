@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.engine.bot_processor import CodeExecutor
+from app.engine.compiled_bot import check_code_snippets
+from app.engine.safe_env import CompiledCodeCache, code_cache, safe_globals
+
+
+class PrintLogger:
+    def __init__(self, name: str):
+        self.name = name
+        self.lines = []
+        self.errors = []
+
+    async def print(self, *args, sep=' ', end='\n'):
+        self.lines.append(f"{self.name}:{sep.join(str(arg) for arg in args)}")
+
+    async def error(self, message):
+        self.errors.append(message)
+
+
+CODE = """
+async def main(context, variables):
+    await print(context["n"])
+    return {"n": context["n"] * 2}
+"""
+
+
+def test_compiled_code_cache_is_bounded_and_reused():
+    cache = CompiledCodeCache(max_size=2)
+    first = cache.compile("x = 1")
+    assert cache.compile("x = 1") is first
+    cache.compile("x = 2")
+    cache.compile("x = 3")
+    assert len(cache) == 2
+    with pytest.raises(SyntaxError):
+        cache.compile("def (")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_executions_use_own_print():
+    loggers = [PrintLogger("a"), PrintLogger("b")]
+    results = await asyncio.gather(*(CodeExecutor(logger).execute(CODE, {"n": i}) for i, logger in enumerate(loggers)))
+
+    assert results == [{"n": 0}, {"n": 2}]
+    assert loggers[0].lines == ["a:0"] and loggers[1].lines == ["b:1"]
+    assert "print" not in safe_globals
+    assert code_cache.key(CODE) in code_cache._items
+
+
+def test_check_code_snippets_reports_syntax_errors():
+    structure = {"master_connection_groups": [{"id": "g1", "code": "def main(:"}],
+                 "steps": [{"connection_groups": [{"id": "g2", "code": CODE}]}]}
+    errors = check_code_snippets(structure)
+    assert list(errors) == ["g1"] and errors["g1"].startswith("SyntaxError")
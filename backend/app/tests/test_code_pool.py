@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.engine.code_pool import CodeProcessPool, CodeTimeoutError
+
+
+CODE = """
+async def main(context, variables):
+    await print("got", context["n"])
+    return {"n": context["n"] + variables["step"]}
+"""
+
+ALLOCATE = """
+async def main(context, variables):
+    return {"size": len(bytes(2 * 1024 ** 3))}
+"""
+
+LOOP = """
+async def main(context, variables):
+    while True:
+        pass
+"""
+
+
+@pytest.mark.asyncio
+async def test_code_pool_runs_kills_and_respawns():
+    pool = CodeProcessPool(size=1, timeout=2, memory_limit_mb=256)
+    try:
+        result = await pool.run(CODE, {"n": 1}, {"step": 2})
+        assert result.ok and result.result == {"n": 3}
+        assert result.prints == ["got 1"]
+
+        failed = await pool.run("async def other(): pass", {}, {})
+        assert not failed.ok and "main" in failed.error
+
+        too_big = await pool.run(ALLOCATE, {}, {})
+        assert not too_big.ok and "memory limit" in too_big.error
+
+        with pytest.raises(CodeTimeoutError):
+            await pool.run(LOOP, {}, {})
+
+        again = await pool.run(CODE, {"n": 5}, {"step": 1})
+        assert again.result == {"n": 6}
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_code_pool_replaces_process_of_cancelled_call():
+    pool = CodeProcessPool(size=1, timeout=10, memory_limit_mb=256)
+    try:
+        task = asyncio.create_task(pool.run(LOOP, {}, {}))
+        await asyncio.sleep(1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert pool._idle.qsize() == 1 and len(pool._processes) == 1
+        result = await asyncio.wait_for(pool.run(CODE, {"n": 1}, {"step": 1}), timeout=30)
+        assert result.result == {"n": 2}
+    finally:
+        await pool.close()
@@ -0,0 +1,80 @@
+from uuid import uuid4
+
+from app.engine.compiled_bot import (
+    STRUCTURE_VERSION_KEY,
+    CompiledBot,
+    CompiledBotCache,
+    compute_structure_version,
+)
+
+
+def build_structure(step_count: int = 3) -> dict:
+    bot_id = str(uuid4())
+    steps = [{"id": str(uuid4()), "name": f"step {i}", "is_proxy": False, "bot_id": bot_id,
+              "connection_groups": []} for i in range(step_count)]
+    steps[0]["message"] = {"id": str(uuid4()), "text": "Hello, {$user.first_name$}!"}
+    steps[1]["message"] = {"id": str(uuid4()), "text": "Static text"}
+    group_id = str(uuid4())
+    steps[0]["connection_groups"] = [{
+        "id": group_id,
+        "search_type": "message",
+        "variables": '{"message.text": "user.answer"}',
+        "connections": [{
+            "id": str(uuid4()),
+            "group_id": group_id,
+            "next_step_id": steps[1]["id"],
+            "next_step": {k: v for k, v in steps[1].items() if k not in ("message", "connection_groups")},
+            "rules": '{"condition": "AND", "rules": [{"id": "message.text", "field": "message.text", '
+                     '"type": "string", "input": "text", "operator": "equal", "value": "{$bot.answer$}"}]}',
+        }],
+    }]
+    return {"id": bot_id, "name": "bot", "type": "bot", "first_step_id": steps[0]["id"], "steps": steps,
+            "master_connection_groups": []}
+
+
+def test_compiled_bot_indexes_structure():
+    structure = build_structure()
+    compiled = CompiledBot(structure)
+
+    step = compiled.get_step(structure["steps"][2]["id"])
+    assert step is not None and step.name == "step 2"
+    assert compiled.get_step("missing") is None
+
+    group = compiled.bot.steps[0].connection_groups[0]
+    connection = group.connections[0]
+    assert compiled.get_group_variables(group) == {"message.text": "user.answer"}
+    assert compiled.get_rules(connection)["condition"] == "AND"
+    assert compiled.is_dynamic(f"rules:{connection.id}")
+    rule_fn = compiled.get_rule_fn(connection)
+    assert rule_fn({"message": {"text": "yes"}, "bot": {"answer": "yes"}}) is True
+    assert rule_fn({"message": {"text": "no"}, "bot": {"answer": "yes"}}) is False
+    assert compiled.is_dynamic(f"message:{structure['steps'][0]['id']}")
+    assert not compiled.is_dynamic(f"message:{structure['steps'][1]['id']}")
+
+
+def test_compiled_bot_cache_reuses_and_replaces_versions():
+    structure = build_structure()
+    structure[STRUCTURE_VERSION_KEY] = compute_structure_version(structure)
+    bot = {"id": structure["id"], "cache_structure": structure}
+    cache = CompiledBotCache(max_size=2)
+
+    first = cache.get_or_compile(bot)
+    assert cache.get_or_compile(bot) is first
+
+    structure["steps"][2]["name"] = "renamed"
+    structure[STRUCTURE_VERSION_KEY] = compute_structure_version(structure)
+    second = cache.get_or_compile(bot)
+    assert second is not first
+    assert second.get_step(structure["steps"][2]["id"]).name == "renamed"
+    assert len(cache) == 1
+
+
+def test_compiled_bot_cache_is_bounded():
+    cache = CompiledBotCache(max_size=2)
+    bots = [build_structure() for _ in range(3)]
+    for structure in bots:
+        cache.get_or_compile({"id": structure["id"], "cache_structure": structure})
+
+    assert len(cache) == 2
+    cache.invalidate(bots[2]["id"])
+    assert len(cache) == 1
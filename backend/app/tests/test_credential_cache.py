@@ -0,0 +1,136 @@
+import asyncio
+
+from app.managers.credential_cache import CredentialCache
+from app.utils.secret_box import encrypt_dict_to_blob
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        for name, args, kwargs in self.calls:
+            await getattr(self.redis, name)(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value.encode()
+
+    async def hget(self, name, field):
+        return self.store.get(name, {}).get(field)
+
+    async def hset(self, name, field, value):
+        self.store.setdefault(name, {})[field] = value.encode()
+
+    async def expire(self, name, ttl):
+        pass
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def incr(self, key):
+        self.store[key] = str(int(self.store.get(key, 0)) + 1).encode()
+
+    async def publish(self, channel, message):
+        self.published.append(message)
+
+
+class Db:
+    def __init__(self):
+        self.calls = 0
+        self.row = {"id": "c1", "bot_id": "bot", "provider": "google", "strategy": "oauth",
+                    "data": encrypt_dict_to_blob({"client_secret": "top-secret"})}
+
+    async def load(self):
+        self.calls += 1
+        return dict(self.row)
+
+
+async def load_missing():
+    return None
+
+
+def test_redis_keeps_ciphertext_and_l1_serves_decrypted():
+    redis = FakeRedis()
+    db = Db()
+
+    async def scenario():
+        cache = CredentialCache(redis)
+        first = await cache.get_for_bot(redis, "bot", "google:oauth:default", db.load)
+        second = await cache.get_for_bot(redis, "bot", "google:oauth:default", db.load)
+        # другой процесс: L1 пуст, строку берёт из Redis и расшифровывает сам
+        other = await CredentialCache(redis).get_for_bot(redis, "bot", "google:oauth:default", db.load)
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first["payload"] == second["payload"] == other["payload"] == {"client_secret": "top-secret"}
+    assert db.calls == 1
+    assert b"top-secret" not in redis.store["credential:bot:bot:v0"]["google:oauth:default"]
+
+
+def test_invalidation_drops_redis_and_local_entries():
+    redis = FakeRedis()
+    db = Db()
+
+    async def scenario():
+        cache = CredentialCache(redis)
+        other_process = CredentialCache(redis)
+        await cache.get_by_id(redis, "c1", db.load)
+        await other_process.get_by_id(redis, "c1", db.load)
+        missing = await cache.get_for_bot(redis, "bot", "amocrm:*:singleton", load_missing)
+
+        db.row["data"] = encrypt_dict_to_blob({"client_secret": "rotated"})
+        await cache.invalidate("bot", "c1")
+        for message in redis.published:
+            other_process.handle_invalidation(message)
+        return missing, await cache.get_by_id(redis, "c1", db.load), await other_process.get_by_id(redis, "c1", db.load)
+
+    missing, fresh, other = asyncio.run(scenario())
+    assert missing is None
+    assert fresh["payload"] == other["payload"] == {"client_secret": "rotated"}
+    assert redis.published == ["credential:bot:bot"]
+    assert db.calls == 2
+
+
+def test_load_racing_an_update_does_not_restore_stale_row():
+    redis = FakeRedis()
+    db = Db()
+
+    async def scenario():
+        cache = CredentialCache(redis)
+
+        async def load_then_update():
+            row = await db.load()
+            # Учётку обновили и сбросили кеш, пока загрузка ещё не записала старую строку
+            db.row["data"] = encrypt_dict_to_blob({"client_secret": "rotated"})
+            await cache.invalidate("bot", "c1")
+            return row
+
+        stale = await cache.get_by_id(redis, "c1", load_then_update)
+        other_process = await CredentialCache(redis).get_by_id(redis, "c1", db.load)
+        return stale, other_process
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale["payload"] == {"client_secret": "top-secret"}
+    assert fresh["payload"] == {"client_secret": "rotated"}
@@ -0,0 +1,155 @@
+import json
+from unittest import mock
+
+import pytest
+
+from app.managers.data_manager import DataManager, LocalCache, QueryProvider
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value))
+
+    def delete(self, key):
+        self.commands.append((key, None))
+
+    def publish(self, channel, message):
+        self.redis.published.append(message)
+
+    async def execute(self):
+        self.redis.store.update(self.commands)
+
+
+class FakeRedis:
+    def __init__(self, store: dict[str, str]):
+        self.store = store
+        self.mget_calls = 0
+        self.published = []
+
+    async def mget(self, keys):
+        self.mget_calls += 1
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, engine: "FakeEngine"):
+        self.engine = engine
+
+    async def __aenter__(self):
+        self.engine.transactions += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params):
+        self.engine.queries.append(str(query))
+        return FakeResult({"data": params.get("patch")})
+
+
+class FakeEngine:
+    def __init__(self):
+        self.transactions = 0
+        self.queries = []
+
+    def begin(self):
+        return FakeConnection(self)
+
+
+def test_combine_row_queries_prefixes_params():
+    query, params = QueryProvider.combine_row_queries([
+        QueryProvider.get_bot_variables_query("b1"),
+        ("SELECT :id::text AS id, :id AS same", {"id": "x"}),
+    ])
+
+    assert params == {"q0_bot_id": "b1", "q1_id": "x"}
+    assert ":q0_bot_id" in query and ":q1_id::text" in query
+    assert "AS r0" in query and "AS r1" in query
+
+
+@pytest.mark.asyncio
+async def test_get_all_variables_single_mget_on_hit():
+    store = {
+        "variables:bot:b": json.dumps({"data": {"x": 1}, "id": "b", "name": "bot", "description": ""}),
+        "variables:channel:c": json.dumps({"data": None, "id": "c", "name": "chan"}),
+        "variables:session:s": json.dumps({"data": {"step": 2}, "id": "s"}),
+        "variables:user:u": json.dumps({"data": {}, "id": "u", "type": "user", "first_name": "Ann"}),
+    }
+    redis = FakeRedis(store)
+    manager = DataManager(redis, engine=None, local_cache=LocalCache())
+
+    variables = await manager.get_all_variables("u", "b", "c", "s")
+    assert redis.mget_calls == 1
+    assert variables["bot"]["x"] == 1
+    assert variables["channel"] == {"id": "c", "name": "chan"}
+    assert variables["session"] == {"step": 2}
+    assert variables["user"]["first_name"] == "Ann"
+
+    variables["bot"]["x"] = 2
+    again = await manager.get_all_variables("u", "b", "c", "s")
+    assert redis.mget_calls == 1
+    assert again["bot"]["x"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_changes_writes_only_changed_namespaces():
+    redis = FakeRedis({})
+    engine = FakeEngine()
+    manager = DataManager(redis, engine)
+
+    await manager.flush_changes("u", "b", "c", "s", {})
+    assert engine.transactions == 0 and not redis.published
+
+    await manager.flush_changes("u", "b", "c", "s", {"user": ({"name": "Ann"}, ["old"])}, step_id="step-2")
+    assert engine.transactions == 1
+    assert len(engine.queries) == 2
+    assert "UPDATE user_variables" in engine.queries[0] and "UPDATE session" in engine.queries[1]
+    assert redis.published == ["variables:user:u", "session:user:u:bot:b:channel:c"]
+    assert redis.store["variables:user:u"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_bots_prefetches_in_one_mget():
+    redis = FakeRedis({f"bot:{i}": json.dumps({"id": str(i)}) for i in range(3)})
+    manager = DataManager(redis, engine=None)
+
+    bots = await manager.get_bots(["0", "1", "2", "1"])
+    assert list(bots) == ["0", "1", "2"]
+    assert redis.mget_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_legacy_structure_is_hashed_once_per_load():
+    redis = FakeRedis({"bot:1": json.dumps({"id": "1", "cache_structure": {"id": "1", "steps": []}})})
+    manager = DataManager(redis, engine=None, local_cache=LocalCache())
+
+    with mock.patch("app.engine.compiled_bot.compute_structure_version", return_value="v1") as compute:
+        for _ in range(3):
+            bots = await manager.get_bots(["1"])
+            assert bots["1"]["cache_structure"]["structure_version"] == "v1"
+    assert compute.call_count == 1
+    assert redis.mget_calls == 1
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from uuid import uuid4
+
+from app.engine.bot_processor import Processor
+from app.engine.compiled_bot import CompiledBot
+from app.engine.rules import equality_terms
+
+
+def equal_rule(field, value):
+    return {"id": field, "field": field, "type": "string", "input": "text", "operator": "equal", "value": value}
+
+
+def build_structure(groups_rules: list[list[dict | None]], group_extra: dict | None = None) -> dict:
+    bot_id = str(uuid4())
+    target = {"id": str(uuid4()), "name": "target", "is_proxy": False, "bot_id": bot_id, "connection_groups": []}
+    groups = []
+    for rules_list in groups_rules:
+        group_id = str(uuid4())
+        groups.append({
+            "id": group_id,
+            "search_type": "message",
+            **(group_extra or {}),
+            "connections": [{
+                "id": str(uuid4()),
+                "group_id": group_id,
+                "next_step_id": target["id"],
+                "next_step": target,
+                "rules": json.dumps(rules) if rules is not None else None,
+            } for rules in rules_list],
+        })
+    return {"id": bot_id, "name": "bot", "type": "bot", "first_step_id": target["id"], "steps": [target],
+            "master_connection_groups": groups}
+
+
+def commands(count: int) -> list[dict]:
+    return [{"condition": "AND", "rules": [equal_rule("message.text", f"/cmd{i}")]} for i in range(count)]
+
+
+class FakeLogger:
+    async def info(self, *args, **kwargs):
+        pass
+
+    async def error(self, *args, **kwargs):
+        pass
+
+    async def warning(self, *args, **kwargs):
+        pass
+
+
+class RecordingProcessor(Processor):
+    def __init__(self, compiled_bot: CompiledBot, message: dict):
+        super().__init__(FakeLogger(), {}, None)
+        self.compiled_bot = compiled_bot
+        self.bot = compiled_bot.bot
+        self.context = message
+        self.evaluated = []
+        self.switched = None
+
+    async def _evaluate_and_switch(self, connection, context):
+        self.evaluated.append(str(connection.id))
+        return await super()._evaluate_and_switch(connection, context)
+
+    async def switch_to_next_step(self, connection) -> bool:
+        self.switched = str(connection.id)
+        return True
+
+    def _get_current_step(self, step_id):
+        return self.compiled_bot.get_step(step_id)
+
+    async def run(self, *args, **kwargs):
+        pass
+
+
+def route(compiled: CompiledBot, text: str) -> RecordingProcessor:
+    processor = RecordingProcessor(compiled, {"message": {"text": text}})
+    asyncio.run(processor.process_connection_groups(compiled.bot.master_connection_groups, processor.context))
+    return processor
+
+
+def test_equality_terms():
+    assert equality_terms(commands(1)[0]) == ("message.text", "string", ["/cmd0"])
+    assert equality_terms({"condition": "OR", "rules": [equal_rule("message.text", "/a"),
+                                                        equal_rule("message.text", "/b")]}) == \
+           ("message.text", "string", ["/a", "/b"])
+    assert equality_terms({"condition": "OR", "rules": [equal_rule("message.text", "/a"),
+                                                        equal_rule("user.name", "/b")]}) is None
+    assert equality_terms({"condition": "AND", "rules": [equal_rule("message.text", "{$bot.cmd$}")]}) is None
+
+
+def test_large_command_set_evaluates_single_candidate():
+    compiled = CompiledBot(build_structure([commands(500), commands(500)]))
+    connections = [c for group in compiled.bot.master_connection_groups for c in group.connections]
+
+    processor = route(compiled, "/cmd321")
+
+    assert processor.evaluated == [str(connections[321].id)]
+    assert processor.switched == str(connections[321].id)
+
+
+def test_miss_evaluates_only_fallback_connections():
+    contains = {"condition": "AND", "rules": [{**equal_rule("message.text", "help"), "operator": "contains"}]}
+    compiled = CompiledBot(build_structure([commands(300) + [contains]]))
+
+    processor = route(compiled, "/unknown")
+
+    assert len(processor.evaluated) == 1
+    assert processor.switched is None
+
+
+def test_first_match_order_is_preserved():
+    contains = {"condition": "AND", "rules": [{**equal_rule("message.text", "cmd5"), "operator": "contains"}]}
+    compiled = CompiledBot(build_structure([commands(3), [contains, None], commands(10)]))
+    groups = compiled.bot.master_connection_groups
+
+    processor = route(compiled, "/cmd5")
+    assert processor.switched == str(groups[1].connections[0].id)
+
+    processor = route(compiled, "/cmd1")
+    assert processor.switched == str(groups[0].connections[1].id)
+    assert processor.evaluated == [str(groups[0].connections[1].id)]
+
+    # Связь без правил срабатывает всегда — раньше команд последующих групп
+    processor = route(compiled, "/cmd7")
+    assert processor.switched == str(groups[1].connections[1].id)
+
+
+def test_groups_with_variables_are_not_indexed():
+    compiled = CompiledBot(build_structure([commands(10)], {"variables": '{"message.text": "user.last"}'}))
+
+    assert not compiled.get_dispatch_plan(compiled.bot.master_connection_groups)
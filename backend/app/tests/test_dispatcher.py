@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.engine.dispatcher import PartitionedDispatcher, session_partition_key
+
+
+def test_session_partition_key():
+    payload = {"message": {"message": {"sender_id": "u1", "recipient_id": None, "channel_id": "c1"}},
+               "channel_id": "c1"}
+    assert session_partition_key(payload) == "u1:c1"
+    # Личное сообщение боту в том же канале — та же партиция, что и рассылка в канал
+    payload["message"]["message"]["recipient_id"] = "b1"
+    assert session_partition_key(payload) == "u1:c1"
+    direct = {"message": {"message": {"sender_id": "u1", "recipient_id": "b1"}}, "channel_id": "c1"}
+    assert session_partition_key(direct) == "u1:c1"
+    dispatcher = PartitionedDispatcher(lambda item: item, partitions=16)
+    assert dispatcher.partition_for(session_partition_key(direct)) == \
+        dispatcher.partition_for(session_partition_key(payload))
+    assert session_partition_key("init") == ""
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_orders_session_and_parallelizes_sessions():
+    events = []
+    running = 0
+    max_running = 0
+
+    async def handler(item):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        events.append(item)
+        running -= 1
+        if item == ("a", 99):
+            raise RuntimeError("boom")
+        return item
+
+    dispatcher = PartitionedDispatcher(handler, partitions=8)
+    keys = [key for key in (f"s{i}" for i in range(100))
+            if dispatcher.partition_for(key) != dispatcher.partition_for("a")][:3]
+    futures = [dispatcher.submit("a", ("a", i)) for i in range(5)]
+    futures += [dispatcher.submit(key, (key, 0)) for key in keys]
+    futures.append(dispatcher.submit("a", ("a", 99)))
+
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    await dispatcher.stop()
+
+    assert [item for item in events if item[0] == "a"] == [("a", i) for i in range(5)] + [("a", 99)]
+    assert max_running > 1
+    assert isinstance(results[-1], RuntimeError)
@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+
+from app.engine import request as request_module
+from app.engine.request import HttpClientRegistry, make_request, parse_proxies
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/json":
+        return httpx.Response(200, json={"ok": True})
+    if request.url.path == "/text":
+        return httpx.Response(200, text="plain", headers={"content-type": "text/plain"})
+    if request.url.path == "/binary":
+        return httpx.Response(200, content=b"\x00\x01", headers={"content-type": "image/png"})
+    return httpx.Response(204)
+
+
+def test_parse_proxies():
+    assert parse_proxies(None) == parse_proxies("") == ()
+    assert parse_proxies("http://proxy:8080") == (("all://", "http://proxy:8080"),)
+    assert parse_proxies('{"https://": "http://b", "http://": "http://a"}') == (
+        ("http://", "http://a"), ("https://", "http://b"))
+
+
+def test_clients_are_reused_and_evicted():
+    async def scenario():
+        registry = HttpClientRegistry(max_clients=2, transport=httpx.MockTransport(handler))
+        async with registry.lease("http://p1") as first:
+            pass
+        async with registry.lease("http://p1") as again:
+            assert again is first
+        async with registry.lease() as default:
+            assert default is not first
+
+        async with registry.lease("http://p2") as busy:
+            async with registry.lease("http://p3"):
+                async with registry.lease("http://p4"):
+                    assert first.is_closed
+                    assert not busy.is_closed
+            assert not busy.is_closed
+        assert busy.is_closed
+        assert not default.is_closed
+        assert len(registry) == 3
+
+        await registry.aclose()
+        assert default.is_closed and len(registry) == 0
+
+    asyncio.run(scenario())
+
+
+def test_make_request_handles_non_json_responses():
+    async def scenario():
+        original = request_module.http_clients
+        request_module.http_clients = HttpClientRegistry(transport=httpx.MockTransport(handler))
+        try:
+            return [await make_request("GET", f"https://api.test/{path}")
+                    for path in ("json", "text", "binary", "empty")]
+        finally:
+            await request_module.http_clients.aclose()
+            request_module.http_clients = original
+
+    assert asyncio.run(scenario()) == [
+        {"response": {"ok": True}},
+        {"response": "plain"},
+        {"response": "AAE="},
+        {"response": None},
+    ]
@@ -0,0 +1,70 @@
+import json
+
+from app.engine.rules import compile_rules
+from app.engine.templates import render
+from app.utils.dict import LayeredContext, LazyCopyDict, deep_merge_dicts, get_value_by_list_keys
+
+VARIABLES = {
+    "user": {"name": "Ann", "profile": {"age": 30, "city": "Oslo"}, "tags": ["a"]},
+    "bot": {"answer": "yes"},
+    "message": {"text": "stale", "meta": {"source": "variables"}},
+}
+MESSAGE = {"message": {"text": "hi", "meta": {"lang": "en"}}, "user": {"profile": {"age": 31}}}
+
+
+def test_layered_context_matches_deep_merge():
+    layered = LayeredContext(MESSAGE, VARIABLES)
+
+    assert layered.to_dict() == deep_merge_dicts(VARIABLES, MESSAGE)
+    assert list(layered) == list(deep_merge_dicts(VARIABLES, MESSAGE))
+    assert layered["message"]["text"] == "hi"
+    assert layered["message"]["meta"]["source"] == "variables"
+    assert layered["user"]["profile"]["age"] == 31
+    assert layered["bot"] is VARIABLES["bot"]
+    assert layered.get("missing") is None
+
+
+def test_non_dict_value_shadows_lower_layers():
+    layered = LayeredContext({"user": None}, VARIABLES)
+
+    assert layered["user"] is None
+    assert LayeredContext({"user": {"x": 1}}, {"user": "text"})["user"] == {"x": 1}
+
+
+def test_lookups_materialize_merged_dicts():
+    layered = LayeredContext(MESSAGE, VARIABLES)
+
+    value = get_value_by_list_keys(layered, ["user", "profile"])
+    assert value == {"age": 31, "city": "Oslo"} and type(value) is dict
+    assert render("{$message.meta$}", layered) == {"source": "variables", "lang": "en"}
+    assert json.loads(render("meta={$message.meta$}", layered)[len("meta="):]) == {"source": "variables", "lang": "en"}
+
+
+def test_rules_read_layered_context():
+    rules = {"condition": "AND", "rules": [
+        {"id": "a", "field": "user.profile.age", "type": "integer", "input": "number", "operator": "equal",
+         "value": "31"},
+        {"id": "b", "field": "user.profile.city", "type": "string", "input": "text", "operator": "equal",
+         "value": "Oslo"},
+    ]}
+
+    assert compile_rules(rules)(LayeredContext(MESSAGE, VARIABLES)) is True
+
+
+def test_lazy_copy_dict_isolates_writes():
+    source = {"user": {"profile": {"age": 30}, "tags": [{"id": 1}]}, "bot": {"x": 1}}
+    variables = LazyCopyDict(source)
+
+    variables["user"]["profile"]["age"] = 99
+    variables["user"]["tags"][0]["id"] = 2
+    variables["user"]["tags"].append("new")
+    variables.get("bot")["y"] = 2
+    dict(variables)["user"]["profile"]["city"] = "Oslo"
+    variables["session"] = {}
+
+    assert source == {"user": {"profile": {"age": 30}, "tags": [{"id": 1}]}, "bot": {"x": 1}}
+    assert json.loads(json.dumps(variables)) == {
+        "user": {"profile": {"age": 99, "city": "Oslo"}, "tags": [{"id": 2}, "new"]},
+        "bot": {"x": 1, "y": 2},
+        "session": {},
+    }
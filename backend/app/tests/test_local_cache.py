@@ -0,0 +1,51 @@
+import time
+
+from prometheus_client import REGISTRY
+
+from app.engine.compiled_bot import CompiledBotCache
+from app.managers.data_manager import INVALIDATE_ALL, LocalCache
+
+
+def test_local_cache_lru_and_ttl():
+    evictions = REGISTRY.get_sample_value("bot_cache_evictions_total", {"family": "bot"}) or 0.0
+    cache = LocalCache(max_size=2, ttl=30)
+    cache.set("bot:1", "a")
+    cache.set("bot:2", "b")
+    assert cache.get("bot:1") == "a"
+    cache.set("bot:3", "c")
+
+    assert cache.get("bot:2") is None
+    assert cache.get("bot:1") == "a"
+    assert REGISTRY.get_sample_value("bot_cache_evictions_total", {"family": "bot"}) == evictions + 1
+
+    cache.set("channel:1", "x", ttl=1)
+    cache._items["channel:1"] = (time.monotonic() - 1, "x")
+    assert cache.get("channel:1") is None
+
+
+def test_local_cache_skips_stale_set_after_invalidation():
+    cache = LocalCache()
+    generation = cache.generation("variables:user:1")
+    cache.invalidate("variables:user:1")
+    cache.set("variables:user:1", "stale", generation=generation)
+    assert cache.get("variables:user:1") is None
+
+    cache.set("variables:user:1", "fresh", generation=cache.generation("variables:user:1"))
+    assert cache.get("variables:user:1") == "fresh"
+    assert LocalCache.key_family("variables:user:1") == "variables:user"
+
+    cache.invalidate(INVALIDATE_ALL)
+    assert len(cache) == 0
+
+
+def test_compiled_bot_cache_handles_invalidation_keys():
+    cache = CompiledBotCache()
+    cache._items["1"] = object()
+    cache._items["2"] = object()
+
+    cache.handle_invalidation("variables:bot:1")
+    assert len(cache) == 2
+    cache.handle_invalidation("bot:1")
+    assert "1" not in cache._items
+    cache.handle_invalidation(INVALIDATE_ALL)
+    assert len(cache) == 0
@@ -0,0 +1,160 @@
+import asyncio
+
+from botocore.exceptions import ClientError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.routes import media
+from app.backfill_media_index import fill_object_names
+from app.models.attachment import AttachmentBlobModel, AttachmentModel, key_basename
+from app.services import s3_service
+from app.services.media_index import MediaKeyIndex
+from app.services.s3_client import S3ClientPool
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value.encode() if isinstance(value, str) else value
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeS3Client:
+    def __init__(self, objects: dict[str, bytes]):
+        self.objects = objects
+
+    async def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}, "ResponseMetadata": {"HTTPStatusCode": 404}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    async def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, IfModifiedSince=None):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}, "ResponseMetadata": {"HTTPStatusCode": 404}},
+                              "GetObject")
+        if IfNoneMatch == '"v1"':
+            raise ClientError({"Error": {"Code": "304"}, "ResponseMetadata": {"HTTPStatusCode": 304}}, "GetObject")
+        data = self.objects[Key]
+        resp = {"ETag": '"v1"', "ContentType": "text/plain"}
+        if Range:
+            start, end = (int(n) for n in Range.removeprefix("bytes=").split("-"))
+            resp["ContentRange"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+        return {**resp, "Body": FakeBody(data), "ContentLength": len(data)}
+
+
+class FakeSession:
+    def __init__(self, client):
+        self.client = client
+
+    def create_client(self, *args, **kwargs):
+        client = self.client
+
+        class Context:
+            async def __aenter__(self):
+                return client
+
+            async def __aexit__(self, *exc):
+                pass
+
+        return Context()
+
+
+def test_resolve_uses_index_and_caches():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: AttachmentBlobModel.__table__.create(sync_conn))
+            await conn.run_sync(lambda sync_conn: AttachmentModel.__table__.create(sync_conn))
+        key = "attachment/2025/09/17/abc.xlsx"
+        async with async_sessionmaker(engine, class_=AsyncSession)() as session:
+            session.add(AttachmentModel(file=key, object_name=key_basename(key)))
+            await session.commit()
+
+            redis = FakeRedis()
+            index = MediaKeyIndex(redis)
+            found = await index.resolve(session, "abc.xlsx")
+            missing = await index.resolve(session, "nope.xlsx")
+        await engine.dispose()
+
+        # Из кеша, без обращения к БД
+        cached = await index.resolve(None, "abc.xlsx")
+        cached_missing = await index.resolve(None, "nope.xlsx")
+        return found, missing, cached, cached_missing
+
+    assert asyncio.run(scenario()) == ("attachment/2025/09/17/abc.xlsx", None, "attachment/2025/09/17/abc.xlsx", None)
+
+
+def test_fill_object_names_skips_empty_keys():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: AttachmentBlobModel.__table__.create(sync_conn))
+            await conn.run_sync(lambda sync_conn: AttachmentModel.__table__.create(sync_conn))
+        async with async_sessionmaker(engine, class_=AsyncSession)() as session:
+            session.add_all([AttachmentModel(file=""), AttachmentModel(file="attachment/2025/01/01/a.txt")])
+            await session.commit()
+            counted = await fill_object_names(session, dry_run=True)
+            filled = await asyncio.wait_for(fill_object_names(session, dry_run=False), timeout=5)
+        await engine.dispose()
+        return counted, filled
+
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+def test_presigned_redirect_only_for_existing_objects(monkeypatch):
+    pool = S3ClientPool("http://s3.test", session=FakeSession(FakeS3Client({"attachment/doc": b"0"})))
+    monkeypatch.setattr(s3_service, "s3_pool", pool)
+    monkeypatch.setattr(media.settings, "MEDIA_PRESIGNED_REDIRECT", True)
+
+    async def presigned(key, expires_in=None, content_disposition=None):
+        return f"https://s3.test/{key}?signed"
+
+    monkeypatch.setattr(s3_service, "generate_presigned_get_url", presigned)
+
+    async def scenario():
+        request = type("Request", (), {"headers": {}})()
+        found = await media._object_response(request, "attachment/doc", "doc")
+        missing = await media._object_response(request, "attachment/absent", "absent")
+        return found, missing
+
+    found, missing = asyncio.run(scenario())
+    assert found.status_code == 307 and found.headers["location"] == "https://s3.test/attachment/doc?signed"
+    assert missing is None
+
+
+def test_open_object_handles_range_and_conditional_requests(monkeypatch):
+    pool = S3ClientPool("http://s3.test", session=FakeSession(FakeS3Client({"doc": b"0123456789"})))
+    monkeypatch.setattr(s3_service, "s3_pool", pool)
+
+    async def scenario():
+        full = await s3_service.open_object("doc")
+        partial = await s3_service.open_object("doc", range_header="bytes=2-5")
+        body = b"".join([chunk async for chunk in partial.body])
+        not_modified = await s3_service.open_object("doc", if_none_match='"v1"')
+        missing = await s3_service.open_object("absent")
+        return full, partial, body, not_modified, missing
+
+    full, partial, body, not_modified, missing = asyncio.run(scenario())
+    assert full.status == 200 and full.headers["Accept-Ranges"] == "bytes"
+    assert partial.status == 206 and partial.headers["Content-Range"] == "bytes 2-5/10" and body == b"2345"
+    assert not_modified.status == 304 and not_modified.body is None
+    assert missing.status == 404
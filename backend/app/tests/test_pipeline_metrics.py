@@ -0,0 +1,76 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app.engine.stream_consumer import report_stream_stats
+from app.metrics.pipeline import in_progress, pipeline_metrics, timed
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_timed_records_sync_and_async_calls():
+    before = sample("bot_handler_seconds_count", handler="test")
+
+    @timed(pipeline_metrics.handler_duration, handler="test")
+    def sync_handler():
+        return 1
+
+    @timed(pipeline_metrics.handler_duration, handler="test")
+    async def async_handler():
+        raise ValueError
+
+    assert sync_handler() == 1
+    try:
+        asyncio.run(async_handler())
+    except ValueError:
+        pass
+
+    assert sample("bot_handler_seconds_count", handler="test") == before + 2
+
+
+def test_in_progress_tracks_running_calls():
+    seen = []
+
+    @in_progress(pipeline_metrics.messages_in_flight)
+    async def work():
+        seen.append(sample("bot_messages_in_flight"))
+
+    before = sample("bot_messages_in_flight")
+    asyncio.run(work())
+
+    assert seen == [before + 1]
+    assert sample("bot_messages_in_flight") == before
+
+
+def test_cache_and_query_metrics():
+    labels = {"family": "test", "tier": "l1"}
+    hits = sample("bot_cache_requests_total", result="hit", **labels)
+    misses = sample("bot_cache_requests_total", result="miss", **labels)
+    queries = sample("bot_db_query_seconds_count", query="test")
+
+    pipeline_metrics.observe_cache("test", "l1", True)
+    pipeline_metrics.observe_cache("test", "l1", False)
+    pipeline_metrics.observe_cache("test", "l1", False)
+    with pipeline_metrics.time_query("test"):
+        pass
+
+    assert sample("bot_cache_requests_total", result="hit", **labels) == hits + 1
+    assert sample("bot_cache_requests_total", result="miss", **labels) == misses + 2
+    assert sample("bot_db_query_seconds_count", query="test") == queries + 1
+
+
+class FakeRedis:
+    async def xinfo_groups(self, stream):
+        return [
+            {"name": b"other", "lag": 100, "pending": 100},
+            {"name": b"group", "lag": 3, "pending": 7},
+        ]
+
+
+def test_report_stream_stats():
+    asyncio.run(report_stream_stats(FakeRedis(), "metrics-test", "group"))
+
+    assert sample("worker_stream_lag", stream="metrics-test") == 3
+    assert sample("worker_stream_pending", stream="metrics-test") == 7
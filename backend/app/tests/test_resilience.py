@@ -0,0 +1,100 @@
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from app.engine.resilience import (
+    Bulkhead,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    OutboundGuard,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, half_open_calls=1, clock=clock)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_bulkhead_limits_and_rejects():
+    async def scenario():
+        bulkhead = Bulkhead("host_bulkhead", limit=2, max_wait=0.05)
+        active = peak = 0
+        release = asyncio.Event()
+
+        async def call():
+            nonlocal active, peak
+            async with bulkhead.slot("api.test"):
+                active += 1
+                peak = max(peak, active)
+                await release.wait()
+                active -= 1
+
+        tasks = [asyncio.create_task(call()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(BulkheadFullError):
+            await call()
+        release.set()
+        await asyncio.gather(*tasks)
+        return peak, bulkhead._semaphores
+
+    peak, semaphores = asyncio.run(scenario())
+    assert peak == 2
+    assert semaphores == {}
+
+
+def test_guard_fails_fast_on_open_circuit():
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        return httpx.Response(503)
+
+    async def broken():
+        raise httpx.ConnectError("refused")
+
+    async def scenario():
+        guard = OutboundGuard(host_limit=0, failure_threshold=2, cooldown=60)
+        for _ in range(2):
+            response = await guard.run("down.test", failing)
+            assert response.status_code == 503
+        with pytest.raises(CircuitOpenError):
+            await guard.run("down.test", failing)
+        with pytest.raises(httpx.ConnectError):
+            await guard.run("other.test", broken)
+        assert guard.breaker("other.test").failures == 1
+
+    asyncio.run(scenario())
+
+    assert len(calls) == 2
+    assert REGISTRY.get_sample_value("http_circuit_state", {"host": "down.test"}) == 2
+    assert REGISTRY.get_sample_value("http_outbound_rejected_total",
+                                     {"host": "down.test", "reason": "circuit_open"}) >= 1
@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+
+from app.engine import request as request_module
+from app.engine.request import HttpClientRegistry, make_request, response_body
+from app.engine.response_cache import ResponseCache, freshness, response_cache_key
+from app.managers.data_manager import LocalCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+class Upstream:
+    def __init__(self, *responses: httpx.Response):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def send(self, extra_headers):
+        self.calls.append(extra_headers)
+        await asyncio.sleep(0.01)
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+def test_cache_key_and_freshness():
+    assert response_cache_key("GET", "https://a.test", {"q": 1}, None) == \
+        response_cache_key("get", "https://a.test", {"q": 1}, None)
+    assert response_cache_key("GET", "https://a.test", None, {"Authorization": "a"}) != \
+        response_cache_key("GET", "https://a.test", None, {"Authorization": "b"})
+    assert response_cache_key("GET", "https://a.test", {"ts": 1}, template_key="rates:usd", bot_id="b1") == \
+        response_cache_key("GET", "https://a.test", {"ts": 2}, template_key="rates:usd", bot_id="b1")
+    assert response_cache_key("GET", "https://a.test", template_key="rates:usd", bot_id="b1") != \
+        response_cache_key("GET", "https://b.test", template_key="rates:usd", bot_id="b1")
+
+    assert freshness(httpx.Response(200), 60) == 60
+    assert freshness(httpx.Response(200, headers={"cache-control": "public, max-age=10"}), 60) == 10
+    assert freshness(httpx.Response(200, headers={"cache-control": "max-age=600"}), 60) == 60
+    assert freshness(httpx.Response(200, headers={"cache-control": "no-cache"}), 60) == 0
+    assert freshness(httpx.Response(200, headers={"cache-control": "no-store"}), 60) is None
+    assert freshness(httpx.Response(500), 60) is None
+
+
+def test_concurrent_requests_are_coalesced_and_cached():
+    upstream = Upstream(httpx.Response(200, json={"rate": 1}))
+    redis = FakeRedis()
+
+    async def scenario():
+        cache = ResponseCache(redis, LocalCache())
+        results = await asyncio.gather(*(cache.get_or_fetch("http:k", 60, upstream.send, response_body)
+                                         for _ in range(10)))
+        again = await cache.get_or_fetch("http:k", 60, upstream.send, response_body)
+        other_process = await ResponseCache(redis).get_or_fetch("http:k", 60, upstream.send, response_body)
+        return results, again, other_process
+
+    results, again, other_process = asyncio.run(scenario())
+
+    assert results == [{"rate": 1}] * 10
+    assert again == other_process == {"rate": 1}
+    assert len(upstream.calls) == 1
+
+
+def test_uncacheable_responses_are_not_stored():
+    upstream = Upstream(httpx.Response(200, json={"n": 1}, headers={"cache-control": "no-store"}))
+
+    async def scenario():
+        cache = ResponseCache(FakeRedis(), LocalCache())
+        for _ in range(2):
+            await cache.get_or_fetch("http:k", 60, upstream.send, response_body)
+
+    asyncio.run(scenario())
+    assert len(upstream.calls) == 2
+
+
+def test_stale_entry_is_revalidated_with_etag():
+    upstream = Upstream(
+        httpx.Response(200, json={"v": 1}, headers={"etag": '"v1"', "cache-control": "no-cache"}),
+        httpx.Response(304, headers={"etag": '"v1"', "cache-control": "max-age=30"}),
+    )
+
+    async def scenario():
+        cache = ResponseCache(FakeRedis(), LocalCache())
+        first = await cache.get_or_fetch("http:k", 60, upstream.send, response_body)
+        second = await cache.get_or_fetch("http:k", 60, upstream.send, response_body)
+        third = await cache.get_or_fetch("http:k", 60, upstream.send, response_body)
+        return first, second, third
+
+    assert asyncio.run(scenario()) == ({"v": 1}, {"v": 1}, {"v": 1})
+    assert upstream.calls == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_bots_sharing_a_template_key_do_not_share_responses(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"token": request.headers["authorization"]})
+
+    monkeypatch.setattr(request_module, "http_clients", HttpClientRegistry(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(request_module, "response_cache", ResponseCache(FakeRedis(), LocalCache()))
+
+    async def scenario():
+        try:
+            return [await make_request("GET", "https://rates.test/usd", headers={"Authorization": token},
+                                       cache_ttl=60, cache_key="rates", bot_id=bot_id)
+                    for bot_id, token in (("bot-1", "a"), ("bot-2", "b"), ("bot-1", "changed"))]
+        finally:
+            await request_module.http_clients.aclose()
+
+    assert asyncio.run(scenario()) == [{"response": {"token": "a"}}, {"response": {"token": "b"}},
+                                       {"response": {"token": "a"}}]
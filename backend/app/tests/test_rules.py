@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from jqqb_evaluator.evaluator import Evaluator
+
+from app.engine.rules import RuleCompileError, compile_rules
+from app.engine.variables import replace_variables_universal
+
+
+def rule(field, operator, value, type_="string"):
+    return {"id": field, "field": field, "type": type_, "input": "text", "operator": operator, "value": value}
+
+
+CONTEXT = {
+    "message": {"text": "/start", "attachments": [{"name": "a.png"}, {"name": "b.pdf"}]},
+    "user": {"age": 30, "tags": ["vip", "new"], "born": "1990-01-02T03:04:05.000Z", "active": "yes"},
+    "bot": {"answer": "/start", "limit": "18"},
+}
+
+CASES = [
+    {"condition": "AND", "rules": [rule("message.text", "equal", "/start")]},
+    {"condition": "OR", "rules": [rule("message.text", "equal", "/help"), rule("message.text", "begins_with", "/s")]},
+    {"condition": "AND", "rules": [rule("user.age", "greater", "18", "integer"),
+                                   rule("user.age", "between", ["10", "40"], "double")]},
+    {"condition": "AND", "rules": [rule("user.tags", "in", "vip"), rule("user.tags", "not_in", "old")]},
+    {"condition": "AND", "rules": [rule("message.attachments.name", "ends_with", ".pdf")]},
+    {"condition": "AND", "rules": [rule("user.born", "less", "2000-01-01T00:00:00.000Z", "datetime")]},
+    {"condition": "AND", "rules": [rule("user.active", "equal", "true", "boolean"),
+                                   rule("user.missing", "is_null", None)]},
+    {"condition": "OR", "rules": [rule("message.text", "equal", "/x"),
+                                  {"condition": "AND", "rules": [rule("message.text", "contains", "art"),
+                                                                 rule("message.text", "not_equal", "/stop")]}]},
+    {"condition": "AND", "rules": [rule("message.text", "equal", "{$bot.answer$}"),
+                                   rule("user.age", "greater_or_equal", "{$bot.limit$}", "integer")]},
+]
+
+
+@pytest.mark.parametrize("rules", CASES)
+def test_compiled_rules_match_evaluator(rules):
+    expected = Evaluator(asyncio.run(replace_variables_universal(rules, CONTEXT))).object_matches_rules(CONTEXT)
+    assert compile_rules(rules)(CONTEXT) is expected
+
+
+def test_placeholders_are_resolved_per_call():
+    rule_fn = compile_rules({"condition": "AND", "rules": [rule("message.text", "equal", "{$bot.answer$}")]})
+
+    assert rule_fn(CONTEXT) is True
+    assert rule_fn({**CONTEXT, "bot": {"answer": "/help"}}) is False
+
+
+def test_evaluation_errors_are_raised_like_evaluator():
+    rule_fn = compile_rules({"condition": "AND", "rules": [rule("user.age", "equal", "abc", "integer")]})
+
+    with pytest.raises(ValueError):
+        rule_fn(CONTEXT)
+
+
+@pytest.mark.parametrize("rules", [
+    "not a dict",
+    {"rules": []},
+    {"condition": "AND", "rules": [rule("message.text", "unknown", "x")]},
+    {"condition": "AND", "rules": [{"field": "message.text"}]},
+])
+def test_uncompilable_rules(rules):
+    with pytest.raises(RuleCompileError):
+        compile_rules(rules)
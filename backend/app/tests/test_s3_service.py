@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services import s3_service
+from app.services.s3_client import S3ClientPool
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.closed = False
+
+    async def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = len(self.data)
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeS3Client:
+    def __init__(self, fail_on_part: int | None = None):
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, list] = {}
+        self.calls: list[str] = []
+        self.bodies: list[FakeBody] = []
+        self.fail_on_part = fail_on_part
+
+    async def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.calls.append("put_object")
+        self.objects[Key] = Body
+
+    async def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        self.calls.append("create_multipart_upload")
+        self.uploads["u1"] = []
+        return {"UploadId": "u1"}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_on_part:
+            raise ConnectionError("part failed")
+        self.uploads[UploadId].append(Body)
+        return {"ETag": f"e{PartNumber}"}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        assert [p["PartNumber"] for p in MultipartUpload["Parts"]] == list(range(1, len(self.uploads[UploadId]) + 1))
+        self.objects[Key] = b"".join(self.uploads.pop(UploadId))
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+        self.uploads.pop(UploadId, None)
+
+    async def get_object(self, Bucket, Key):
+        body = FakeBody(self.objects[Key])
+        self.bodies.append(body)
+        return {"Body": body, "ContentLength": len(self.objects[Key]), "ContentType": "text/plain"}
+
+
+class FakeClientContext:
+    def __init__(self, client, session):
+        self.client = client
+        self.session = session
+
+    async def __aenter__(self):
+        self.session.opened += 1
+        return self.client
+
+    async def __aexit__(self, *exc):
+        self.session.closed += 1
+
+
+class FakeSession:
+    def __init__(self, client):
+        self.client = client
+        self.opened = self.closed = 0
+
+    def create_client(self, *args, **kwargs):
+        return FakeClientContext(self.client, self)
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    client = FakeS3Client()
+    session = FakeSession(client)
+    monkeypatch.setattr(s3_service, "s3_pool", S3ClientPool("http://s3.test", session=session))
+    monkeypatch.setattr(settings, "S3_MULTIPART_THRESHOLD", 6 * 1024 * 1024)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNK_SIZE", 5 * 1024 * 1024)
+    monkeypatch.setattr(settings, "S3_STREAM_CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "S3_SPOOL_MAX_MEMORY", 8)
+    return client, session
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_client_is_shared_and_closed(fake_s3):
+    client, session = fake_s3
+
+    async def scenario():
+        await asyncio.gather(*(s3_service.upload_bytes(f"k{i}", b"x") for i in range(5)))
+        await s3_service.s3_pool.close()
+
+    asyncio.run(scenario())
+    assert session.opened == session.closed == 1
+    assert client.calls == ["put_object"] * 5
+
+
+def test_large_upload_uses_multipart(fake_s3):
+    client, _ = fake_s3
+    data = bytes(range(256)) * (12 * 1024 * 1024 // 256 + 3)
+
+    async def scenario():
+        await s3_service.upload_stream("small", _chunks(b"tiny", 2))
+        return await s3_service.upload_stream("big", _chunks(data, 1024 * 1024))
+
+    assert asyncio.run(scenario()) == len(data)
+    assert client.calls == ["put_object", "create_multipart_upload", "complete_multipart_upload"]
+    assert client.objects["small"] == b"tiny"
+    assert client.objects["big"] == data
+
+
+def test_failed_multipart_upload_is_aborted(fake_s3):
+    client, _ = fake_s3
+    client.fail_on_part = 2
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(s3_service.upload_bytes("big", b"x" * (12 * 1024 * 1024)))
+    assert client.calls[-1] == "abort_multipart_upload"
+    assert "big" not in client.objects and not client.uploads
+
+
+def test_reads_are_streamed_in_chunks(fake_s3):
+    client, _ = fake_s3
+    client.objects["doc"] = b"0123456789"
+
+    async def scenario():
+        chunks = [chunk async for chunk in s3_service.iter_object("doc")]
+        iterator, headers = await s3_service.stream_object("doc")
+        streamed = b"".join([chunk async for chunk in iterator])
+        spooled = await s3_service.spool_object("doc")
+        return chunks, headers, streamed, spooled
+
+    chunks, headers, streamed, spooled = asyncio.run(scenario())
+    assert chunks == [b"0123", b"4567", b"89"]
+    assert streamed == b"0123456789" and headers["Content-Length"] == "10"
+    assert spooled._rolled and spooled.read() == b"0123456789"
+    spooled.close()
+    assert all(body.closed for body in client.bodies)
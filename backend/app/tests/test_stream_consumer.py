@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+from faststream.redis.parser.binary import BinaryMessageFormatV1
+
+from app.engine.stream_consumer import StreamPipelineConsumer, decode_stream_fields
+
+
+class FakeStreamRedis:
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.acked = []
+
+    async def xgroup_create(self, *args, **kwargs):
+        return True
+
+    async def xreadgroup(self, group, consumer, streams, count, block):
+        if not self.entries:
+            await asyncio.sleep(block / 1000)
+            return []
+        batch, self.entries = self.entries[:count], self.entries[count:]
+        return [(b"stream", batch)]
+
+    async def xack(self, stream, group, msg_id):
+        self.acked.append(msg_id)
+
+    async def xinfo_groups(self, stream):
+        return []
+
+
+def encode(payload: dict) -> dict:
+    data = BinaryMessageFormatV1.encode(message=json.dumps(payload), reply_to=None, headers=None,
+                                        correlation_id="1")
+    return {b"__data__": data}
+
+
+def test_decode_stream_fields():
+    assert decode_stream_fields(encode({"channel_id": "c"}), BinaryMessageFormatV1) == {"channel_id": "c"}
+    assert decode_stream_fields({b"message": b"init", b"channel_id": b"init"}, BinaryMessageFormatV1) == \
+        {"message": "init", "channel_id": "init"}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_acks_each_message_without_batch_barrier():
+    redis = FakeStreamRedis([(f"{i}-0".encode(), encode({"n": i})) for i in range(5)])
+    release = asyncio.Event()
+
+    async def handler(payload):
+        if payload["n"] == 0:
+            await release.wait()
+
+    consumer = StreamPipelineConsumer(redis, "stream", "group", "c1", handler, BinaryMessageFormatV1,
+                                      high_water=10, prefetch_min=5, prefetch_max=5, block_ms=10)
+    task = asyncio.create_task(consumer.run())
+    for _ in range(50):
+        if len(redis.acked) == 4:
+            break
+        await asyncio.sleep(0.01)
+
+    assert b"0-0" not in redis.acked and len(redis.acked) == 4
+    assert consumer.in_flight == 1
+    release.set()
+    await consumer.stop()
+    task.cancel()
+    assert redis.acked[-1] == b"0-0"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_reads_past_high_water():
+    redis = FakeStreamRedis([(f"{i}-0".encode(), encode({"n": i})) for i in range(20)])
+
+    async def handler(payload):
+        await asyncio.sleep(0)
+
+    consumer = StreamPipelineConsumer(redis, "stream", "group", "c1", handler, BinaryMessageFormatV1,
+                                      high_water=3, prefetch_min=3, prefetch_max=3, block_ms=10)
+    task = asyncio.create_task(consumer.run())
+    try:
+        await asyncio.wait_for(_wait_acked(redis, 20), timeout=2)
+    finally:
+        task.cancel()
+    assert sorted(redis.acked) == sorted(f"{i}-0".encode() for i in range(20))
+
+
+async def _wait_acked(redis, count):
+    while len(redis.acked) < count:
+        await asyncio.sleep(0.01)
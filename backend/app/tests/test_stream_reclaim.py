@@ -0,0 +1,119 @@
+import pytest
+
+from app.broker import broker
+from app.engine.stream_reclaim import dead_letter_stream, list_dead_letters, reclaim_pending, replay_dead_letters
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeReclaimRedis"):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def xadd(self, stream, fields):
+        self.commands.append(("xadd", stream, fields))
+
+    def xack(self, stream, group, msg_id):
+        self.commands.append(("xack", stream, msg_id))
+
+    def xdel(self, stream, msg_id):
+        self.commands.append(("xdel", stream, msg_id))
+
+    def xpending_range(self, stream, group, min, max, count, consumername=None):
+        self.commands.append(("xpending_range", min, max, count))
+
+    async def execute(self):
+        replies = []
+        for command in self.commands:
+            if command[0] == "xpending_range":
+                replies.append(self.redis.pending(*command[1:]))
+            elif command[0] == "xadd":
+                self.redis.streams.setdefault(command[1], []).append(
+                    (f"{len(self.redis.streams.get(command[1], [])) + 1}-0".encode(),
+                     {k.encode() if isinstance(k, str) else k: str(v).encode() if not isinstance(v, bytes) else v
+                      for k, v in command[2].items()}))
+            elif command[0] == "xack":
+                self.redis.acked.append(command[2])
+            else:
+                self.redis.streams[command[1]] = [e for e in self.redis.streams[command[1]] if e[0] != command[2]]
+        return replies
+
+
+class FakeReclaimRedis:
+    def __init__(self, pages, deliveries):
+        self.pages = pages
+        self.deliveries = deliveries
+        self.acked = []
+        self.streams = {}
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id, count):
+        return self.pages[start_id]
+
+    def pending(self, min, max, count):
+        key = lambda msg_id: tuple(int(part) for part in msg_id.decode().split("-"))
+        entries = [{"message_id": msg_id, "times_delivered": times} for msg_id, times in sorted(self.deliveries.items())
+                   if key(min) <= key(msg_id) <= key(max)]
+        return entries[:count]
+
+    async def xrange(self, stream, min, max, count):
+        return self.streams.get(stream, [])[:count]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.mark.asyncio
+async def test_reclaim_walks_cursor_and_dead_letters_poison_messages():
+    redis = FakeReclaimRedis(
+        pages={
+            "0-0": [b"5-0", [(b"1-0", {b"__data__": b"a"}), (b"2-0", {b"__data__": b"b"})], []],
+            b"5-0": [b"0-0", [(b"6-0", {b"__data__": b"c"}), (b"7-0", None)], [b"7-0"]],
+        },
+        deliveries={b"1-0": 2, b"2-0": 6, b"6-0": 1},
+    )
+    processed = []
+
+    async def process(entries):
+        processed.extend(msg_id for msg_id, _ in entries)
+
+    claimed = await reclaim_pending(redis, "stream", "group", "c1", process, batch_size=2, max_deliveries=5)
+
+    assert claimed == 3
+    assert processed == [b"1-0", b"6-0"]
+    assert redis.acked == [b"2-0"]
+
+    dead = await list_dead_letters(redis, "stream")
+    assert dead[0]["original_id"] == "2-0" and dead[0]["deliveries"] == "6"
+    assert dead[0]["fields"] == {"__data__": "b"}
+
+    assert await replay_dead_letters(redis, "stream") == [dead[0]["id"]]
+    assert redis.streams["stream"][0][1] == {b"__data__": b"b"}
+    assert redis.streams[dead_letter_stream("stream")] == []
+
+
+@pytest.mark.asyncio
+async def test_dead_letters_with_broker_encoded_messages():
+    data = broker.message_format.encode(message=b'{"text": "hi"}', reply_to=None,
+                                        headers={"content-type": "application/json"}, correlation_id="c")
+    # Между заклеймленными записями ещё сотни ожидающих — счётчики берутся по каждому id
+    deliveries = {f"{n}-0".encode(): 1 for n in range(2, 400)}
+    deliveries.update({b"1-0": 9, b"400-0": 9})
+    redis = FakeReclaimRedis(
+        pages={"0-0": [b"0-0", [(b"1-0", {b"__data__": data}), (b"400-0", {b"__data__": data})], []]},
+        deliveries=deliveries,
+    )
+
+    async def process(entries):
+        raise AssertionError("poison messages must not be processed")
+
+    await reclaim_pending(redis, "stream", "group", "c1", process, max_deliveries=5)
+    assert redis.acked == [b"1-0", b"400-0"]
+
+    dead = await list_dead_letters(redis, "stream", message_format=broker.message_format)
+    assert [entry["message"] for entry in dead] == [{"text": "hi"}, {"text": "hi"}]
+    assert isinstance(dead[0]["fields"]["__data__"], str)
@@ -0,0 +1,47 @@
+from app.engine.templates import compile_template, render, render_model
+from app.schemas.request import RequestSubstitute
+
+CONTEXT = {
+    "user": {"name": "Ann", "age": 30, "tags": ["a", "b"], "empty": None},
+    "message": {"text": "hi"},
+}
+
+
+def test_template_is_tokenized_once():
+    template = compile_template("Hello, {$user.name$}! You said {$message.text$}")
+
+    assert compile_template("Hello, {$user.name$}! You said {$message.text$}") is template
+    assert template.segments == ("Hello, ", ("user", "name"), "! You said ", ("message", "text"))
+    assert template.render(CONTEXT) == "Hello, Ann! You said hi"
+
+
+def test_single_variable_keeps_native_type():
+    assert render("{$user.age$}", CONTEXT) == 30
+    assert render("{$user.tags$}", CONTEXT) == ["a", "b"]
+    assert render("{$user.empty$}", CONTEXT) == ""
+    assert render("{$user.missing$}", CONTEXT) == ""
+
+
+def test_mixed_template_is_stringified():
+    assert render("age={$user.age$}", CONTEXT) == "age=30"
+    assert render("tags={$user.tags$}", CONTEXT) == 'tags=["a", "b"]'
+    assert render("{$user.age$}{$user.age$}", CONTEXT) == "3030"
+    assert render("[{$user.empty$}]", CONTEXT) == "[]"
+
+
+def test_render_walks_nested_data():
+    data = {"{$user.name$}_key": ["{$message.text$}", 1, {"n": "{$user.age$}"}], "static": "text"}
+
+    assert render(data, CONTEXT) == {"Ann_key": ["hi", 1, {"n": 30}], "static": "text"}
+    assert render(data, None) == {"_key": ["", 1, {"n": ""}], "static": "text"}
+
+
+def test_render_model():
+    request = RequestSubstitute(name="user", method="get", request_url="https://example.com/users/{$user.name$}",
+                                params={"age": "{$user.age$}"}, json_field={"tags": "{$user.tags$}"})
+
+    rendered = render_model(request, CONTEXT)
+
+    assert rendered.request_url == "https://example.com/users/Ann"
+    assert rendered.params == {"age": 30}
+    assert rendered.json_field == {"tags": ["a", "b"]}
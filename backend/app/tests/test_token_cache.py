@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import pytest
+
+from app.auth.cache import TokenCache
+from app.auth.types import AccessToken
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def exists(self, key):
+        return int(key in self.store)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Provider:
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return AccessToken(access_token=f"secret-{self.calls}", expires_at=self.clock() + 3600)
+
+
+KEY = dict(bot_id="bot", provider="google", profile="default", strategy="oauth", scopes=["b", "a"])
+
+
+def test_refresh_is_single_flight_and_shared_between_workers():
+    redis = FakeRedis()
+    clock = FakeClock()
+    provider = Provider(clock)
+
+    async def scenario():
+        worker = TokenCache(redis, clock=clock)
+        tokens = await asyncio.gather(*(worker.get_or_fetch(**KEY, fetch=provider.fetch) for _ in range(10)))
+        other_worker = TokenCache(redis, clock=clock)
+        shared = await other_worker.get_or_fetch(**{**KEY, "scopes": ["a", "b"]}, fetch=provider.fetch)
+        return tokens, shared
+
+    tokens, shared = asyncio.run(scenario())
+    assert {token.access_token for token in tokens} == {"secret-1"}
+    assert shared.access_token == "secret-1"
+    assert provider.calls == 1
+    # В Redis лежит только шифротекст
+    assert all(b"secret-1" not in value for value in redis.store.values())
+
+
+def test_expiring_token_is_refreshed_and_credentials_are_separated():
+    redis = FakeRedis()
+    clock = FakeClock()
+    provider = Provider(clock)
+
+    async def scenario():
+        cache = TokenCache(redis, clock=clock)
+        first = await cache.get_or_fetch(**KEY, fetch=provider.fetch)
+        clock.now += 3600 - 10  # внутри 30-секундного запаса
+        refreshed = await cache.get_or_fetch(**KEY, fetch=provider.fetch)
+        other_credential = await cache.get_or_fetch(**KEY, credentials_id="c2", fetch=provider.fetch)
+        return first, refreshed, other_credential
+
+    first, refreshed, other_credential = asyncio.run(scenario())
+    assert (first.access_token, refreshed.access_token, other_credential.access_token) == \
+        ("secret-1", "secret-2", "secret-3")
+
+
+def test_waits_for_refresh_in_another_worker():
+    redis = FakeRedis()
+    clock = FakeClock()
+    provider = Provider(clock)
+
+    async def scenario():
+        cache = TokenCache(redis, lock_timeout=5)
+        key = cache.key(**KEY)
+        await redis.set(f"{key}:lock", "other-worker")
+
+        async def other_worker_finishes():
+            await asyncio.sleep(0.15)
+            await TokenCache(redis)._put(key, AccessToken(access_token="from-other", expires_at=time.time() + 3600))
+            await redis.delete(f"{key}:lock")
+
+        token, _ = await asyncio.gather(cache.get_or_fetch(**KEY, fetch=provider.fetch), other_worker_finishes())
+        return token
+
+    assert asyncio.run(scenario()).access_token == "from-other"
+    assert provider.calls == 0
+
+
+def test_stops_waiting_when_other_worker_fails():
+    redis = FakeRedis()
+    provider = Provider(time.time)
+
+    async def scenario(fail_marker: bool):
+        cache = TokenCache(redis, lock_timeout=5)
+        key = cache.key(**KEY)
+        await redis.set(f"{key}:lock", "other-worker")
+
+        async def other_worker_fails():
+            await asyncio.sleep(0.15)
+            if fail_marker:
+                await redis.set(f"{key}:failed", "HTTPStatusError")
+            await redis.delete(f"{key}:lock")
+
+        started = time.monotonic()
+        results = await asyncio.gather(cache.get_or_fetch(**KEY, fetch=provider.fetch), other_worker_fails(),
+                                       return_exceptions=True)
+        await redis.delete(f"{key}:failed")
+        return results[0], time.monotonic() - started
+
+    error, waited = asyncio.run(scenario(fail_marker=True))
+    assert isinstance(error, RuntimeError) and "HTTPStatusError" in str(error)
+    assert waited < 1 and provider.calls == 0
+
+    # Лок снят без отметки об ошибке — обновляем сами, не дожидаясь lock_timeout
+    token, waited = asyncio.run(scenario(fail_marker=False))
+    assert token.access_token == "secret-1" and waited < 1
+
+
+def test_failed_refresh_is_remembered_briefly():
+    redis = FakeRedis()
+
+    async def failing_fetch():
+        raise ValueError("invalid_grant")
+
+    async def scenario():
+        cache = TokenCache(redis)
+        with pytest.raises(ValueError):
+            await cache.get_or_fetch(**KEY, fetch=failing_fetch)
+        with pytest.raises(RuntimeError, match="ValueError"):
+            await TokenCache(redis).get_or_fetch(**KEY, fetch=failing_fetch)
+
+    asyncio.run(scenario())
+    assert not any(b"invalid_grant" in value for value in redis.store.values())
@@ -306,7 +306,13 @@ from app.database import sessionmanager
 
 
 async def cache_structure_bot(session: AsyncSession, bot: BotModel) -> dict:
+    from app.engine.compiled_bot import STRUCTURE_VERSION_KEY, check_code_snippets, compute_structure_version
+
     export_json = await export_bot_structure(session, bot)
+    for group_id, error in check_code_snippets(export_json).items():
+        logger.warning(f"Bot {bot.id}: code in connection group {group_id} does not compile: {error}")
+    # Версия структуры: воркеры перекомпилируют бота только при её смене
+    export_json[STRUCTURE_VERSION_KEY] = compute_structure_version(export_json)
     bot.cache_structure = export_json
     await session.commit()
 
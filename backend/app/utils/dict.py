@@ -1,4 +1,5 @@
-from typing import Any
+from collections.abc import Mapping
+from typing import Any, Iterator
 
 
 def deep_merge_dicts(dict1: dict, dict2: dict) -> dict:
@@ -12,16 +13,120 @@ def deep_merge_dicts(dict1: dict, dict2: dict) -> dict:
     return result
 
 
+class LayeredContext(Mapping):
+    """
+    Представление deep_merge_dicts(*reversed(layers)) только для чтения, без копирования слоёв.
+    Слои перечисляются от старшего к младшему, как в ChainMap. Если в нескольких слоях
+    по ключу лежат словари, возвращается такое же представление над ними;
+    иначе — значение старшего слоя.
+    """
+    __slots__ = ("layers",)
+
+    def __init__(self, *layers: Mapping):
+        self.layers = tuple(layer for layer in layers if layer)
+
+    def __getitem__(self, key):
+        found = []
+        for layer in self.layers:
+            if key not in layer:
+                continue
+            value = layer[key]
+            if not isinstance(value, Mapping):
+                if found:
+                    break
+                return value
+            found.append(value)
+        if not found:
+            raise KeyError(key)
+        return found[0] if len(found) == 1 else LayeredContext(*found)
+
+    def __contains__(self, key) -> bool:
+        return any(key in layer for layer in self.layers)
+
+    def __iter__(self) -> Iterator:
+        # Порядок ключей как у deep_merge_dicts: сначала ключи младшего слоя
+        seen = {}
+        for layer in reversed(self.layers):
+            seen.update(dict.fromkeys(layer))
+        return iter(seen)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> dict:
+        """Материализует слияние в обычный словарь."""
+        result = {}
+        for key in self:
+            value = self[key]
+            result[key] = value.to_dict() if isinstance(value, LayeredContext) else value
+        return result
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class LazyCopyDict(dict):
+    """
+    Изолированная копия вложенных словарей для кода пользователя вместо deepcopy.
+    Каждый уровень копируется поверхностно только при первом обращении к нему,
+    поэтому изменения не затрагивают исходные данные, а нетронутые ветки не копируются.
+    """
+
+    def __init__(self, source: Mapping = ()):
+        super().__init__(source)
+
+    @staticmethod
+    def _copy(value):
+        if type(value) is dict:
+            return LazyCopyDict(value)
+        if type(value) is list:
+            return [LazyCopyDict._copy(item) for item in value]
+        return value
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if type(value) is dict or type(value) is list:
+            value = self._copy(value)
+            super().__setitem__(key, value)
+        return value
+
+    def __iter__(self):
+        # Переопределение отключает быстрый путь dict(obj) / {**obj}, который читает значения в обход __getitem__
+        return super().__iter__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            super().__setitem__(key, default)
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self[key]
+        return super().pop(key, *default)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self) -> "LazyCopyDict":
+        return LazyCopyDict(dict(self.items()))
+
+
 def get_value_by_list_keys(obj: dict, keys: list) -> str | None:
     """
-    Извлекает значение из вложенного словаря по списку ключей.
+    Извлекает значение из вложенного словаря (или LayeredContext) по списку ключей.
     Возвращает None, если ключ не найден.
     """
     try:
         value = obj
         for key in keys:
             value = value[key]
-        return value
+        return value.to_dict() if isinstance(value, LayeredContext) else value
     except (KeyError, TypeError):
         return None
 